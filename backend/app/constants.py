@@ -5,10 +5,88 @@ Constants for the RAG engine and data processing.
 # Embedding model configuration
 EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
 EMBEDDING_DIMENSION = 384  # Output dimension of all-MiniLM-L6-v2
+EMBEDDING_BATCH_SIZE = 64  # Chunks per forward pass in ingestion scripts (BatchEmbedder)
 
 # Context and history limits
 HISTORY_CONTEXT_MESSAGES = 3  # Number of previous messages to include in context
-MAX_CONTEXT_CHARS = 60000  # Maximum characters for Gemini context (increased to support large tables)
+
+# Context packing (ContextPacker): token budget for <contexto_interno> per intent
+CHARS_PER_TOKEN = 4  # Estimate for Spanish legal text with Gemini's tokenizer
+CONTEXT_TOKEN_BUDGETS = {
+    'salary': 12000,  # Salary tables + anexos
+    'dismissal': 8000,
+    'leave': 8000,
+    'general': 6000,
+}
+CONTEXT_TOKEN_BUDGET_DEFAULT = 8000
+CONTEXT_MIN_TRUNCATED_TOKENS = 200  # Below this, a piece that does not fit is dropped instead of cut
+CONTEXT_DUPLICATE_SIMILARITY = 0.9  # Shingle Jaccard above which two chunks count as the same text
+
+# Query expansion cache (SemanticCache)
+QUERY_CACHE_MAX_ENTRIES = 2000  # LRU capacity per worker
+QUERY_CACHE_TTL_SECONDS = 24 * 3600  # Expansions only depend on the query text
+QUERY_CACHE_SIMILARITY_THRESHOLD = 0.95  # Cosine similarity for a semantic near-hit
+
+# Vector index on document_chunks.embedding (app/db/vector_index.py)
+VECTOR_INDEX_NAME = 'ix_document_chunks_embedding_hnsw'
+HNSW_M = 16  # pgvector default: graph connections per node
+HNSW_EF_CONSTRUCTION = 64  # pgvector default: build-time candidate list
+HNSW_EF_SEARCH = 200  # Per-connection default candidate list; company filters discard candidates after the index scan
+IVFFLAT_PROBES = 10  # Fallback for pgvector < 0.5.0 (no HNSW)
+
+# Hybrid retrieval (RagEngine._build_retrieval_statement), in priority order
+RETRIEVAL_BRANCHES = ['anchor', 'article', 'anexo', 'anexo_fallback', 'vector']
+BRANCH_STRIDE = 1000  # position = branch_index * BRANCH_STRIDE + rank within the branch
+SALARY_SEARCH_KEYWORDS = [
+    'precio', 'salario', 'retribución', 'retribucion', 'paga', 'sueldo',
+    'complemento', 'plus', 'extraordinaria', 'perentoria',
+    'nocturna', 'festiva', 'tabla', 'anexo', 'euros', '€'
+]
+
+# Answer cache (AnswerCache) and corpus fingerprint (CorpusVersion)
+ANSWER_CACHE_MAX_ENTRIES = 1000  # LRU capacity per worker
+ANSWER_CACHE_TTL_SECONDS = 6 * 3600  # Safety net; reseeds invalidate via corpus version
+CORPUS_VERSION_TTL_SECONDS = 30  # How long a worker trusts its last corpus fingerprint
+TARIFF_MODEL_TTL_SECONDS = 600  # Backstop: compiled tariffs are reloaded at least this often
+
+# Batch payroll simulation (POST /calculadoras/smart/batch)
+BATCH_CALCULATION_MAX_EMPLOYEES = 5000  # Employees per request
+ROSTER_CHUNK_ROWS = 1000  # Rows per chunk when streaming a roster file (bounded memory)
+
+# Structured request logging (app/utils/logging_config.setup_structured_logging)
+LOG_QUEUE_MAX_RECORDS = 10000  # Records buffered for the writer thread; beyond that they are dropped
+LOG_DEBUG_SAMPLE_RATE = 0.05  # Share of requests whose DEBUG lines are emitted (env LOG_DEBUG_SAMPLE_RATE)
+
+# Audit log writer (app/utils/audit_logger.AuditLogWriter)
+AUDIT_LOG_BATCH_SIZE = 200  # Events per write; a smaller batch is flushed every AUDIT_LOG_FLUSH_SECONDS
+AUDIT_LOG_FLUSH_SECONDS = 2.0
+AUDIT_LOG_QUEUE_MAX_EVENTS = 10000  # Pending events; beyond that new events are dropped (and counted)
+AUDIT_LOG_MAX_BYTES = 50 * 1024 * 1024  # audit.jsonl is rotated (gzip) past this size
+AUDIT_LOG_BACKUPS = 20  # Rotated .jsonl.gz files kept
+
+# Background auditor (app/services/audit_dispatcher.AuditDispatcher)
+AUDIT_SAMPLE_RATE = 0.0  # Share of chat answers audited (env AUDIT_SAMPLE_RATE); each audit is a 2nd Gemini call
+AUDIT_MAX_CONCURRENCY = 4  # Auditor calls in flight per worker
+AUDIT_MAX_PENDING = 64  # Audits queued or running; beyond that new answers are not audited
+AUDIT_TIMEOUT_SECONDS = 12.0  # Stop waiting for a verdict (AuditorService has its own 10s HTTP timeout)
+AUDIT_SLOW_CALL_SECONDS = 6.0  # Verdicts slower than this count as failures for the circuit breaker
+AUDIT_BREAKER_FAILURES = 5  # Consecutive failed/slow audits that open the circuit
+AUDIT_BREAKER_RESET_SECONDS = 60  # Open circuit: audits skipped for this long, then one trial call
+AUDIT_RESULT_TTL_SECONDS = 15 * 60  # Verdicts kept for GET /articulos/search/chat/audit/{answer_id}
+AUDIT_RESULT_MAX_ENTRIES = 5000
+AUDIT_STREAM_WAIT_SECONDS = 15.0  # /chat/stream waits this long for the verdict before closing
+
+# Shared outbound HTTP client (app/services/http_client.py): Gemini, OpenAI
+HTTP_TIMEOUT_SECONDS = 30.0  # Default read/write timeout per request
+HTTP_CONNECT_TIMEOUT_SECONDS = 5.0
+HTTP_MAX_CONNECTIONS = 100  # Whole pool, per worker
+HTTP_MAX_CONNECTIONS_PER_HOST = 20  # Concurrent requests to one host (HTTP/2 multiplexes them)
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 60.0
+HTTP_RETRIES = 2  # Retries on connection errors and HTTP_RETRY_STATUSES
+HTTP_RETRY_BACKOFF_SECONDS = 0.5  # Exponential: 0.5s, 1s, ... (Retry-After wins if present)
+HTTP_RETRY_AFTER_MAX_SECONDS = 5.0  # Cap on a server's Retry-After: a user request is waiting
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+GEMINI_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
 
 # Valid company slugs
 VALID_COMPANIES = [
@@ -0,0 +1,333 @@
+"""
+Carga masiva con `COPY ... FROM STDIN (FORMAT binary)`.
+
+bulk_save_objects / un SalaryTable(...) por fila pasan por el unit of work
+del ORM y por un INSERT por lote; con COPY binario Postgres recibe las filas
+ya codificadas (incluido el vector de pgvector) en un solo stream, así que
+sembrar el corpus completo y las tablas salariales queda limitado por I/O.
+
+Dos modos:
+
+- copy_rows(conn, table, rows): COPY dentro de la transacción del llamador
+  (p.ej. `db.connection()` de una sesión). Los índices existentes se
+  mantienen: pensado para añadir filas a una tabla viva.
+- bulk_load(engine, model, rows, keep_where=..., swap=True): recarga
+  completa. Las filas se cargan en una tabla sombra SIN índices, los índices
+  (incluido el HNSW) se construyen después de la carga copiando las
+  definiciones de la tabla real, y la sombra sustituye a la tabla en un
+  único DROP + RENAME atómico. Las consultas nunca ven la tabla vacía ni a
+  medio cargar. Las escrituras concurrentes en la tabla durante la carga se
+  pierden: es un modo para seeds, no para tráfico de usuarios.
+
+`rows` pueden ser dicts o instancias del modelo (así DocumentChunk sigue
+rellenando sus columnas tipadas vía @validates).
+"""
+import json
+import logging
+import re
+import struct
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterable, Iterator, List, Mapping, Optional, Sequence
+
+from sqlalchemy import (
+    BigInteger, Boolean, DateTime, Float, Integer, JSON, String, Table, Text,
+    column as sql_column, insert, select, table as sql_table, text,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+COPY_SIGNATURE = b"PGCOPY\n\xff\r\n\x00"
+COPY_HEADER = COPY_SIGNATURE + struct.pack("!ii", 0, 0)  # flags + longitud de la extensión
+COPY_TRAILER = struct.pack("!h", -1)
+NULL_FIELD = struct.pack("!i", -1)
+
+PG_EPOCH = datetime(2000, 1, 1)
+STREAM_CHUNK_BYTES = 1 << 20
+
+SHADOW_SUFFIX = "_load"
+
+
+# ----------------------------------------------------------------------
+# Codificación binaria (formato de envío de cada tipo en Postgres)
+# ----------------------------------------------------------------------
+
+def _encode_text(value) -> bytes:
+    return str(value).encode("utf-8")
+
+
+def _encode_int4(value) -> bytes:
+    return struct.pack("!i", int(value))
+
+
+def _encode_int8(value) -> bytes:
+    return struct.pack("!q", int(value))
+
+
+def _encode_float8(value) -> bytes:
+    return struct.pack("!d", float(value))
+
+
+def _encode_bool(value) -> bytes:
+    return b"\x01" if value else b"\x00"
+
+
+def _encode_json(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def _encode_jsonb(value) -> bytes:
+    return b"\x01" + _encode_json(value)  # versión 1 del formato jsonb
+
+
+def _encode_timestamp(value: datetime) -> bytes:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    delta = value - PG_EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return struct.pack("!q", micros)
+
+
+def _vector_encoder(dim: Optional[int]) -> Callable[[Any], bytes]:
+    def encode(value) -> bytes:
+        values = [float(v) for v in value]
+        if dim is not None and len(values) != dim:
+            raise ValueError(f"expected {dim} dimensions, not {len(values)}")
+        # pgvector vector_recv: int16 dim, int16 unused, float4[dim]
+        return struct.pack(f"!hh{len(values)}f", len(values), 0, *values)
+    return encode
+
+
+def column_encoder(column) -> Callable[[Any], bytes]:
+    """Codificador binario para el tipo SQLAlchemy de `column`."""
+    col_type = column.type
+    if type(col_type).__name__.upper() == "VECTOR":  # pgvector.sqlalchemy.Vector
+        return _vector_encoder(getattr(col_type, "dim", None))
+    if isinstance(col_type, JSONB):
+        return _encode_jsonb
+    if isinstance(col_type, JSON):
+        return _encode_json
+    if isinstance(col_type, Boolean):
+        return _encode_bool
+    if isinstance(col_type, BigInteger):
+        return _encode_int8
+    if isinstance(col_type, Integer):
+        return _encode_int4
+    if isinstance(col_type, Float):
+        return _encode_float8
+    if isinstance(col_type, DateTime):
+        return _encode_timestamp
+    if isinstance(col_type, (String, Text)):
+        return _encode_text
+    raise TypeError(f"No binary COPY encoder for {column.name} ({col_type})")
+
+
+def _default_value(column):
+    default = column.default
+    if default is None:
+        return None
+    if default.is_scalar:
+        return default.arg
+    if default.is_callable:
+        return default.arg(None)  # SQLAlchemy envuelve los callables sin argumentos
+    return None
+
+
+def _row_values(row, columns) -> List[Any]:
+    values = []
+    for column in columns:
+        if isinstance(row, Mapping):
+            value = row.get(column.key)
+        else:
+            value = getattr(row, column.key, None)
+        values.append(_default_value(column) if value is None else value)
+    return values
+
+
+def encode_rows(rows: Iterable, columns: Sequence) -> Iterator[bytes]:
+    """Stream COPY binario completo (cabecera, tuplas, trailer) para `rows`."""
+    encoders = [column_encoder(column) for column in columns]
+    field_count = struct.pack("!h", len(columns))
+
+    yield COPY_HEADER
+    for row in rows:
+        parts = [field_count]
+        for value, encode in zip(_row_values(row, columns), encoders):
+            if value is None:
+                parts.append(NULL_FIELD)
+            else:
+                data = encode(value)
+                parts.append(struct.pack("!i", len(data)))
+                parts.append(data)
+        yield b"".join(parts)
+    yield COPY_TRAILER
+
+
+class CopyStream:
+    """Objeto tipo fichero (read) sobre un iterador de bytes, para copy_expert."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = bytearray()
+        self.rows = -2  # cabecera y trailer no son filas
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self.rows += 1
+            self._buffer.extend(chunk)
+        if size < 0:
+            size = len(self._buffer)
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+def copy_columns(table: Table) -> List:
+    """Todas las columnas salvo la PK autoincremental (la rellena la secuencia)."""
+    return [column for column in table.columns if column is not table.autoincrement_column]
+
+
+# ----------------------------------------------------------------------
+# COPY
+# ----------------------------------------------------------------------
+
+def copy_rows(conn: Connection, table: Table, rows: Iterable, columns: Optional[Sequence] = None,
+              table_name: Optional[str] = None) -> int:
+    """COPY binario de `rows` a `table` en la transacción de `conn`. Devuelve las filas copiadas."""
+    columns = list(columns) if columns is not None else copy_columns(table)
+    target = conn.dialect.identifier_preparer.quote(table_name or table.name)
+    column_list = ", ".join(conn.dialect.identifier_preparer.quote(c.name) for c in columns)
+    sql = f"COPY {target} ({column_list}) FROM STDIN WITH (FORMAT binary)"
+
+    stream = CopyStream(encode_rows(rows, columns))
+    cursor = conn.connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            cursor.copy_expert(sql, stream, size=STREAM_CHUNK_BYTES)
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                while data := stream.read(STREAM_CHUNK_BYTES):
+                    copy.write(data)
+    finally:
+        cursor.close()
+
+    logger.info(f"COPY {table.name}: {stream.rows} rows")
+    return stream.rows
+
+
+def _index_definitions(conn: Connection, table_name: str) -> List[tuple]:
+    """(nombre, indexdef, es_pk) de todos los índices de la tabla (incluido el vectorial)."""
+    return conn.execute(text("""
+        SELECT c.relname, pg_get_indexdef(i.indexrelid), i.indisprimary
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = CAST(:table AS regclass)
+    """), {"table": table_name}).fetchall()
+
+
+def _foreign_keys(conn: Connection, table_name: str) -> List[tuple]:
+    return conn.execute(text("""
+        SELECT conname, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = CAST(:table AS regclass) AND contype = 'f'
+    """), {"table": table_name}).fetchall()
+
+
+def _referencing_tables(conn: Connection, table_name: str) -> List[str]:
+    return conn.execute(text("""
+        SELECT conrelid::regclass::text
+        FROM pg_constraint
+        WHERE confrelid = CAST(:table AS regclass) AND contype = 'f'
+    """), {"table": table_name}).scalars().all()
+
+
+def shadow_index_sql(indexdef: str, name: str, table_name: str) -> str:
+    """pg_get_indexdef de la tabla real -> mismo índice (con sufijo) sobre la tabla sombra."""
+    shadow = indexdef.replace(f"INDEX {name} ON ", f"INDEX {name}{SHADOW_SUFFIX} ON ", 1)
+    return re.sub(
+        rf"( ON (?:ONLY )?(?:[\w\"]+\.)?){re.escape(table_name)}( USING )",
+        rf"\g<1>{table_name}{SHADOW_SUFFIX}\g<2>",
+        shadow,
+        count=1,
+    )
+
+
+def bulk_load(engine: Engine, model, rows: Iterable, keep_where=None, swap: bool = True,
+              columns: Optional[Sequence] = None) -> int:
+    """
+    Recarga `model` con `rows` en una sola transacción.
+
+    Args:
+        keep_where: filas actuales que se conservan (p.ej. otras empresas);
+            None = se sustituye la tabla entera
+        swap: tabla sombra + índices tras la carga + swap atómico. Con
+            swap=False se borra (lo no conservado) y se hace COPY sobre la tabla viva.
+    """
+    table = model.__table__
+    name = table.name
+    shadow = f"{name}{SHADOW_SUFFIX}"
+
+    with engine.begin() as conn:
+        if not swap:
+            delete = table.delete()
+            if keep_where is not None:
+                delete = delete.where(~keep_where)
+            conn.execute(delete)
+            return copy_rows(conn, table, rows, columns)
+
+        referencing = [t for t in _referencing_tables(conn, name) if t != name]
+        if referencing:
+            raise RuntimeError(f"Cannot swap {name}: referenced by {referencing}")
+
+        indexes = _index_definitions(conn, name)
+        foreign_keys = _foreign_keys(conn, name)
+        sequence = conn.execute(
+            text("SELECT pg_get_serial_sequence(:table, :column)"),
+            {"table": name, "column": table.autoincrement_column.name},
+        ).scalar() if table.autoincrement_column is not None else None
+
+        # 1. Tabla sombra sin índices (mismos defaults/checks; la PK se añade al final)
+        conn.execute(text(f"DROP TABLE IF EXISTS {shadow}"))
+        conn.execute(text(f"CREATE TABLE {shadow} (LIKE {name} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+        if keep_where is not None:
+            names = [c.name for c in table.columns]
+            shadow_table = sql_table(shadow, *[sql_column(n) for n in names])
+            conn.execute(insert(shadow_table).from_select(names, select(*table.columns).where(keep_where)))
+
+        # 2. Carga
+        loaded = copy_rows(conn, table, rows, columns, table_name=shadow)
+
+        # 3. Índices después de la carga (un solo build por índice, sin mantenimiento fila a fila)
+        for index_name, indexdef, is_primary in indexes:
+            conn.execute(text(shadow_index_sql(indexdef, index_name, name)))
+            if is_primary:
+                conn.execute(text(
+                    f"ALTER TABLE {shadow} ADD CONSTRAINT {index_name}{SHADOW_SUFFIX} "
+                    f"PRIMARY KEY USING INDEX {index_name}{SHADOW_SUFFIX}"
+                ))
+        logger.info(f"bulk_load {name}: {len(indexes)} indexes built on {shadow}")
+
+        # 4. Swap atómico: el lock exclusivo solo dura el DROP + RENAME
+        conn.execute(text(f"LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE"))
+        if sequence:
+            column = table.autoincrement_column.name
+            conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {shadow}.{column}"))
+        conn.execute(text(f"DROP TABLE {name}"))
+        conn.execute(text(f"ALTER TABLE {shadow} RENAME TO {name}"))
+        for index_name, _, _ in indexes:
+            conn.execute(text(f"ALTER INDEX {index_name}{SHADOW_SUFFIX} RENAME TO {index_name}"))
+        for fk_name, fk_def in foreign_keys:
+            conn.execute(text(f"ALTER TABLE {name} ADD CONSTRAINT {fk_name} {fk_def} NOT VALID"))
+
+    with engine.begin() as conn:
+        # Validación de FKs y estadísticas fuera del lock exclusivo
+        for fk_name, _ in foreign_keys:
+            conn.execute(text(f"ALTER TABLE {name} VALIDATE CONSTRAINT {fk_name}"))
+        conn.execute(text(f"ANALYZE {name}"))
+
+    logger.info(f"bulk_load {name}: {loaded} rows swapped in")
+    return loaded
@@ -1,4 +1,5 @@
 import os
+import asyncio
 from dotenv import load_dotenv
 from pathlib import Path
 env_path = Path(__file__).resolve().parent.parent.parent / ".env"
@@ -23,6 +24,10 @@ else:
     print("[DEBUG] DATABASE_URL: configured")
 
 engine = create_engine(DATABASE_URL)
+
+# pgvector: ef_search/probes por defecto en cada conexión del pool
+from app.db.vector_index import install_search_defaults
+install_search_defaults(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def get_db():
@@ -31,3 +36,14 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def run_with_session(func, *args, **kwargs):
+    """
+    Ejecuta una función bloqueante de BD en un hilo con su propia sesión.
+    La sesión de SQLAlchemy no es thread-safe, así que cada etapa concurrente
+    del pipeline async abre la suya: func(db, *args, **kwargs).
+    """
+    def _call():
+        with SessionLocal() as db:
+            return func(db, *args, **kwargs)
+    return await asyncio.to_thread(_call)
@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, JSON, Index
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, Float, JSON, Index, UniqueConstraint, event
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.ext.mutable import MutableDict
+from sqlalchemy.orm import relationship, validates
 from pgvector.sqlalchemy import Vector
 from datetime import datetime
 
@@ -33,30 +34,81 @@ class DocumentChunk(Base):
     
     # ✅ FASE 1: Metadata Schema (Híbrido)
     doc_id = Column(String, nullable=True, index=True)  # ID lógico del documento
-    chunk_metadata = Column(JSONB, nullable=False, default=dict)  # Metadata estructurada
+    # MutableDict: `chunk.chunk_metadata["year"] = ...` marca la fila como modificada y
+    # el flush resincroniza las columnas. Los cambios anidados (p.ej. append a "intent")
+    # NO se detectan: reasignar el dict completo en ese caso.
+    chunk_metadata = Column(MutableDict.as_mutable(JSONB), nullable=False, default=dict)  # Metadata estructurada
+    
+    # ✅ Claves calientes de chunk_metadata promovidas a columnas tipadas
+    # (B-tree + estadísticas del planner en lugar de casts JSON por fila).
+    # Se rellenan solas al asignar chunk_metadata/content y en cada flush (ver _sync_metadata_columns).
+    company = Column(String, nullable=True)  # "iberia", "general"
+    chunk_type = Column(String, nullable=True, index=True)  # "table", "article", "regulation", "text"
+    year = Column(Integer, nullable=True, index=True)
+    is_primary = Column(Boolean, nullable=True, index=True)
+    chunk_size = Column(Integer, nullable=True, index=True)
+    version_hash = Column(String, nullable=True, index=True)
     
     # Relationship
     document = relationship("LegalDocument", back_populates="chunks")
     
-    # ✅ ÍNDICES OPTIMIZADOS para búsqueda determinista
-    # NOTA: Los índices se crearán DESPUÉS de la migración
-    # __table_args__ = (
-    #     # Índices individuales con casting
-    #     Index('idx_metadata_type', metadata['type'].astext),
-    #     Index('idx_metadata_company', metadata['company'].astext),
-    #     Index('idx_metadata_year', metadata['year'].astext.cast(Integer)),
-    #     
-    #     # Índice compuesto para queries frecuentes
-    #     Index(
-    #         'idx_company_intent_type',
-    #         metadata['company'].astext,
-    #         metadata['intent'],
-    #         metadata['type'].astext,
-    #     ),
-    #     
-    #     # Índice para version_hash
-    #     Index('idx_version_hash', metadata['version_hash'].astext),
-    # )
+    # ✅ ÍNDICES OPTIMIZADOS para búsqueda determinista (LegalAnchors)
+    # En BDs existentes: scripts/migrate_add_metadata_indexes.py (CONCURRENTLY); el arranque solo avisa si faltan.
+    __table_args__ = (
+        # Containment (@>) sobre todo el JSONB: {"intent": ["SALARY"]}
+        Index('idx_metadata_gin', chunk_metadata, postgresql_using='gin', postgresql_ops={'chunk_metadata': 'jsonb_path_ops'}),
+
+        # Índice compuesto para queries frecuentes (company también sirve sola)
+        Index('idx_chunks_company_type_year', company, chunk_type, year),
+    )
+
+    @validates('chunk_metadata')
+    def _validate_metadata(self, key, metadata):
+        """Normaliza is_primary ("true" -> True) y copia las claves calientes a sus columnas."""
+        metadata = dict(metadata or {})
+        if 'is_primary' in metadata:
+            metadata['is_primary'] = _as_bool(metadata['is_primary'])
+        self._sync_metadata_columns(metadata, self.content)
+        return metadata
+
+    @validates('content')
+    def _validate_content(self, key, content):
+        # chunk_size cae a len(content): vale aunque content llegue después de chunk_metadata
+        self._sync_metadata_columns(self.chunk_metadata or {}, content)
+        return content
+
+    def _sync_metadata_columns(self, metadata, content):
+        self.company = metadata.get('company')
+        self.chunk_type = metadata.get('type')
+        self.year = _as_int(metadata.get('year'))
+        self.is_primary = _as_bool(metadata.get('is_primary'))
+        self.chunk_size = _as_int(metadata.get('chunk_size'))
+        if self.chunk_size is None and content is not None:
+            self.chunk_size = len(content)
+        self.version_hash = metadata.get('version_hash')
+
+
+@event.listens_for(DocumentChunk, "before_insert")
+@event.listens_for(DocumentChunk, "before_update")
+def _resync_chunk_metadata_columns(mapper, connection, chunk):
+    """Red de seguridad en el flush: cubre las mutaciones en sitio de chunk_metadata."""
+    metadata = chunk.chunk_metadata
+    if metadata is not None and isinstance(metadata.get('is_primary'), str):
+        metadata['is_primary'] = _as_bool(metadata['is_primary'])
+    chunk._sync_metadata_columns(metadata or {}, chunk.content)
+
+
+def _as_int(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', 't', '1', 'yes')
+    return bool(value) if value is not None else None
 
 class UserClaim(Base):
     """Reclamaciones generadas por usuarios"""
@@ -94,3 +146,42 @@ class SalaryConceptDefinition(Base):
     default_price = Column(Float, default=0.0) # Precio unitario por defecto (si aplica)
     level_values = Column(JSON, nullable=True) # Mapa de precios por nivel/grupo
     is_active = Column(Boolean, default=True)
+
+class SemanticCacheEntry(Base):
+    """Caché compartida entre workers de resultados de QueryExpander (SemanticCache)"""
+    __tablename__ = "semantic_cache_entries"
+
+    id = Column(Integer, primary_key=True)
+    namespace = Column(String, index=True)  # "query_expansion", "query_understanding"
+    cache_key = Column(String)  # Query normalizada (sin tildes ni puntuación)
+    query_text = Column(Text)  # Query original (debug)
+    payload = Column(JSONB)  # Resultado de expand()/understand()
+    embedding = Column(Vector(384), nullable=True)  # Para near-hits semánticos
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        UniqueConstraint('namespace', 'cache_key', name='uq_semantic_cache_namespace_key'),
+    )
+
+class EmbeddingCacheEntry(Base):
+    """Embeddings ya calculados, por hash de contenido: la reingesta solo embebe lo que cambió"""
+    __tablename__ = "embedding_cache"
+
+    content_hash = Column(String(64), primary_key=True)  # sha256(contenido normalizado + modelo)
+    model_name = Column(String, nullable=False)
+    embedding = Column(Vector(384), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class AuditEvent(Base):
+    """Veredictos del auditor: sink Postgres opcional del audit log (AUDIT_LOG_POSTGRES=true, vía COPY)"""
+    __tablename__ = "audit_events"
+
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    query = Column(Text)
+    intent = Column(String)
+    response_snippet = Column(Text)
+    context_hash = Column(String(64))  # sha256 del contexto que vio el modelo
+    approved = Column(Boolean)
+    reason = Column(Text)
+    risk = Column(String, index=True)
@@ -4,6 +4,44 @@ from app.db.database import engine
 
 logger = logging.getLogger(__name__)
 
+# Hot chunk_metadata keys promoted to typed columns on document_chunks
+CHUNK_METADATA_COLUMNS = {
+    "company": "VARCHAR",
+    "chunk_type": "VARCHAR",
+    "year": "INTEGER",
+    "is_primary": "BOOLEAN",
+    "chunk_size": "INTEGER",
+    "version_hash": "VARCHAR",
+}
+
+# Backfill from chunk_metadata. Tolerant casts: non-numeric years stay NULL and
+# the legacy string is_primary ("true"/"false" from seed_vectors) becomes a real
+# boolean, both in the column and inside the JSONB.
+BACKFILL_CHUNK_METADATA_COLUMNS_SQL = text("""
+    UPDATE document_chunks SET
+        company = chunk_metadata ->> 'company',
+        chunk_type = chunk_metadata ->> 'type',
+        year = CASE WHEN chunk_metadata ->> 'year' ~ '^[0-9]+$'
+                    THEN (chunk_metadata ->> 'year')::int END,
+        is_primary = CASE WHEN lower(chunk_metadata ->> 'is_primary') IN ('true', 't', '1') THEN true
+                          WHEN lower(chunk_metadata ->> 'is_primary') IN ('false', 'f', '0') THEN false END,
+        chunk_size = COALESCE(
+            CASE WHEN chunk_metadata ->> 'chunk_size' ~ '^[0-9]+$'
+                 THEN (chunk_metadata ->> 'chunk_size')::int END,
+            length(content)
+        ),
+        version_hash = chunk_metadata ->> 'version_hash',
+        chunk_metadata = CASE WHEN jsonb_typeof(chunk_metadata -> 'is_primary') = 'string'
+            THEN jsonb_set(chunk_metadata, '{is_primary}',
+                           to_jsonb(lower(chunk_metadata ->> 'is_primary') IN ('true', 't', '1')))
+            ELSE chunk_metadata END
+""")
+
+
+def backfill_chunk_metadata_columns(conn) -> int:
+    """Copies chunk_metadata hot keys into their typed columns. Returns updated rows."""
+    return conn.execute(BACKFILL_CHUNK_METADATA_COLUMNS_SQL).rowcount
+
 def patch_database():
     """
     Checks for missing columns in the database and adds them if necessary.
@@ -30,8 +68,88 @@ def patch_database():
                     # Variable type matches the models.py definition (String)
                     conn.execute(text("ALTER TABLE salary_tables ADD COLUMN variable_type VARCHAR;"))
                     conn.commit()
+        
+        # 3. Check 'document_chunks' for typed metadata columns (+ one-off backfill)
+        if inspector.has_table("document_chunks"):
+            columns = [c["name"] for c in inspector.get_columns("document_chunks")]
+            missing = [name for name in CHUNK_METADATA_COLUMNS if name not in columns]
+            if missing:
+                logger.warning(f"Patching DB: Adding {missing} to 'document_chunks' and backfilling from chunk_metadata")
+                with engine.connect() as conn:
+                    for name in missing:
+                        conn.execute(text(f"ALTER TABLE document_chunks ADD COLUMN {name} {CHUNK_METADATA_COLUMNS[name]};"))
+                    rows = backfill_chunk_metadata_columns(conn)
+                    conn.commit()
+                logger.warning(f"Patching DB: backfilled {rows} document_chunks")
                     
         logger.info("Database schema patch check completed.")
         
     except Exception as e:
         logger.error(f"Error patching database schema: {e}")
+
+
+def verify_vector_index():
+    """
+    Startup check: document_chunks.embedding must have its ANN index (HNSW/IVFFlat).
+    Without it every RAG search is a sequential scan + sort over all chunks.
+    Only reports: building it on an existing corpus takes minutes, and doing it
+    at import time would block every uvicorn worker's boot (and race between
+    workers). Build it with scripts/migrate_add_embedding_hnsw_index.py.
+    """
+    from app.db.vector_index import existing_index
+    from app.constants import VECTOR_INDEX_NAME
+
+    try:
+        inspector = inspect(engine)
+        if not inspector.has_table("document_chunks"):
+            return
+
+        with engine.connect() as conn:
+            current = existing_index(conn)
+        if current is None:
+            logger.warning(
+                f"Vector index '{VECTOR_INDEX_NAME}' is MISSING (searches fall back to seq scan). "
+                "Build with: python scripts/migrate_add_embedding_hnsw_index.py upgrade"
+            )
+            return
+
+        indexdef, is_valid = current
+        if is_valid:
+            logger.info(f"Vector index OK: {indexdef}")
+        else:
+            logger.warning(
+                f"Vector index '{VECTOR_INDEX_NAME}' is INVALID (searches fall back to seq scan). "
+                "Rebuild with: python scripts/migrate_add_embedding_hnsw_index.py rebuild"
+            )
+
+    except Exception as e:
+        logger.error(f"Error verifying vector index: {e}")
+
+
+def verify_chunk_metadata_indexes():
+    """
+    Startup check for the indexes declared on DocumentChunk (table args + typed columns) on
+    databases whose document_chunks table predates them (create_all only
+    creates indexes together with the table). Only reports: creating a GIN
+    index here would lock document_chunks against writes during import.
+    Build them with scripts/migrate_add_metadata_indexes.py (CONCURRENTLY) or,
+    for the typed-column B-trees, scripts/migrate_promote_chunk_metadata_columns.py.
+    """
+    from app.db.models import DocumentChunk
+
+    try:
+        inspector = inspect(engine)
+        if not inspector.has_table("document_chunks"):
+            return
+
+        existing = {ix["name"] for ix in inspector.get_indexes("document_chunks")}
+        missing = [ix.name for ix in DocumentChunk.__table__.indexes if ix.name not in existing]
+        if missing:
+            logger.warning(
+                f"document_chunks indexes MISSING: {missing} (LegalAnchors falls back to seq scans). "
+                "Build with: python scripts/migrate_add_metadata_indexes.py upgrade "
+                "(typed-column B-trees: scripts/migrate_promote_chunk_metadata_columns.py upgrade)"
+            )
+
+    except Exception as e:
+        logger.error(f"Error verifying chunk_metadata indexes: {e}")
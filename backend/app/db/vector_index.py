@@ -0,0 +1,111 @@
+"""
+Índice vectorial de document_chunks.embedding (pgvector, distancia coseno).
+
+Sin índice, `ORDER BY embedding <=> :q LIMIT k` es un seq scan + sort sobre
+todos los chunks: el coste crece linealmente con cada convenio o sentencia
+que se añade. Con HNSW el coste por búsqueda queda prácticamente plano.
+
+- HNSW requiere pgvector >= 0.5.0; en versiones anteriores se usa IVFFlat.
+- Lo usan el arranque (schema_patch.verify_vector_index, solo avisa), la migración
+  scripts/migrate_add_embedding_hnsw_index.py, el engine (valores por
+  defecto de ef_search/probes por conexión) y RagEngine.search
+  (apply_search_tuning: override por petición).
+"""
+import logging
+import math
+from typing import Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from app.constants import (
+    VECTOR_INDEX_NAME,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    HNSW_EF_SEARCH,
+    IVFFLAT_PROBES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def pgvector_version(conn: Connection) -> Optional[tuple]:
+    """(0, 7, 4) o None si la extensión no está instalada."""
+    row = conn.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")).fetchone()
+    if not row:
+        return None
+    return tuple(int(p) for p in row[0].split(".") if p.isdigit())
+
+
+def index_method(conn: Connection) -> str:
+    version = pgvector_version(conn)
+    return "hnsw" if version and version >= (0, 5, 0) else "ivfflat"
+
+
+def existing_index(conn: Connection) -> Optional[tuple]:
+    """(indexdef, is_valid) del índice vectorial, o None si no existe."""
+    row = conn.execute(text("""
+        SELECT pg_get_indexdef(i.indexrelid), i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = :name
+    """), {"name": VECTOR_INDEX_NAME}).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def create_index_sql(conn: Connection, concurrently: bool = False) -> str:
+    method = index_method(conn)
+    if method == "hnsw":
+        params = f"m = {HNSW_M}, ef_construction = {HNSW_EF_CONSTRUCTION}"
+    else:
+        # Regla de pgvector: lists = filas / 1000 (mínimo 10). Requiere datos ya cargados.
+        rows = conn.execute(text("SELECT count(*) FROM document_chunks")).scalar() or 0
+        params = f"lists = {max(10, math.ceil(rows / 1000))}"
+
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {VECTOR_INDEX_NAME} "
+        f"ON document_chunks USING {method} (embedding vector_cosine_ops) WITH ({params})"
+    )
+
+
+def install_search_defaults(engine: Engine) -> None:
+    """
+    Fija ef_search/probes por defecto una vez por conexión física del pool,
+    así la búsqueda normal no paga ninguna ida y vuelta extra (SET) por petición.
+    """
+    @event.listens_for(engine, "connect")
+    def _set_vector_search_defaults(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"SET hnsw.ef_search = {int(HNSW_EF_SEARCH)}")
+            cursor.execute(f"SET ivfflat.probes = {int(IVFFLAT_PROBES)}")
+            dbapi_connection.commit()
+        except Exception as e:
+            dbapi_connection.rollback()
+            logger.warning(f"Vector search defaults not applied: {e}")
+        finally:
+            cursor.close()
+
+
+def apply_search_tuning(db: Session, ef_search: Optional[int] = None, probes: Optional[int] = None) -> None:
+    """
+    Ajuste por petición de la búsqueda aproximada (SET LOCAL: solo esta transacción).
+    Solo emite SQL si se pide algo distinto del valor por defecto de la conexión,
+    y entonces en una única sentencia. No se comprueba el método del índice:
+    ef_search solo afecta a HNSW y probes solo a IVFFlat, así que fijar el que
+    no corresponde es inocuo (una variable de sesión más, sin efecto).
+    """
+    settings = []
+    if ef_search and int(ef_search) != HNSW_EF_SEARCH:
+        settings.append(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+    if probes and int(probes) != IVFFLAT_PROBES:
+        settings.append(f"SET LOCAL ivfflat.probes = {int(probes)}")
+    if not settings:
+        return
+    try:
+        db.execute(text("; ".join(settings)))
+    except Exception as e:
+        # La transacción queda abortada: deshacer y buscar con los valores por defecto
+        db.rollback()
+        logger.warning(f"Vector search tuning skipped: {e}")
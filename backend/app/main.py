@@ -1,5 +1,10 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from app.utils.logging_config import setup_structured_logging, bind_request
+
+# JSON logs written off the request thread (before any module configures logging)
+setup_structured_logging()
+
 from app.modules.usuarios.router import router as usuarios_router
 from app.modules.empresas.router import router as empresas_router
 from app.modules.convenios.router import router as convenios_router
@@ -11,6 +16,8 @@ from app.modules.alertas.router import router as alertas_router
 from app.modules.ia.router import router as ia_router
 from app.modules.articulos.search_router import router as articulos_search_router
 from app.modules.admin.router import router as admin_router
+from app.services.monitoring import metrics_payload
+from app.services.http_client import http_client
 
 
 from app.db.database import engine
@@ -23,8 +30,11 @@ from app.modules.usuarios import models as user_models
 Base.metadata.create_all(bind=engine)
 
 # Auto-migration: Check and patch missing columns (Schema Drift)
-from app.db.schema_patch import patch_database
+from app.db.schema_patch import patch_database, verify_vector_index, verify_chunk_metadata_indexes
 patch_database()
+# Index checks only log: builds are migrations (scripts/migrate_add_*_index*.py), not worker boot
+verify_vector_index()
+verify_chunk_metadata_indexes()
 
 app = FastAPI(title="Asistente Handling API", description="Backend legal modular para el sector handling aeroportuario español.")
 
@@ -46,6 +56,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Binds X-Request-ID (or a new one) to every log record of the request and echoes it back."""
+    request_id = bind_request(request.headers.get("X-Request-ID"))
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 
 app.include_router(usuarios_router, prefix="/api")
 app.include_router(empresas_router, prefix="/api")
@@ -62,3 +80,14 @@ app.include_router(admin_router, prefix="/api")
 @app.get("/")
 def read_root():
     return {"msg": "API Asistente Handling funcionando"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint: stage latencies, retrieval branches, prompt tokens, cache hits."""
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
+
+@app.on_event("shutdown")
+async def close_http_client():
+    """Closes the shared HTTP pool (Gemini / OpenAI keep-alive connections)."""
+    await http_client.aclose()
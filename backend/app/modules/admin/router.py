@@ -59,6 +59,19 @@ def get_admin_stats(
         "active_users": active_users
     }
 
+@router.get("/cache/stats")
+def get_cache_stats(_ = Depends(require_superuser)):
+    """Hit ratio de las cachés del chat (respuestas completas + QueryExpander)."""
+    from app.services.answer_cache import answer_cache
+    from app.services.rag_engine import rag_engine
+
+    expander = rag_engine.query_expander
+    return {
+        "answers": answer_cache.stats(),
+        "query_expansion": expander.cache.stats(),
+        "query_understanding": expander.understanding_cache.stats(),
+    }
+
 @router.get("/users", response_model=List[AdminUserSchema])
 def list_users(
     skip: int = 0,
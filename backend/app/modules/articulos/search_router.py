@@ -1,12 +1,24 @@
+import asyncio
+import logging
+import time
 from fastapi import APIRouter, Query, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.db.database import SessionLocal
+from app.db.database import SessionLocal, run_with_session
 from app.services.rag_engine import rag_engine
-from app.constants import VALID_COMPANIES, SECTOR_COMPANIES
+from app.services.calculator_service import CalculatorService
+from app.services.answer_cache import answer_cache
+from app.services.corpus_version import corpus_version
+from app.services.monitoring import StageTimer
+from app.services.audit_dispatcher import audit_dispatcher
+from app.utils.sse import SSE_HEADERS, sse_event
+from app.prompts import IntentType
+from app.constants import VALID_COMPANIES, SECTOR_COMPANIES, AUDIT_STREAM_WAIT_SECONDS
 from pydantic import BaseModel
 from typing import List, Optional, Any
 
 router = APIRouter(prefix="/articulos/search", tags=["articulos_search"])
+logger = logging.getLogger(__name__)
 
 # Dependency
 def get_db():
@@ -31,6 +43,12 @@ class ChatResponse(BaseModel):
     answer: str
     sources: List[dict]
     audit: Optional[AuditStatus] = None
+    answer_id: Optional[str] = None  # Verdict via GET /chat/audit/{answer_id}
+
+class AuditResult(BaseModel):
+    answer_id: str
+    status: str  # pending | done | skipped
+    audit: Optional[AuditStatus] = None
 
 @router.get("/")
 def search_articulos(
@@ -40,68 +58,90 @@ def search_articulos(
     results = rag_engine.search(query=q, db=db)
     return {"results": results}
 
+def _build_salary_context(db: Session, company_slug: str, user_context: Optional[dict]) -> str:
+    """
+    HYBRID RAG: TOOL CALLING (Structured Data).
+    Injects SQL salary tables from CalculatorService for the user's profile.
+    """
+    try:
+        # Extract profile from User user_context (provided by frontend)
+        # Default to "Serv. Auxiliares" / "Nivel 3" if missing
+        user_ctx = user_context or {}
+        
+        group = user_ctx.get('job_group', "Serv. Auxiliares")
+        level = user_ctx.get('salary_level', "Nivel 3")
+        
+        # Map logic for "Entry Level" variations if needed, or rely on strict string matching.
+        # ideally the frontend sends strings that match DB keys.
+
+        calc_service = CalculatorService(db)
+        
+        # Inject data for the SPECIFIC user profile
+        # AND ALSO the full GROUP table for comparisons
+        
+        # 1. User specific table (High precision for "Mi sueldo")
+        user_table = calc_service.get_formatted_salary_table(
+            company_slug, 
+            group, 
+            level
+        )
+        
+        # 2. Group table (Context for "Diferencia nivel 1 y 2")
+        group_table = calc_service.get_group_salary_table_markdown(
+            company_slug,
+            group
+        )
+        
+        logger.debug("   💰 Injecting SQL Salary Tables (User + Full Group) for %s", company_slug)
+        return f"{user_table}\n\n{group_table}"
+        
+    except Exception as e:
+        logger.error(f"Failed to inject structured data: {e}")
+        return ""
+
+async def _timed(timer: StageTimer, stage: str, coro):
+    """Cronometra una etapa que corre en paralelo con otras (asyncio.gather)."""
+    with timer.stage(stage):
+        return await coro
+
 @router.post("/chat", response_model=ChatResponse)
-def chat_with_docs(
-    request: ChatRequest,
-    db: Session = Depends(get_db)
-):
-    # 0. Rewrite query with history if available
-    final_query = request.query
-    # 0. Rewrite query (handling history + keyword enhancement)
-    final_query = rag_engine.rewrite_query(request.query, request.history)
-    if final_query != request.query:
-        print(f"🔄 Rewritten Query: '{request.query}' -> '{final_query}'")
+async def chat_with_docs(request: ChatRequest):
+    """
+    Async chat pipeline. Gemini calls are awaited (no threadpool worker blocked)
+    and independent stages run concurrently, each DB stage with its own session:
+    
+        understanding (rewrite + expansion) -> intent -> [ search (retrieval + anchors) | SQL salary tables ] -> answer
     
-    # 0.5 Validate company_slug
+    The auditor runs in the background (AuditDispatcher) for a sample of answers
+    (AUDIT_SAMPLE_RATE, off by default): those are returned with an answer_id and
+    the verdict is fetched from GET /chat/audit/{answer_id}.
+    Every stage (and the search sub-stages) is timed and logged per request,
+    and exported as Prometheus histograms on /metrics.
+    """
+    # 0. Validate company_slug (before spending any LLM call)
     if request.company_slug and request.company_slug not in VALID_COMPANIES:
         raise HTTPException(status_code=400, detail=f"Invalid company_slug. Must be one of: {', '.join(VALID_COMPANIES)}")
 
-    # 1.5 Detect Intent (Now Profile-Aware)
-    intent = rag_engine.detect_intent(final_query, company_slug=request.company_slug)
-    print(f"🧠 Detected Intent: {intent}")
+    timer = StageTimer("chat")
+    try:
+        return await _chat_pipeline(request, timer)
+    finally:
+        timer.log()
 
-    # --- HYBRID RAG: TOOL CALLING (Structured Data) ---
-    # If intent is SALARY, inject SQL data from CalculatorService
-    structured_data_context = ""
-    from app.services.calculator_service import CalculatorService
-    from app.prompts import IntentType
-    
-    if intent == IntentType.SALARY and request.company_slug:
-        try:
-            # Extract profile from User user_context (provided by frontend)
-            # Default to "Serv. Auxiliares" / "Nivel 3" if missing
-            user_ctx = request.user_context or {}
-            
-            group = user_ctx.get('job_group', "Serv. Auxiliares")
-            level = user_ctx.get('salary_level', "Nivel 3")
-            
-            # Map logic for "Entry Level" variations if needed, or rely on strict string matching.
-            # ideally the frontend sends strings that match DB keys.
-
-            calc_service = CalculatorService(db)
-            
-            # Inject data for the SPECIFIC user profile
-            # AND ALSO the full GROUP table for comparisons
-            
-            # 1. User specific table (High precision for "Mi sueldo")
-            user_table = calc_service.get_formatted_salary_table(
-                request.company_slug, 
-                group, 
-                level
-            )
-            
-            # 2. Group table (Context for "Diferencia nivel 1 y 2")
-            group_table = calc_service.get_group_salary_table_markdown(
-                request.company_slug,
-                group
-            )
-            
-            structured_data_context = f"{user_table}\n\n{group_table}"
-            print(f"   💰 Injecting SQL Salary Tables (User + Full Group) for {request.company_slug}")
-            
-        except Exception as e:
-            print(f"Failed to inject structured data: {e}")
-    # --------------------------------------------------
+async def _retrieve_context(request: ChatRequest, timer: StageTimer) -> dict:
+    """
+    Everything before generation, shared by /chat and /chat/stream:
+    understanding -> intent -> [ search | SQL salary tables | corpus version ] -> answer cache lookup.
+    """
+    # 0.5 Query understanding: rewrite (history + keyword enhancement) AND expansion in one LLM call
+    with timer.stage("understanding"):
+        final_query, expansion = await rag_engine.understand_query_async(request.query, request.history)
+    if final_query != request.query:
+        logger.info(f"🔄 Rewritten Query: '{request.query}' -> '{final_query}'")
+
+    # 1. Detect Intent (Now Profile-Aware)
+    intent = rag_engine.detect_intent(final_query, company_slug=request.company_slug)
+    logger.info(f"🧠 Detected Intent: {intent}", extra={"intent": str(intent), "company_slug": request.company_slug})
 
     # --- MAPPING SECTOR COMPANIES ---
     # Companies that adhere to the Sector Agreement (convenio-sector)
@@ -109,36 +149,201 @@ def chat_with_docs(
     target_slug = request.company_slug
     
     if request.company_slug in SECTOR_COMPANIES:
-        print(f"🔀 Redirecting '{request.company_slug}' to 'convenio-sector' for document search")
+        logger.debug("🔀 Redirecting '%s' to 'convenio-sector' for document search", request.company_slug)
         target_slug = "convenio-sector"
     # --------------------------------
 
-    # 1. Search relevant chunks (increased limit to capture tables)
-    results = rag_engine.search(query=final_query, company_slug=target_slug, db=db, limit=12)
+    # 2. Independent stages in parallel:
+    #    - Search relevant chunks (increased limit to capture tables)
+    #    - If intent is SALARY, inject SQL data from CalculatorService
+    #    - Corpus fingerprint for the answer cache (memoized, usually free)
+    search_task = _timed(timer, "search", rag_engine.search_async(
+        query=final_query, company_slug=target_slug, limit=12, expansion=expansion, timer=timer
+    ))
+    version_task = _timed(timer, "corpus_version", run_with_session(corpus_version.combined))
+    if intent == IntentType.SALARY and request.company_slug:
+        salary_task = _timed(timer, "salary_context", run_with_session(_build_salary_context, request.company_slug, request.user_context))
+        results, structured_data_context, current_version = await asyncio.gather(search_task, salary_task, version_task)
+    else:
+        results, current_version = await asyncio.gather(search_task, version_task)
+        structured_data_context = ""
+
+    # 2.5 Answer cache: same question + same profile + same corpus -> same answer.
+    # Follow-ups depend on the conversation, so only first turns are cached.
+    cache_key = None
+    cached = None
+    if not request.history:
+        answer_cache.sync_corpus_version(current_version)
+        cache_key = answer_cache.build_key(
+            final_query, target_slug, request.user_context, intent, results, current_version
+        )
+        cached = answer_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"⚡ Answer cache hit ({answer_cache.stats()['hit_ratio']:.0%} hit ratio)")
+
+    return {
+        "intent": intent,
+        "results": results,
+        "structured_data": structured_data_context,
+        "cache_key": cache_key,
+        "cached": cached,
+    }
+
+async def _chat_pipeline(request: ChatRequest, timer: StageTimer):
+    context = await _retrieve_context(request, timer)
+    results = context["results"]
+
+    cached = context["cached"]
+    if cached is not None:
+        return {
+            "answer": cached["text"],
+            "sources": results,
+            "audit": cached.get("audit"),
+            "answer_id": cached.get("answer_id")
+        }
     
-    # 4. Generate Answer (RAG)
+    # 3. Generate Answer (RAG)
     # Returns dict {"text": str, "audit": dict}
-    gen_result = rag_engine.generate_answer(
-        query=request.query, 
-        context_chunks=results, 
-        intent=intent,
-        user_context=request.user_context, # Pass user_context here
-        structured_data=structured_data_context,
-        history=request.history,
-        db=db
-    )
-    
+    with timer.stage("generation"):
+        gen_result = await rag_engine.generate_answer_async(
+            query=request.query, 
+            context_chunks=results, 
+            intent=context["intent"],
+            user_context=request.user_context, # Pass user_context here
+            structured_data=context["structured_data"],
+            history=request.history,
+            timer=timer
+        )
+
     # Handle legacy string return just in case
     if isinstance(gen_result, str):
-        final_answer = gen_result
-        audit_data = None
-    else:
-        final_answer = gen_result.get("text", "Error generanda respuesta")
-        audit_data = gen_result.get("audit")
+        gen_result = {"text": gen_result, "audit": None}
+
+    # Only successful Gemini answers carry prompt_bytes (errors are neither audited nor cached)
+    answer_id = None
+    if gen_result.get("prompt_bytes"):
+        answer_id = _cache_and_audit(request, context, gen_result)
 
     return {
-        "answer": final_answer,
+        "answer": gen_result.get("text", "Error generanda respuesta"),
         "sources": results,
-        "audit": audit_data
+        "audit": gen_result.get("audit"),
+        "answer_id": answer_id
     }
 
+def _cache_and_audit(request: ChatRequest, context: dict, gen_result: dict) -> Optional[str]:
+    """
+    Caches the answer right away and, if it is sampled for auditing (AUDIT_SAMPLE_RATE),
+    hands it to the background auditor; once the verdict arrives the cached entry is
+    updated with it. Returns the answer_id, or None when the answer is not audited.
+    """
+    cache_key = context["cache_key"]
+    if not audit_dispatcher.should_audit():
+        if cache_key:
+            answer_cache.put(cache_key, {**gen_result, "answer_id": None}, gen_result["prompt_bytes"])
+        return None
+
+    context_text = "\n\n".join(filter(None, [context["structured_data"]] + [c.get("content", "") for c in context["results"]]))
+
+    def cache_with_verdict(audit: dict) -> None:
+        answer_cache.put(cache_key, {**gen_result, "answer_id": answer_id, "audit": audit}, gen_result["prompt_bytes"])
+
+    answer_id = audit_dispatcher.submit(
+        request.query, str(context["intent"]), gen_result["text"], context_text,
+        on_verdict=cache_with_verdict if cache_key else None,
+    )
+    if cache_key:
+        answer_cache.put(cache_key, {**gen_result, "answer_id": answer_id}, gen_result["prompt_bytes"])
+    return answer_id
+
+@router.get("/chat/audit/{answer_id}", response_model=AuditResult)
+def get_answer_audit(answer_id: str):
+    """Auditor verdict for an answer_id returned by /chat or /chat/stream (kept AUDIT_RESULT_TTL_SECONDS)."""
+    record = audit_dispatcher.get(answer_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired answer_id")
+    return record
+
+@router.post("/chat/stream")
+async def chat_with_docs_stream(request: ChatRequest):
+    """
+    Streaming variant of /chat (Server-Sent Events):
+
+        event: sources  -> retrieved chunks, as soon as retrieval finishes
+        event: token    -> {"text": ...} for every Gemini chunk (stream=True)
+        event: answer   -> {"answer": full text, "answer_id": ...} as soon as generation ends
+        event: audit    -> {"answer", "answer_id", "status", "audit": AuditStatus | null}, last event
+        event: error    -> {"detail": ...} if the pipeline fails after the stream started
+
+    Only a sample of answers is audited (AUDIT_SAMPLE_RATE, off by default); the
+    others get status "unavailable". The verdict is computed in the background and
+    awaited for at most AUDIT_STREAM_WAIT_SECONDS; if it is still pending the audit
+    event says so and the client can fetch it later from GET /chat/audit/{answer_id}.
+    """
+    if request.company_slug and request.company_slug not in VALID_COMPANIES:
+        raise HTTPException(status_code=400, detail=f"Invalid company_slug. Must be one of: {', '.join(VALID_COMPANIES)}")
+
+    return StreamingResponse(
+        _chat_stream(request, StageTimer("chat_stream")),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+
+async def _chat_stream(request: ChatRequest, timer: StageTimer):
+    start = time.perf_counter()
+    try:
+        context = await _retrieve_context(request, timer)
+        yield sse_event("sources", context["results"])
+
+        cached = context["cached"]
+        if cached is not None:
+            yield sse_event("token", {"text": cached["text"]})
+            async for event in _answer_and_audit_events(cached["text"], cached.get("answer_id"), cached.get("audit"), timer):
+                yield event
+            return
+
+        gen_result = {}
+        with timer.stage("generation"):
+            async for item in rag_engine.stream_answer_async(
+                query=request.query,
+                context_chunks=context["results"],
+                intent=context["intent"],
+                user_context=request.user_context,
+                structured_data=context["structured_data"],
+                history=request.history,
+                timer=timer
+            ):
+                if "token" in item:
+                    if "first_token" not in timer.timings:
+                        timer.record("first_token", (time.perf_counter() - start) * 1000)
+                    yield sse_event("token", {"text": item["token"]})
+                else:
+                    gen_result = item
+
+        # Cache/audit only complete answers; errors are neither audited nor cached
+        answer_id = _cache_and_audit(request, context, gen_result) if gen_result.get("prompt_bytes") else None
+        async for event in _answer_and_audit_events(gen_result.get("text", ""), answer_id, None, timer):
+            yield event
+    except Exception as e:
+        logger.exception(f"❌ Chat stream error: {e}")
+        yield sse_event("error", {"detail": "Error generando la respuesta."})
+    finally:
+        timer.log()
+
+async def _answer_and_audit_events(answer: str, answer_id: Optional[str], audit: Optional[dict], timer: StageTimer):
+    """
+    `answer` event right away, then the `audit` follow-up: a verdict already known
+    (cache hit), the background one (awaited up to AUDIT_STREAM_WAIT_SECONDS) or
+    "unavailable" for answers that are not audited (errors, not sampled).
+    """
+    yield sse_event("answer", {"answer": answer, "answer_id": answer_id})
+
+    if audit is not None:
+        record = {"answer_id": answer_id, "status": "done", "audit": audit}
+    elif answer_id is None:
+        record = {"answer_id": None, "status": "unavailable", "audit": None}
+    else:
+        with timer.stage("audit_wait"):
+            record = await audit_dispatcher.wait(answer_id, AUDIT_STREAM_WAIT_SECONDS)
+        record = record or {"answer_id": answer_id, "status": "expired", "audit": None}
+    yield sse_event("audit", {"answer": answer, **record})
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Depends
+import os
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from sqlalchemy.orm import Session
-from app.db.database import get_db
+from app.db.database import SessionLocal, get_db
 from app.db.models import SalaryConceptDefinition, SalaryTable
-from app.schemas.salary import CalculationRequest, SalaryResponse
+from app.schemas.salary import CalculationRequest, SalaryResponse, BatchCalculationRequest, BatchSalaryResponse
 from app.services.calculator_service import CalculatorService
+from app.services.batch_calculator import BatchCalculatorService
+from app.services.roster_io import RosterError, roster_format, simulate_roster, spool_upload
 from app.constants import SECTOR_COMPANIES
 
 router = APIRouter(prefix="/calculadoras", tags=["calculadoras"])
@@ -94,6 +98,54 @@ def calcular_nomina_inteligente(
     service = CalculatorService(db)
     return service.calculate_smart_salary(request)
 
+@router.post("/smart/batch", response_model=BatchSalaryResponse)
+def calcular_nominas_lote(
+    request: BatchCalculationRequest,
+    db: Session = Depends(get_db)
+):
+    """Simula la nómina de una plantilla completa (un resultado por empleado + agregados)"""
+    service = BatchCalculatorService(db)
+    return service.calculate_batch(request.employees)
+
+ROSTER_MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "parquet": "application/vnd.apache.parquet"}
+
+@router.post("/smart/roster")
+def simular_roster(file: UploadFile = File(...), output: Optional[str] = None):
+    """
+    Simula la nómina de un fichero de plantilla (CSV o Parquet, una fila por empleado)
+    y devuelve los resultados en streaming (CSV o Parquet, desglose en columnas).
+    """
+    input_format = roster_format(file.filename)
+    output_format = output or input_format
+    path = spool_upload(file.file, input_format)
+
+    # Sesión propia: el streaming continúa después de que el endpoint retorne
+    db = SessionLocal()
+    try:
+        total, chunks = simulate_roster(db, path, input_format, output_format)
+    except Exception as e:
+        db.close()
+        os.unlink(path)
+        if isinstance(e, RosterError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
+
+    def stream():
+        try:
+            yield from chunks
+        finally:
+            db.close()
+            os.unlink(path)
+
+    return StreamingResponse(
+        stream(),
+        media_type=ROSTER_MEDIA_TYPES[output_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="nominas.{output_format}"',
+            "X-Roster-Rows": str(total),
+        },
+    )
+
 # Temporary Endpoint for Production Seeding (User Self-Service)
 @router.post("/seed/sector")
 def seed_sector_definitions():
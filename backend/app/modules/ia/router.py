@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import httpx
+from app.services.http_client import http_client
 import os
 
 router = APIRouter(prefix="/ia", tags=["ia"])
@@ -10,7 +10,7 @@ class IAQuery(BaseModel):
     context: str = ""
 
 @router.post("/ask")
-def ask_ia(query: IAQuery):
+async def ask_ia(query: IAQuery):
     # Ejemplo de integración con OpenAI (puedes adaptar a Azure o modelo propio)
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
@@ -24,7 +24,8 @@ def ask_ia(query: IAQuery):
         ]
     }
     try:
-        response = httpx.post("https://api.openai.com/v1/chat/completions", json=payload, headers=headers, timeout=30)
+        # Shared pooled client (keep-alive, retries on 429/5xx)
+        response = await http_client.post_json("https://api.openai.com/v1/chat/completions", payload, headers=headers, timeout=30)
         response.raise_for_status()
         data = response.json()
         answer = data["choices"][0]["message"]["content"]
@@ -1,4 +1,5 @@
 
+import logging
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
@@ -9,6 +10,7 @@ from app.services.jwt_service import create_access_token, verify_token, get_pass
 
 router = APIRouter(prefix="/users", tags=["users"])
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
+logger = logging.getLogger(__name__)
 
 
 def get_db():
@@ -55,7 +57,7 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
         # The user provided company/group data in the register form, so we must adhere to it.
         if db_user.company_slug and db_user.job_group and db_user.salary_level:
              
-             print(f"🚀 AUTO-CREATING Initial Profile for {db_user.email}")
+             logger.info(f"🚀 AUTO-CREATING Initial Profile for user {db_user.id}")
              
              initial_profile = UserProfile(
                  user_id=db_user.id,
@@ -69,13 +71,11 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
              )
              db.add(initial_profile)
              db.commit()
-             print(f"   ✅ Initial Profile Created: ID {initial_profile.id}")
+             logger.info(f"✅ Initial Profile Created: ID {initial_profile.id}")
 
         return db_user
     except Exception as e:
-        print(f"CRITICAL ERROR creating user: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"CRITICAL ERROR creating user: {e}")
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
@@ -144,8 +144,8 @@ def get_my_profiles(db: Session = Depends(get_db), current_user: UserModel = Dep
 @router.post("/me/profiles", response_model=PydanticProfile)
 def create_profile(profile: ProfileCreate, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_user)):
     """Create a new professional profile."""
-    print(f"📝 Creating Profile for User {current_user.id} ({current_user.email})")
-    print(f"   Data: {profile.model_dump()}")
+    logger.info(f"📝 Creating Profile for User {current_user.id}", extra={"company_slug": profile.company_slug})
+    logger.debug("   Data: %s", profile.model_dump())
     
     try:
         # Ensure only one is active if it's the first one
@@ -179,18 +179,16 @@ def create_profile(profile: ProfileCreate, db: Session = Depends(get_db), curren
         
         if db_profile.is_active:
             # Deactivate others
-            print(f"   ⚡ activating new profile, deactivating {existing_count} others")
+            logger.debug("   ⚡ activating new profile, deactivating %d others", existing_count)
             db.query(UserProfile).filter(UserProfile.user_id == current_user.id).update({"is_active": False})
         
         db.add(db_profile)
         db.commit()
         db.refresh(db_profile)
-        print(f"   ✅ Profile Created ID: {db_profile.id}")
+        logger.info(f"✅ Profile Created ID: {db_profile.id}")
         return db_profile
     except Exception as e:
-        print(f"   ❌ CRITICAL ERROR creating profile: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"❌ CRITICAL ERROR creating profile: {e}")
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
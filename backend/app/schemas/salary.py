@@ -1,6 +1,8 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 
+from app.constants import BATCH_CALCULATION_MAX_EMPLOYEES
+
 class SalaryConcept(BaseModel):
     name: str
     amount: float
@@ -46,3 +48,22 @@ class SalaryResponse(BaseModel):
     breakdown: List[SalaryConcept]
     
     annual_gross: float # Proyección
+
+
+class BatchCalculationRequest(BaseModel):
+    employees: List[CalculationRequest] = Field(..., min_length=1, max_length=BATCH_CALCULATION_MAX_EMPLOYEES)
+
+class BatchAggregates(BaseModel):
+    employees: int
+    total_gross_monthly: float
+    total_net_monthly: float
+    total_variable_salary: float
+    total_social_security: float
+    total_irpf: float
+    total_annual_gross: float
+    average_gross_monthly: float
+    average_net_monthly: float
+
+class BatchSalaryResponse(BaseModel):
+    results: List[SalaryResponse] # Mismo orden que employees
+    aggregates: BatchAggregates
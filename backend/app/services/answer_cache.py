@@ -0,0 +1,137 @@
+"""
+Answer Cache - Caché de respuestas completas del chat.
+
+generate_answer construye un prompt de hasta 60k caracteres y llama a Gemini
+en cada petición, aunque el mismo perfil (empresa/grupo/nivel) haga la misma
+pregunta sobre el mismo convenio. La clave combina:
+
+- query reescrita canonicalizada (sin tildes, puntuación ni mayúsculas)
+- company_slug de búsqueda
+- todos los campos del user_context que el prompt muestra (PROFILE_FIELDS):
+  nombre y tipo de contrato también, o un usuario recibiría la respuesta
+  personalizada para otro
+- intent
+- version_hash de los chunks recuperados (chunk_metadata)
+- huella del corpus (CorpusVersion): cambia con cualquier reseed de
+  documentos o tablas salariales y con los UPDATE en sitio (checksum de
+  precios/conceptos y de los version_hash) -> invalidación automática
+"""
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from app.constants import ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS
+from app.services.monitoring import observe_cache_entries, observe_cache_lookup
+from app.services.semantic_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+# user_context fields rendered by RagEngine._build_answer_prompt (DATOS DEL USUARIO block)
+PROFILE_FIELDS = ("preferred_name", "job_group", "salary_level", "contract_type")
+
+
+class AnswerCache:
+    """LRU + TTL en proceso, con métricas de hit ratio y bytes ahorrados."""
+
+    def __init__(
+        self,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = ANSWER_CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        name: str = "answer",
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._corpus_version: Optional[str] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0  # Prompt + respuesta que no hubo que enviar/recibir de Gemini
+
+    @staticmethod
+    def build_key(
+        query: str,
+        company_slug: Optional[str],
+        user_context: Optional[dict],
+        intent: Any,
+        context_chunks: List[dict],
+        corpus_version: str,
+    ) -> str:
+        user_ctx = user_context or {}
+        # Missing and empty values render differently in the prompt, so keep them apart (None vs "")
+        profile = json.dumps({field: user_ctx.get(field) for field in PROFILE_FIELDS}, sort_keys=True, default=str)
+        version_hashes = sorted({str(c.get("version_hash")) for c in context_chunks if c.get("version_hash")})
+        parts = [
+            normalize_query(query),
+            company_slug or "general",
+            profile,
+            getattr(intent, "value", str(intent)),
+            ",".join(version_hashes),
+            corpus_version,
+        ]
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+    def sync_corpus_version(self, corpus_version: str) -> None:
+        """Si el corpus cambió (reseed), vacía la caché: las claves viejas ya no pueden acertar."""
+        with self._lock:
+            if self._corpus_version is not None and corpus_version != self._corpus_version:
+                logger.info(f"AnswerCache: corpus {self._corpus_version} -> {corpus_version}, dropping {len(self._entries)} answers")
+                self._entries.clear()
+                observe_cache_entries(self.name, 0)
+            self._corpus_version = corpus_version
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                    observe_cache_entries(self.name, len(self._entries))
+                self.misses += 1
+                observe_cache_lookup(self.name, "misses")
+                return None
+            self._entries.move_to_end(key)
+            result, _, saved_bytes = entry
+            self.hits += 1
+            observe_cache_lookup(self.name, "hits")
+            self.bytes_saved += saved_bytes
+            return copy.deepcopy(result)
+
+    def put(self, key: str, result: Dict[str, Any], prompt_bytes: int) -> None:
+        saved_bytes = prompt_bytes + len(result.get("text", "").encode("utf-8"))
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(result), self._clock() + self.ttl_seconds, saved_bytes)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            observe_cache_entries(self.name, len(self._entries))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            observe_cache_entries(self.name, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "corpus_version": self._corpus_version,
+            }
+
+
+answer_cache = AnswerCache()
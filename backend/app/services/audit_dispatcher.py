@@ -0,0 +1,238 @@
+"""
+Audit Dispatcher - Auditoría de respuestas en segundo plano.
+
+El auditor (AuditorService, otra llamada a Gemini con hasta 15k caracteres de
+contexto) ya no va en el camino de la respuesta: submit() devuelve un
+answer_id al instante y el veredicto se calcula en una tarea asyncio:
+
+- muestreo: cada auditoría es otra llamada a Gemini (dobla el gasto por
+  respuesta), así que solo se audita la fracción AUDIT_SAMPLE_RATE de las
+  respuestas (variable de entorno; por defecto 0 = desactivado).
+- pool acotado: AUDIT_MAX_CONCURRENCY llamadas a la vez (async, sobre el
+  cliente HTTP compartido), AUDIT_MAX_PENDING en cola; por encima, la
+  respuesta se entrega sin auditar (status "skipped").
+- circuit breaker: AUDIT_BREAKER_FAILURES auditorías seguidas fallidas o
+  lentas (> AUDIT_SLOW_CALL_SECONDS) abren el circuito; durante
+  AUDIT_BREAKER_RESET_SECONDS no se audita y después una llamada de prueba
+  decide si se cierra.
+- veredictos: se guardan por answer_id (TTL) para GET .../chat/audit/{answer_id}
+  y /chat/stream los espera con wait() para emitirlos como evento SSE.
+
+Estado por worker (en memoria), igual que AnswerCache.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+from app.constants import (
+    AUDIT_BREAKER_FAILURES,
+    AUDIT_BREAKER_RESET_SECONDS,
+    AUDIT_MAX_CONCURRENCY,
+    AUDIT_MAX_PENDING,
+    AUDIT_RESULT_MAX_ENTRIES,
+    AUDIT_RESULT_TTL_SECONDS,
+    AUDIT_SAMPLE_RATE,
+    AUDIT_SLOW_CALL_SECONDS,
+    AUDIT_TIMEOUT_SECONDS,
+)
+from app.services.auditor_service import auditor_service
+from app.services.monitoring import observe_stage
+from app.utils.audit_logger import log_audit_event
+
+logger = logging.getLogger(__name__)
+
+
+def audit_status(verdict: dict) -> dict:
+    """Auditor verdict ({"aprobado", "razon", "nivel_riesgo"}) -> AuditStatus shape."""
+    return {
+        "verified": bool(verdict.get("aprobado", False)),
+        "risk_level": verdict.get("nivel_riesgo", "UNKNOWN"),
+        "reason": verdict.get("razon", "Unknown"),
+    }
+
+
+class CircuitBreaker:
+    """
+        closed --(N fallos seguidos)--> open --(reset_seconds)--> half_open
+        half_open: una sola llamada de prueba -> éxito: closed / fallo: open
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = AUDIT_BREAKER_FAILURES,
+                 reset_seconds: float = AUDIT_BREAKER_RESET_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at >= self.reset_seconds:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("🟢 Auditor circuit closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    logger.warning(f"🔴 Auditor circuit open for {self.reset_seconds}s after {self._failures} failed/slow audits")
+                self._opened_at = self._clock()
+                self._trial_in_flight = False
+
+
+class AuditDispatcher:
+    def __init__(
+        self,
+        auditor=auditor_service,
+        sample_rate: float = AUDIT_SAMPLE_RATE,
+        max_concurrency: int = AUDIT_MAX_CONCURRENCY,
+        max_pending: int = AUDIT_MAX_PENDING,
+        timeout: float = AUDIT_TIMEOUT_SECONDS,
+        slow_call_seconds: float = AUDIT_SLOW_CALL_SECONDS,
+        breaker: Optional[CircuitBreaker] = None,
+        result_ttl: float = AUDIT_RESULT_TTL_SECONDS,
+        max_results: int = AUDIT_RESULT_MAX_ENTRIES,
+        audit_log: Callable = log_audit_event,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.auditor = auditor
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.slow_call_seconds = slow_call_seconds
+        self.breaker = breaker or CircuitBreaker()
+        self.result_ttl = result_ttl
+        self.max_results = max_results
+        self.audit_log = audit_log
+        self._clock = clock
+        # Async auditor calls share the HTTP/2 pool; the semaphore bounds how many are in flight
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._results: "OrderedDict[str, tuple]" = OrderedDict()
+
+    # --- API ---
+
+    def should_audit(self) -> bool:
+        """Sampling decision for one answer (AUDIT_SAMPLE_RATE; 0 disables the auditor)."""
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def submit(self, query: str, intent: str, answer: str, context_text: str,
+               on_verdict: Optional[Callable[[dict], None]] = None) -> str:
+        """Schedules the audit of `answer` (needs a running event loop) and returns its answer_id."""
+        answer_id = uuid.uuid4().hex
+        if not self.breaker.allow():
+            self._store(answer_id, "skipped", self._skipped("Auditor no disponible (circuito abierto)"))
+        elif len(self._tasks) >= self.max_pending:
+            logger.warning(f"⚠️ Auditor saturated ({len(self._tasks)} pending): answer {answer_id} not audited")
+            self._store(answer_id, "skipped", self._skipped("Auditor saturado"))
+        else:
+            self._store(answer_id, "pending", None)
+            task = asyncio.get_running_loop().create_task(
+                self._audit(answer_id, query, intent, answer, context_text, on_verdict)
+            )
+            self._tasks[answer_id] = task
+            task.add_done_callback(lambda _: self._tasks.pop(answer_id, None))
+        return answer_id
+
+    def get(self, answer_id: str) -> Optional[Dict[str, Any]]:
+        """{"answer_id", "status": pending | done | skipped, "audit": AuditStatus | None}, or None if unknown/expired."""
+        now = self._clock()
+        entry = self._results.get(answer_id)
+        if entry is None or entry[1] <= now:
+            self._results.pop(answer_id, None)
+            return None
+        return dict(entry[0])
+
+    async def wait(self, answer_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Like get(), but first waits up to `timeout` seconds for a pending verdict."""
+        task = self._tasks.get(answer_id)
+        if task is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.get(answer_id)
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    # --- Internals ---
+
+    async def _audit(self, answer_id: str, query: str, intent: str, answer: str, context_text: str,
+                     on_verdict: Optional[Callable[[dict], None]]) -> None:
+        start = time.perf_counter()
+        try:
+            async with self._slots:
+                start = time.perf_counter()  # slot wait is not auditor latency
+                verdict = await asyncio.wait_for(
+                    self.auditor.audit_response_async(query, answer, context_text), self.timeout
+                )
+        except asyncio.TimeoutError:
+            verdict = {"aprobado": True, "razon": "Audit Timeout", "nivel_riesgo": "UNKNOWN"}
+        except Exception as e:
+            logger.error(f"⚠️ Auditor task failed: {e}")
+            verdict = {"aprobado": True, "razon": "Auditor Exception", "nivel_riesgo": "UNKNOWN"}
+        elapsed = time.perf_counter() - start
+        observe_stage("auditor", "audit", elapsed * 1000)
+
+        # AuditorService reports its own errors (no key, HTTP error, exception) as nivel_riesgo UNKNOWN
+        if verdict.get("nivel_riesgo") == "UNKNOWN" or elapsed > self.slow_call_seconds:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+        self.audit_log(query, intent, answer, context_text, verdict)
+        status = audit_status(verdict)
+        self._store(answer_id, "done", status)
+        if on_verdict is not None:
+            try:
+                on_verdict(status)
+            except Exception as e:
+                logger.error(f"Audit callback failed for {answer_id}: {e}")
+
+    @staticmethod
+    def _skipped(reason: str) -> dict:
+        return {"verified": False, "risk_level": "UNKNOWN", "reason": reason}
+
+    def _store(self, answer_id: str, status: str, audit: Optional[dict]) -> None:
+        record = {"answer_id": answer_id, "status": status, "audit": audit}
+        self._results[answer_id] = (record, self._clock() + self.result_ttl)
+        self._results.move_to_end(answer_id)
+        while len(self._results) > self.max_results:
+            self._results.popitem(last=False)
+
+
+audit_dispatcher = AuditDispatcher(sample_rate=float(os.getenv("AUDIT_SAMPLE_RATE", AUDIT_SAMPLE_RATE)))
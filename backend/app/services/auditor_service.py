@@ -1,24 +1,53 @@
 import os
 import json
-import requests
+import logging
 import google.generativeai as genai
+from app.constants import GEMINI_API_BASE
 from app.prompts import AUDITOR_INSTRUCTIONS
+from app.services.http_client import http_client
+
+logger = logging.getLogger(__name__)
+
+AUDIT_HTTP_TIMEOUT_SECONDS = 10
 
 class AuditorService:
     def __init__(self):
         self.api_key = os.getenv("GOOGLE_API_KEY")
         # Use a lightweight model for auditing to keep latency low
-        self.audit_model_name = "gemini-2.0-flash" 
+        self.audit_model_name = "gemini-2.0-flash"
 
     def audit_response(self, query: str, response_text: str, context_text: str) -> dict:
         """
         Verifies if the response is faithful to the context and query.
         Returns a dict: {"aprobado": bool, "razon": str, "nivel_riesgo": str}
+        Blocking variant (shared sync pool); the chat pipeline uses audit_response_async().
         """
         if not self.api_key:
-            print("⚠️ Auditor skipped: No API Key")
+            logger.warning("⚠️ Auditor skipped: No API Key")
+            return {"aprobado": True, "razon": "No API Key", "nivel_riesgo": "UNKNOWN"}
+
+        try:
+            resp = http_client.post_json_sync(*self._request(query, response_text, context_text), timeout=AUDIT_HTTP_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.error(f"⚠️ Auditor Exec Error: {e}")
+            return {"aprobado": True, "razon": "Auditor Exception", "nivel_riesgo": "UNKNOWN"}
+        return self._verdict(resp)
+
+    async def audit_response_async(self, query: str, response_text: str, context_text: str) -> dict:
+        """Async variant of audit_response() on the shared HTTP/2 pool (no thread held while Gemini answers)."""
+        if not self.api_key:
+            logger.warning("⚠️ Auditor skipped: No API Key")
             return {"aprobado": True, "razon": "No API Key", "nivel_riesgo": "UNKNOWN"}
 
+        try:
+            resp = await http_client.post_json(*self._request(query, response_text, context_text), timeout=AUDIT_HTTP_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.error(f"⚠️ Auditor Exec Error: {e}")
+            return {"aprobado": True, "razon": "Auditor Exception", "nivel_riesgo": "UNKNOWN"}
+        return self._verdict(resp)
+
+    def _request(self, query: str, response_text: str, context_text: str):
+        """(url, payload, headers) for the generateContent REST call."""
         # Construct the specialized audit prompt
         prompt = f"""{AUDITOR_INSTRUCTIONS}
 
@@ -30,41 +59,37 @@ class AuditorService:
 
         [RESPUESTA GENERADA]:
         {response_text}
-        
+
         --- DICTAMEN (JSON) ---
         """
 
-        try:
-            # Direct REST call for speed and consistency
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/{self.audit_model_name}:generateContent?key={self.api_key}"
-            payload = {
-                "contents": [{"parts": [{"text": prompt}]}],
-                "generationConfig": {"response_mime_type": "application/json"} # Valid for newer Gemini models
-            }
-            
-            resp = requests.post(url, json=payload, headers={'Content-Type': 'application/json'}, timeout=10)
-            
-            if resp.status_code == 200:
-                result_json = resp.json()
-                try:
-                    text_content = result_json['candidates'][0]['content']['parts'][0]['text']
-                    # Clean markdown code blocks if present
-                    text_content = text_content.replace('```json', '').replace('```', '').strip()
-                    audit_result = json.loads(text_content)
-                    return audit_result
-                except Exception as e:
-                    print(f"⚠️ Auditor JSON parsing failed: {e}. Raw: {text_content}")
-                    # Fail open or closed? Let's strictly fail closed for safety, or open for MVP?
-                    # Let's Fail Closed (Reject) if we can't parse, just to be safe.
-                    return {"aprobado": False, "razon": "Audit Parsing Error", "nivel_riesgo": "MEDIUM"}
-                    
-            else:
-                 print(f"⚠️ Auditor API Error: {resp.status_code} - {resp.text}")
-                 return {"aprobado": True, "razon": "Audit API Error", "nivel_riesgo": "UNKNOWN"}
+        # Direct REST call for speed and consistency (API key in a header, not in the URL)
+        url = f"{GEMINI_API_BASE}/models/{self.audit_model_name}:generateContent"
+        payload = {
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {"response_mime_type": "application/json"} # Valid for newer Gemini models
+        }
+        headers = {'Content-Type': 'application/json', 'x-goog-api-key': self.api_key}
+        return url, payload, headers
 
-        except Exception as e:
-            print(f"⚠️ Auditor Exec Error: {e}")
-            return {"aprobado": True, "razon": "Auditor Exception", "nivel_riesgo": "UNKNOWN"}
+    def _verdict(self, resp) -> dict:
+        if resp.status_code == 200:
+            text_content = None
+            try:
+                result_json = resp.json()
+                text_content = result_json['candidates'][0]['content']['parts'][0]['text']
+                # Clean markdown code blocks if present
+                text_content = text_content.replace('```json', '').replace('```', '').strip()
+                audit_result = json.loads(text_content)
+                return audit_result
+            except Exception as e:
+                logger.warning(f"⚠️ Auditor JSON parsing failed: {e}", extra={"raw": text_content})
+                # Fail open or closed? Let's strictly fail closed for safety, or open for MVP?
+                # Let's Fail Closed (Reject) if we can't parse, just to be safe.
+                return {"aprobado": False, "razon": "Audit Parsing Error", "nivel_riesgo": "MEDIUM"}
+        else:
+             logger.error(f"⚠️ Auditor API Error: {resp.status_code}", extra={"body": resp.text})
+             return {"aprobado": True, "razon": "Audit API Error", "nivel_riesgo": "UNKNOWN"}
 
 # Singleton instance
 auditor_service = AuditorService()
@@ -0,0 +1,252 @@
+"""
+Batch Calculator - Simulación de nóminas para plantillas completas.
+
+Equivale a llamar a CalculatorService.calculate_smart_salary por cada
+empleado, pero:
+
+- las tarifas de todas las empresas del lote se cargan juntas
+  (tariff_model.get_many: una consulta por tabla para las que falten)
+- los precios se resuelven una vez por perfil (empresa, grupo, nivel) y por
+  concepto dinámico, no por empleado
+- base, prorrata, conceptos dinámicos, Seguridad Social e IRPF se calculan
+  como operaciones sobre arrays de NumPy (mismas fórmulas y mismo orden de
+  operaciones que el cálculo individual)
+
+Devuelve un SalaryResponse por empleado (mismo orden) y los agregados del lote.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import logging
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.constants import SECTOR_COMPANIES
+from app.schemas.salary import (
+    BatchAggregates,
+    BatchSalaryResponse,
+    CalculationRequest,
+    SalaryConcept,
+    SalaryResponse,
+)
+from app.services.calculator_service import CalculatorService
+from app.services.tariff_model import ConceptDefinition, tariff_model
+
+logger = logging.getLogger(__name__)
+
+# Mismos valores que calculate_smart_salary
+DEFAULT_PRICES = {
+    "BASE_ANNUAL": 15876.00,  # SMI approx fallback
+    "HORA_EXTRA": 12.0,
+    "HORA_PERENTORIA": 14.0,
+}
+FALLBACK_ANNUAL_SALARY = 18450.87  # SMI approx fallback 2024/25
+RATE_CC = 0.047
+RATE_FP = 0.001
+RATE_UNEMPLOYMENT_TEMPORAL = 0.0160
+RATE_UNEMPLOYMENT_INDEFINIDO = 0.0155
+DEFAULT_IRPF_RATE = 0.15
+PROPORTIONAL_INPUT_TYPES = ("checkbox", "select")  # Estado mensual fijo -> se aplica prorrata
+DIRECT_INPUT_TYPES = ("currency", "manual")  # El input ya es el importe
+
+ProfileKey = Tuple[str, str, str]  # (company_slug, user_group, user_level)
+
+
+@dataclass
+class _Profile:
+    """Todo lo que depende solo de (empresa, grupo, nivel): se resuelve una vez por lote."""
+    prices: dict
+    table_annual: float
+    definitions: Dict[str, ConceptDefinition]
+    plus_funcion_monthly: float = 0.0
+    progression_annual: float = 0.0
+    progression_level: Optional[str] = None
+    unit_prices: Dict[str, float] = field(default_factory=dict)
+
+
+class BatchCalculatorService:
+    def __init__(self, db: Session):
+        self.db = db
+        self.calculator = CalculatorService(db)
+        # Perfiles resueltos: se reutilizan entre llamadas (p. ej. los chunks de un roster)
+        self._profiles: Dict[ProfileKey, _Profile] = {}
+
+    def calculate_batch(self, requests: List[CalculationRequest]) -> BatchSalaryResponse:
+        n = len(requests)
+        keys = [self._profile_key(r) for r in requests]
+        profiles = self._resolve_profiles(keys)
+        rows = [profiles[key] for key in keys]
+
+        # --- 1. Base + prorrata (vectorizado) ---
+        requested_annual = np.array([r.gross_annual_salary or 0.0 for r in requests], dtype=np.float64)
+        table_annual = np.array([p.table_annual for p in rows], dtype=np.float64)
+        annual = np.where(requested_annual > 0, requested_annual, table_annual)
+        annual = np.where(annual <= 0, FALLBACK_ANNUAL_SALARY, annual)
+
+        prorata = np.array([r.contract_percentage for r in requests], dtype=np.float64) / 100.0
+        base_salary = (annual / 14.0) * prorata
+
+        twelve_payments = np.array([r.payments == 12 for r in requests])
+        prorata_extras = np.where(twelve_payments, (annual * 2 / 14.0) * prorata / 12.0, 0.0)
+        base_for_gross = base_salary + prorata_extras
+
+        # --- 2. EasyJet: Plus Función (fijo) + Plus Progresión (con prorrata) ---
+        plus_funcion = np.array([p.plus_funcion_monthly for p in rows], dtype=np.float64)
+        progression = (np.array([p.progression_annual for p in rows], dtype=np.float64) / 14.0) * prorata
+        auto_amount = plus_funcion + progression
+
+        # --- 3. Conceptos dinámicos: matriz empleados x códigos ---
+        codes = list(dict.fromkeys(code for r in requests for code in (r.dynamic_variables or {})))
+        column = {code: j for j, code in enumerate(codes)}
+        shape = (n, len(codes))
+        quantities = np.zeros(shape)
+        unit_prices = np.zeros(shape)
+        known = np.zeros(shape, dtype=bool)
+        proportional = np.zeros(shape, dtype=bool)
+        direct = np.zeros(shape, dtype=bool)
+
+        for i, (request, key, profile) in enumerate(zip(requests, keys, rows)):
+            for code, value in (request.dynamic_variables or {}).items():
+                j = column[code]
+                quantities[i, j] = value
+                definition = profile.definitions.get(code)
+                if definition is None:
+                    continue
+                known[i, j] = True
+                unit_prices[i, j] = self._unit_price(profile, key, definition)
+                proportional[i, j] = definition.input_type in PROPORTIONAL_INPUT_TYPES
+                direct[i, j] = definition.input_type in DIRECT_INPUT_TYPES
+
+        final_unit_prices = np.where(proportional, unit_prices * prorata[:, None], unit_prices)
+        amounts = np.where(direct, quantities, quantities * final_unit_prices)
+        amounts = np.where(known & (quantities > 0), amounts, 0.0)
+
+        # Suma columna a columna (mismo orden de suma que el bucle individual)
+        total_variable = np.zeros(n)
+        for j in range(len(codes)):
+            total_variable = total_variable + amounts[:, j]
+
+        # --- 4. Totales y deducciones ---
+        gross = base_for_gross + total_variable + auto_amount
+
+        temporal = np.array([r.contract_type == "temporal" for r in requests])
+        rate_unemployment = np.where(temporal, RATE_UNEMPLOYMENT_TEMPORAL, RATE_UNEMPLOYMENT_INDEFINIDO)
+        val_cc = gross * RATE_CC
+        val_unemployment = gross * rate_unemployment
+        val_fp = gross * RATE_FP
+        total_ss = val_cc + val_unemployment + val_fp
+
+        irpf_percentage = np.array(
+            [np.nan if r.irpf_percentage is None else r.irpf_percentage for r in requests], dtype=np.float64
+        )
+        irpf_rate = np.where(np.isnan(irpf_percentage), DEFAULT_IRPF_RATE, irpf_percentage / 100.0)
+        irpf = gross * irpf_rate
+
+        net = gross - (total_ss + irpf)
+        annual_gross = annual * prorata + (total_variable * 12)
+
+        # --- 5. Respuestas individuales (desglose en el orden de cada petición) ---
+        results = []
+        for i, (request, profile) in enumerate(zip(requests, rows)):
+            concepts = [SalaryConcept(name="Salario Base (Parte Proporcional)", amount=float(base_salary[i]), type="devengo")]
+            if twelve_payments[i]:
+                concepts.append(SalaryConcept(name="Prorrata Pagas Extra", amount=float(prorata_extras[i]), type="devengo"))
+            if profile.plus_funcion_monthly > 0:
+                concepts.append(SalaryConcept(name="Plus Función (Categoría)", amount=float(plus_funcion[i]), type="devengo"))
+            if profile.progression_annual > 0:
+                concepts.append(SalaryConcept(
+                    name=f"Plus Progresión ({profile.progression_level})", amount=float(progression[i]), type="devengo"
+                ))
+            for code in (request.dynamic_variables or {}):
+                j = column[code]
+                if known[i, j] and quantities[i, j] > 0:
+                    concepts.append(SalaryConcept(
+                        name=profile.definitions[code].name, amount=float(amounts[i, j]), type="devengo"
+                    ))
+
+            concepts.append(SalaryConcept(name="SS: Contingencias Comunes (4.70%)", amount=-float(val_cc[i]), type="deduccion"))
+            concepts.append(SalaryConcept(name=f"SS: Desempleo ({rate_unemployment[i]*100:.2f}%)", amount=-float(val_unemployment[i]), type="deduccion"))
+            concepts.append(SalaryConcept(name="SS: Formación Profesional (0.10%)", amount=-float(val_fp[i]), type="deduccion"))
+            concepts.append(SalaryConcept(name=f"Retención IRPF ({irpf_rate[i]*100:.1f}%)", amount=-float(irpf[i]), type="deduccion"))
+
+            results.append(SalaryResponse(
+                base_salary_monthly=round(float(base_salary[i]), 2),
+                variable_salary=round(float(total_variable[i]), 2),
+                gross_monthly_total=round(float(gross[i]), 2),
+                net_salary_monthly=round(float(net[i]), 2),
+                breakdown=concepts,
+                annual_gross=round(float(annual_gross[i]), 2),
+            ))
+
+        aggregates = BatchAggregates(
+            employees=n,
+            total_gross_monthly=round(float(gross.sum()), 2),
+            total_net_monthly=round(float(net.sum()), 2),
+            total_variable_salary=round(float(total_variable.sum()), 2),
+            total_social_security=round(float(total_ss.sum()), 2),
+            total_irpf=round(float(irpf.sum()), 2),
+            total_annual_gross=round(float(annual_gross.sum()), 2),
+            average_gross_monthly=round(float(gross.mean()), 2) if n else 0.0,
+            average_net_monthly=round(float(net.mean()), 2) if n else 0.0,
+        )
+        return BatchSalaryResponse(results=results, aggregates=aggregates)
+
+    @staticmethod
+    def _profile_key(request: CalculationRequest) -> ProfileKey:
+        return (
+            request.company_slug,
+            request.user_group or "Serv. Auxiliares",
+            request.user_level or "Nivel entrada",
+        )
+
+    def _resolve_profiles(self, keys: List[ProfileKey]) -> Dict[ProfileKey, _Profile]:
+        missing = [key for key in dict.fromkeys(keys) if key not in self._profiles]
+        if not missing:
+            return self._profiles
+
+        companies = {company for company, _, _ in missing}
+        # Todas las tarifas que puede tocar el lote, cargadas de una vez
+        slugs = set(companies)
+        slugs.update("convenio-sector" for company in companies if company in SECTOR_COMPANIES)
+        tariff_model.get_many(self.db, sorted(slugs))
+
+        profiles = self._profiles
+        for key in missing:
+            company, group, level = key
+            prices = self.calculator._get_salary_prices_from_db(company, group, level)
+            if not prices:
+                logger.warning(f"⚠️ Warning: No salary table found for {company}/{group}/{level}. Using defaults.")
+                prices = dict(DEFAULT_PRICES)
+
+            definitions_slug = "convenio-sector" if company in SECTOR_COMPANIES else company
+            profile = _Profile(
+                prices=prices,
+                table_annual=prices.get("SALARIO_BASE_ANUAL", prices.get("SALARIO_BASE", prices.get("BASE_ANNUAL", 0))),
+                definitions=self.calculator._tariff(definitions_slug).definitions,
+            )
+            if company == "easyjet":
+                self._apply_easyjet_category(profile, category_name=level, level_name=group)
+            profiles[key] = profile
+        return profiles
+
+    def _apply_easyjet_category(self, profile: _Profile, category_name: str, level_name: str) -> None:
+        # EasyJet: user_level = categoría, user_group = nivel (estructura invertida)
+        category = self.calculator._tariff("easyjet").categories.get(category_name)
+        if category is None:
+            logger.warning(f"⚠️ Warning: Could not find EasyJet category '{category_name}'")
+            return
+        if category.data.get('plus_funcion_fixed', 0) > 0:
+            profile.plus_funcion_monthly = category.data['plus_funcion_fixed'] / 12.0
+        level_data = category.levels.get(level_name)
+        if level_data and level_data.get('progression_plus', 0) > 0:
+            profile.progression_annual = level_data['progression_plus']
+            profile.progression_level = level_data['level']
+
+    def _unit_price(self, profile: _Profile, key: ProfileKey, definition: ConceptDefinition) -> float:
+        if definition.code not in profile.unit_prices:
+            company, group, level = key
+            profile.unit_prices[definition.code] = self.calculator._resolve_unit_price(
+                definition, company, group, level, profile.prices
+            )
+        return profile.unit_prices[definition.code]
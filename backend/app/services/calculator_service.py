@@ -1,14 +1,19 @@
-import os
-import json
+import logging
 from sqlalchemy.orm import Session
-from app.db.models import SalaryTable, SalaryConceptDefinition
 from app.schemas.salary import CalculationRequest, SalaryResponse, SalaryConcept
 from app.constants import SECTOR_COMPANIES
+from app.services.tariff_model import CompanyTariff, tariff_model
+
+logger = logging.getLogger(__name__)
 
 class CalculatorService:
     def __init__(self, db: Session):
         self.db = db
 
+    def _tariff(self, slug: str) -> CompanyTariff:
+        """Tarifa compilada en memoria (sin consultas mientras no cambie corpus_version.salary)."""
+        return tariff_model.get(self.db, slug)
+
     def calculate_smart_salary(self, request: CalculationRequest) -> SalaryResponse:
         """
         Calcula la nómina basada en el perfil del usuario (Company, Group, Level)
@@ -25,7 +30,7 @@ class CalculatorService:
         if not active_prices:
              # Fallback 1: Try Case-Insensitive partial match logic is handled inside helper? 
              # For now, if exact match fails, try default group/level
-             print(f"⚠️ Warning: No salary table found for {request.company_slug}/{user_group}/{user_level}. Using defaults.")
+             logger.warning(f"⚠️ Warning: No salary table found for {request.company_slug}/{user_group}/{user_level}. Using defaults.")
              active_prices = {
                  "BASE_ANNUAL": 15876.00, # SMI approx fallback
                  "HORA_EXTRA": 12.0,
@@ -40,7 +45,7 @@ class CalculatorService:
             annual_table_salary = active_prices.get("SALARIO_BASE_ANUAL", active_prices.get("SALARIO_BASE", active_prices.get("BASE_ANNUAL", 0)))
             
         if annual_table_salary <= 0:
-             print(f"⚠️ Warning: No salary entry for {request.company_slug}. Using absolute fallback.")
+             logger.warning(f"⚠️ Warning: No salary entry for {request.company_slug}. Using absolute fallback.")
              annual_table_salary = 18450.87 # SMI approx fallback 2024/25
 
         # LOGIC CHANGE: Base monthly is ALWAYS Annual / 14 (standard monthly payment)
@@ -78,13 +83,8 @@ class CalculatorService:
         # For EasyJet, automatically assign Plus Función, Plus Progresión, and Ad Personam
         easyjet_auto_amount = 0.0
         if request.company_slug == "easyjet":
-            # Load EasyJet structure to get category-specific data
-            easyjet_json_path = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'structure_templates', 'easyjet.json')
-            
+            # EasyJet structure (template compiled once in the tariff model)
             try:
-                with open(easyjet_json_path, 'r', encoding='utf-8') as f:
-                    easyjet_data = json.load(f)
-                
                 # IMPORTANT: EasyJet has inverted structure
                 # user_level = Category name (e.g., "Jefe de Área Tipo A")
                 # user_group = Level name (e.g., "Nivel 3")
@@ -93,23 +93,16 @@ class CalculatorService:
                 level_data = None
                 
                 # Search for category by name
-                for group in easyjet_data['structure']['groups']:
-                    for category in group['categories']:
-                        if category['name'] == request.user_level:
-                            category_data = category
-                            # Find specific level within category
-                            for level in category.get('levels', []):
-                                if level['level'] == request.user_group:
-                                    level_data = level
-                                    break
-                            break
-                    if category_data:
-                        break
+                category = self._tariff("easyjet").categories.get(request.user_level)
+                if category:
+                    category_data = category.data
+                    # Find specific level within category
+                    level_data = category.levels.get(request.user_group)
                 
                 if category_data:
-                    print(f"   🔍 Found EasyJet category: {category_data['name']}")
+                    logger.debug("   🔍 Found EasyJet category: %s", category_data['name'])
                     if level_data:
-                        print(f"   🔍 Found level: {level_data['level']}")
+                        logger.debug("   🔍 Found level: %s", level_data['level'])
                     
                     # 1. Plus Función (only for Jefes de Área)
                     if 'plus_funcion_fixed' in category_data and category_data['plus_funcion_fixed'] > 0:
@@ -123,7 +116,7 @@ class CalculatorService:
                             type="devengo"
                         ))
                         easyjet_auto_amount += plus_funcion_monthly
-                        print(f"   ✅ Auto-assigned Plus Función: {plus_funcion_monthly:.2f}€")
+                        logger.debug("   ✅ Auto-assigned Plus Función: %.2f€", plus_funcion_monthly)
                     
                     # 2. Plus Progresión (by level)
                     if level_data and 'progression_plus' in level_data and level_data['progression_plus'] > 0:
@@ -136,14 +129,12 @@ class CalculatorService:
                             type="devengo"
                         ))
                         easyjet_auto_amount += progression_monthly
-                        print(f"   ✅ Auto-assigned Plus Progresión: {progression_monthly:.2f}€")
+                        logger.debug("   ✅ Auto-assigned Plus Progresión: %.2f€", progression_monthly)
                 else:
-                    print(f"   ⚠️ Warning: Could not find EasyJet category '{request.user_level}'")
+                    logger.warning(f"⚠️ Warning: Could not find EasyJet category '{request.user_level}'")
                         
             except Exception as e:
-                print(f"   ⚠️ Warning: Could not load EasyJet automatic concepts: {e}")
-                import traceback
-                traceback.print_exc()
+                logger.exception(f"⚠️ Warning: Could not load EasyJet automatic concepts: {e}")
         
         # Calculate total from auto-assigned concepts (EasyJet)
         auto_assigned_total = sum(c.amount for c in concepts if c.type == "devengo")
@@ -156,13 +147,8 @@ class CalculatorService:
         if request.company_slug in SECTOR_COMPANIES:
             target_slug_for_definitions = "convenio-sector"
 
-        # Fetch definitions from DB for this company
-        db_concepts = self.db.query(SalaryConceptDefinition).filter(
-            SalaryConceptDefinition.company_slug == target_slug_for_definitions,
-            SalaryConceptDefinition.is_active == True
-        ).all()
-        
-        start_concept_map = {c.code: c for c in db_concepts}
+        # Active definitions for this company (compiled tariff model)
+        start_concept_map = self._tariff(target_slug_for_definitions).definitions
         
         # Process Dynamic Variables from Request
         if request.dynamic_variables:
@@ -171,30 +157,7 @@ class CalculatorService:
                     definition = start_concept_map[code]
                     
                     # Determine Unit Price
-                    # Default to DB metadata definition
-                    unit_price = definition.default_price or 0.0 
-                    
-                    # Priority 1: level_values (JSON field in SalaryConceptDefinition)
-                    # For concepts like HORA_EXTRA, HORA_PERENTORIA that have different prices per level
-                    if definition.level_values and isinstance(definition.level_values, dict):
-                        # EasyJet has inverted structure: user_level=category, user_group=level
-                        if request.company_slug == "easyjet":
-                            lookup_category = user_level  # user_level contains category
-                            lookup_level = user_group      # user_group contains level
-                        else:
-                            lookup_category = user_group
-                            lookup_level = user_level
-                        
-                        if lookup_category in definition.level_values:
-                            group_levels = definition.level_values[lookup_category]
-                            if isinstance(group_levels, dict) and lookup_level in group_levels:
-                                unit_price = group_levels[lookup_level]
-                                print(f"   💰 Using level-specific price for {code}: {unit_price}€ ({lookup_category}/{lookup_level})")
-                    
-                    # Priority 2: Salary Table (Specific for Group/Level)
-                    # If this concept matches a column in our extracted tables (e.g. HORA_EXTRA), use legitimate price
-                    if code in active_prices:
-                        unit_price = active_prices[code]
+                    unit_price = self._resolve_unit_price(definition, request.company_slug, user_group, user_level, active_prices)
                     
                     definitions_with_proportionality = ["checkbox", "select"] # Types that imply a fixed monthly status, not a quantity count
                     
@@ -271,91 +234,87 @@ class CalculatorService:
             annual_gross=round(annual_gross_est, 2)
         )
 
+    def _resolve_unit_price(self, definition, company_slug: str, user_group: str, user_level: str, active_prices: dict) -> float:
+        """Precio unitario de un concepto dinámico para un perfil (default < level_values < tabla salarial)."""
+        code = definition.code
+        # Default to DB metadata definition
+        unit_price = definition.default_price or 0.0 
+        
+        # Priority 1: level_values (JSON field in SalaryConceptDefinition)
+        # For concepts like HORA_EXTRA, HORA_PERENTORIA that have different prices per level
+        if definition.level_values and isinstance(definition.level_values, dict):
+            # EasyJet has inverted structure: user_level=category, user_group=level
+            if company_slug == "easyjet":
+                lookup_category = user_level  # user_level contains category
+                lookup_level = user_group      # user_group contains level
+            else:
+                lookup_category = user_group
+                lookup_level = user_level
+            
+            if lookup_category in definition.level_values:
+                group_levels = definition.level_values[lookup_category]
+                if isinstance(group_levels, dict) and lookup_level in group_levels:
+                    unit_price = group_levels[lookup_level]
+                    logger.debug("   💰 Using level-specific price for %s: %s€ (%s/%s)", code, unit_price, lookup_category, lookup_level)
+        
+        # Priority 2: Salary Table (Specific for Group/Level)
+        # If this concept matches a column in our extracted tables (e.g. HORA_EXTRA), use legitimate price
+        if code in active_prices:
+            unit_price = active_prices[code]
+        
+        return unit_price
+
     def _get_salary_prices_from_db(self, company_slug: str, group: str, level: str) -> dict:
         """
-        Fetches salary concepts from the database and returns a flattened dictionary
-        like {"BASE_ANNUAL": 20000, "HORA_EXTRA": 15.5}
+        Returns the salary concepts for a profile as a flattened dictionary
+        like {"BASE_ANNUAL": 20000, "HORA_EXTRA": 15.5}, from the compiled tariff model.
         """
         # MAPPING FIX: Sector Companies use 'convenio-sector' tables
         target_slug = company_slug
         if company_slug in SECTOR_COMPANIES:
             target_slug = "convenio-sector"
+        tariff = self._tariff(target_slug)
         
         # EASYJET SPECIFIC LOOKUP
         # EasyJet has inverted structure: user_level=category, user_group=level
         # We need to find the correct group and construct the full level name
         if company_slug == "easyjet":
-            # Load EasyJet structure to find the group for this category
-            easyjet_json_path = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'structure_templates', 'easyjet.json')
-            try:
-                with open(easyjet_json_path, 'r', encoding='utf-8') as f:
-                    easyjet_data = json.load(f)
+            # Find which group this category belongs to
+            category_name = level  # user_level contains category name
+            level_name = group    # user_group contains level name
+            
+            category = tariff.categories.get(category_name)
+            if category:
+                # Found the category, now construct the full level name
+                actual_group = category.group
+                actual_level = f"{category_name} - {level_name}"
                 
-                # Find which group this category belongs to
-                category_name = level  # user_level contains category name
-                level_name = group    # user_group contains level name
+                logger.debug("   🔍 EasyJet lookup: group='%s', level='%s'", actual_group, actual_level)
                 
-                for grp in easyjet_data['structure']['groups']:
-                    for cat in grp['categories']:
-                        if cat['name'] == category_name:
-                            # Found the category, now construct the full level name
-                            actual_group = grp['name']
-                            actual_level = f"{category_name} - {level_name}"
-                            
-                            print(f"   🔍 EasyJet lookup: group='{actual_group}', level='{actual_level}'")
-                            
-                            # Query with correct group and level
-                            rows = self.db.query(SalaryTable).filter(
-                                SalaryTable.company_id == target_slug,
-                                SalaryTable.group == actual_group,
-                                SalaryTable.level == actual_level
-                            ).order_by(SalaryTable.year.desc()).all()
-                            
-                            if rows:
-                                prices = {}
-                                for row in rows:
-                                    prices[row.concept] = row.amount if row.amount is not None else 0.0
-                                print(f"   ✅ Found {len(prices)} concepts for EasyJet")
-                                return prices
-                            break
-            except Exception as e:
-                print(f"   ⚠️ EasyJet lookup failed: {e}")
+                prices = tariff.prices(actual_group, actual_level)
+                if prices:
+                    logger.debug("   ✅ Found %d concepts for EasyJet", len(prices))
+                    return prices
         
         # NORMAL LOOKUP (for other companies)
-        rows = self.db.query(SalaryTable).filter(
-            SalaryTable.company_id == target_slug,
-            SalaryTable.group == group,
-            SalaryTable.level == level
-        ).order_by(SalaryTable.year.desc()).all()
-        
-        if not rows:
-             print(f"🔍 [DB] No exact level match for {company_slug}/{group}/{level}.")
+        prices = tariff.prices(group, level)
+        
+        if not prices:
+             logger.info(f"🔍 [DB] No exact level match for {company_slug}/{group}/{level}.")
+             # Fallbacks search the company's own rows (not the sector mapping)
+             own_tariff = self._tariff(company_slug)
              
              # Fallback Strategy 1: Try adding/removing " - " prefix (Common in EasyJet)
              # If user sends "Nivel 1" but DB has "Agente de Rampa - Nivel 1"
              if " - " not in level:
-                 # Try wildcards? No, distinct search.
-                 # Partial match fallback
-                 rows = self.db.query(SalaryTable).filter(
-                     SalaryTable.company_id == company_slug,
-                     SalaryTable.group == group,
-                     SalaryTable.level.contains(level) # Try to match "Nivel 1" inside "Agente... - Nivel 1"
-                 ).all()
-                 if rows:
-                     print(f"✅ Found partial match for {level}: {[r.level for r in rows][0]}")
+                 # Partial match fallback: "Nivel 1" inside "Agente... - Nivel 1"
+                 prices, matched_level = own_tariff.prices_matching(group, level)
+                 if prices:
+                     logger.info(f"✅ Found partial match for {level}: {matched_level}")
 
-             if not rows:
-                 print("⚠️ Fallback to Nivel 3 default.")
-                 rows = self.db.query(SalaryTable).filter(
-                     SalaryTable.company_id == company_slug,
-                     SalaryTable.group == group,
-                     SalaryTable.level.like("%Nivel 3%") # Relaxed fallback
-                 ).all()
-             
-        prices = {}
-        for row in rows:
-            # Safeguard: Ensure amount is a float, defaulting to 0.0 if None
-            prices[row.concept] = row.amount if row.amount is not None else 0.0
+             if not prices:
+                 logger.warning("⚠️ Fallback to Nivel 3 default.")
+                 prices, _ = own_tariff.prices_matching(group, "Nivel 3") # Relaxed fallback
             
         return prices
 
@@ -394,35 +353,16 @@ class CalculatorService:
         if company_slug in SECTOR_COMPANIES:
             target_slug = "convenio-sector"
             
-        print(f"📊 Fetching GROUP table for {target_slug} / {group}")
+        logger.debug("📊 Fetching GROUP table for %s / %s", target_slug, group)
 
         # Fetch all levels for this group
         # EasyJet Exception: Group is part of Level Name in DB? 
         # No, in DB EasyJet has: Group="Servicios Auxiliares", Level="Agente de Rampa - Nivel 3"
         # So filtering by Group should work fine.
         
-        rows = self.db.query(SalaryTable).filter(
-            SalaryTable.company_id == target_slug,
-            SalaryTable.group == group
-        ).order_by(SalaryTable.level, SalaryTable.year.desc()).all()
-        
-        if not rows:
-            return ""
-
-        # Organize by Level -> Concept -> Amount
-        data = {}
-        concepts = set()
-        
-        for row in rows:
-            lvl = row.level
-            if lvl not in data:
-                data[lvl] = {}
-            # Keep only the latest year if duplicates exist (handled by order_by, but dict overwrites sequentially if multiple years, we want latest first... wait, list is ordered by year desc, so first one is latest)
-            # Actually if we iterate, we might overwrite with older years if we don't check.
-            # Let's simple check if concept exists.
-            if row.concept not in data[lvl]:
-                data[lvl][row.concept] = row.amount
-                concepts.add(row.concept)
+        # Organize by Level -> Concept -> Amount (latest year per concept)
+        data = self._tariff(target_slug).group_levels(group)
+        concepts = {concept for level_concepts in data.values() for concept in level_concepts}
 
         if not data:
             return ""
@@ -0,0 +1,146 @@
+"""
+Chunk Sync - Ingesta incremental (diff + upsert) de un documento.
+
+seed_xml borraba y reinsertaba el documento entero (ventana con la empresa
+sin chunks + todo re-embebido) y seed_vectors lo saltaba si ya existía.
+Aquí el JSON parseado se compara con los DocumentChunk existentes por
+article_ref + hash de contenido:
+
+- artículos nuevos     -> INSERT (con embedding)
+- artículos cambiados  -> UPDATE de content/embedding
+- artículos eliminados -> DELETE
+- sin cambios          -> no se toca nada (ni siquiera el modelo)
+
+Si hubo algún cambio, se recalcula la metadata de todos los chunks del
+documento con un version_hash nuevo (derivado del contenido), lo que invalida
+la caché de LegalAnchors, y se actualiza legal_documents.updated_at (huella de
+corpus_version). Todo va en la transacción del llamador: sync_document no
+hace commit.
+"""
+import hashlib
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db.models import DocumentChunk, LegalDocument
+from app.services.chunk_metadata import build_chunk_metadata, document_year, generate_version_hash
+from app.services.embedding_cache import content_hash
+
+logger = logging.getLogger(__name__)
+
+# (article_ref, n-ésima aparición): un mismo article_ref puede repetirse en un documento
+ChunkKey = Tuple[str, int]
+
+
+def article_keys(refs: Iterable[Optional[str]]) -> List[ChunkKey]:
+    seen: Counter = Counter()
+    keys = []
+    for ref in refs:
+        ref = ref or ""
+        keys.append((ref, seen[ref]))
+        seen[ref] += 1
+    return keys
+
+
+@dataclass
+class ChunkDiff:
+    """Plan de cambios para un documento (claves de artículo)."""
+    inserted: List[ChunkKey] = field(default_factory=list)
+    updated: List[ChunkKey] = field(default_factory=list)
+    deleted: List[ChunkKey] = field(default_factory=list)
+    unchanged: List[ChunkKey] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.inserted or self.updated or self.deleted)
+
+    def summary(self) -> str:
+        return (
+            f"+{len(self.inserted)} ~{len(self.updated)} -{len(self.deleted)} "
+            f"={len(self.unchanged)}"
+        )
+
+
+def diff_chunks(current: Dict[ChunkKey, str], incoming: Dict[ChunkKey, str]) -> ChunkDiff:
+    """Compara contenidos (clave -> texto) por hash de contenido normalizado."""
+    diff = ChunkDiff()
+    for key, content in incoming.items():
+        if key not in current:
+            diff.inserted.append(key)
+        elif content_hash(current[key]) != content_hash(content):
+            diff.updated.append(key)
+        else:
+            diff.unchanged.append(key)
+    diff.deleted = [key for key in current if key not in incoming]
+    return diff
+
+
+def sync_document(
+    db: Session,
+    title: str,
+    articles: Sequence[Tuple[str, str]],
+    embedder,
+    company: Optional[str] = None,
+    category: str = "Convenio",
+    url_source: Optional[str] = None,
+) -> ChunkDiff:
+    """
+    Aplica el diff de `articles` [(article_ref, content)] sobre el documento `title`
+    (creándolo si no existe). Solo los artículos nuevos/cambiados pasan por `embedder`.
+    """
+    articles = [(ref, content) for ref, content in articles if content and content.strip()]
+
+    doc = db.execute(select(LegalDocument).where(LegalDocument.title == title)).scalars().first()
+    if doc is None:
+        doc = LegalDocument(title=title, category=category, company=company, url_source=url_source)
+        db.add(doc)
+        db.flush()  # doc.id para version_hash / document_id
+
+    existing = db.execute(
+        select(DocumentChunk).where(DocumentChunk.document_id == doc.id).order_by(DocumentChunk.id)
+    ).scalars().all()
+    current = dict(zip(article_keys(c.article_ref for c in existing), existing))
+    incoming = dict(zip(article_keys(ref for ref, _ in articles), articles))
+
+    diff = diff_chunks(
+        {key: chunk.content or "" for key, chunk in current.items()},
+        {key: content for key, (_, content) in incoming.items()},
+    )
+    if not diff.changed:
+        logger.info(f"ChunkSync: {title} sin cambios ({len(diff.unchanged)} chunks)")
+        return diff
+
+    # Embeddings antes de escribir nada: si el modelo falla, no queda nada a medias
+    to_embed = diff.inserted + diff.updated
+    vectors = dict(zip(to_embed, embedder.embed([incoming[key][1] for key in to_embed], label=title)))
+
+    for key in diff.deleted:
+        db.delete(current[key])
+
+    digest = hashlib.sha256("".join(content_hash(content) for _, content in incoming.values()).encode()).hexdigest()[:12]
+    version_hash = generate_version_hash(doc, document_year(doc), digest)
+
+    for key, (ref, content) in incoming.items():
+        chunk = current.get(key)
+        if chunk is None:
+            chunk = DocumentChunk(document_id=doc.id, article_ref=ref)
+            db.add(chunk)
+        if key in vectors:
+            chunk.content = content
+            chunk.embedding = vectors[key]
+        metadata = build_chunk_metadata(chunk, doc, version_hash=version_hash)
+        chunk.chunk_metadata = metadata
+        chunk.doc_id = metadata["doc_id"]
+
+    doc.company = company
+    doc.url_source = url_source or doc.url_source
+    doc.updated_at = datetime.utcnow()
+    db.flush()
+
+    logger.info(f"ChunkSync: {title} {diff.summary()} (version_hash={version_hash})")
+    return diff
@@ -0,0 +1,317 @@
+"""
+Context Packer - Empaqueta <contexto_interno> por presupuesto de tokens.
+
+_build_answer_prompt concatenaba todos los chunks más las dos tablas
+salariales en markdown y cortaba el resultado a MAX_CONTEXT_CHARS, a mitad de
+fila o de artículo, pagando tokens que no aportaban nada. Aquí:
+
+1. Se estima el coste de cada pieza (caracteres / CHARS_PER_TOKEN).
+2. Se eliminan chunks repetidos o casi idénticos (mismo artículo en varias
+   versiones/documentos): Jaccard de shingles >= CONTEXT_DUPLICATE_SIMILARITY.
+3. Las tablas markdown se comprimen: cabecera + filas relevantes (nivel del
+   usuario, niveles/términos de la pregunta) y sin columnas vacías.
+4. Las piezas entran por prioridad: tabla salarial del usuario y parentesco,
+   anclas y cálculos, artículos citados, tabla del grupo, anexos, vectorial.
+5. Se para en el presupuesto del intent (CONTEXT_TOKEN_BUDGETS). Una pieza
+   que no cabe entera se recorta por líneas completas (nunca a mitad de fila)
+   si queda sitio suficiente; si no, se descarta.
+"""
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from app.constants import (
+    CHARS_PER_TOKEN,
+    CONTEXT_DUPLICATE_SIMILARITY,
+    CONTEXT_MIN_TRUNCATED_TOKENS,
+    CONTEXT_TOKEN_BUDGET_DEFAULT,
+    CONTEXT_TOKEN_BUDGETS,
+)
+
+# Prioridad por rama de recuperación (RagEngine._run_search_stages -> "retrieval")
+BRANCH_PRIORITY = {
+    "anchor": 1,
+    "article": 2,
+    "anexo": 4,
+    "anexo_fallback": 5,
+    "vector": 6,
+}
+CALCULATION_PRIORITY = 1
+USER_TABLE_PRIORITY = 0
+KINSHIP_PRIORITY = 0
+GROUP_TABLE_PRIORITY = 3
+
+# Coste fijo aproximado de las etiquetas XML que envuelven cada pieza
+WRAPPER_TOKENS = 15
+TRUNCATION_MARKER = "...[recortado por presupuesto de contexto]"
+
+# Palabras de la pregunta que no sirven para elegir filas de una tabla
+STOPWORDS = {
+    "cuanto", "cuanta", "cuantos", "cuantas", "cobro", "cobra", "cobrar", "tengo", "tiene",
+    "puedo", "sobre", "segun", "entre", "desde", "hasta", "donde", "cuando", "porque",
+    "quiero", "saber", "tabla", "tablas", "salario", "salarial", "salariales", "sueldo",
+    "convenio", "articulo", "nivel", "niveles", "grupo", "para", "como", "cual", "esta",
+}
+# Preguntas comparativas: la tabla del grupo se deja completa
+COMPARISON_TERMS = ("diferencia", "compar", "todos los niveles", "cada nivel", "entre niveles")
+
+_LEVEL_MENTION = re.compile(r"\bnivel\s+([a-z0-9]+)\b")
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text: str) -> str:
+    """Minúsculas sin tildes (comparaciones robustas)."""
+    return "".join(
+        c for c in unicodedata.normalize("NFD", text or "") if unicodedata.category(c) != "Mn"
+    ).lower()
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _WORD.findall(normalize(text))
+    if len(words) < size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def similarity(a: str, b: str) -> float:
+    """Jaccard de shingles de 3 palabras."""
+    sa, sb = _shingles(a), _shingles(b)
+    if not sa or not sb:
+        return 0.0
+    return len(sa & sb) / len(sa | sb)
+
+
+def _is_table_line(line: str) -> bool:
+    return line.strip().startswith("|")
+
+
+def _is_separator(cells: List[str]) -> bool:
+    return bool(cells) and all(re.fullmatch(r":?-{3,}:?", cell.strip()) for cell in cells if cell.strip())
+
+
+def _cells(line: str) -> List[str]:
+    return [cell.strip() for cell in line.strip().strip("|").split("|")]
+
+
+def _matches(text: str, term: str) -> bool:
+    # "nivel 1" no debe coincidir con "nivel 10"
+    return re.search(rf"(?<![a-z0-9]){re.escape(term)}(?![a-z0-9])", text) is not None
+
+
+def compress_table(lines: List[str], terms: Sequence[str]) -> List[str]:
+    """
+    Tabla markdown -> cabecera + filas que contienen algún término (nivel del
+    usuario, niveles citados...) y, si la pregunta nombra alguna columna, solo
+    esas columnas (más la primera y el salario base). Después se quitan las
+    columnas vacías ('' o '-'). Sin coincidencias la tabla queda tal cual.
+    """
+    if len(lines) < 3 or not terms:
+        return lines
+
+    rows = [_cells(line) for line in lines]
+    header_count = 2 if _is_separator(rows[1]) else 1
+    body = rows[header_count:]
+    matched = [row for row in body if any(_matches(normalize(" ".join(row)), term) for term in terms)]
+    if not matched:
+        matched = body
+
+    header = rows[0]
+    width = max(len(row) for row in rows)
+    columns = list(range(width))
+    named = [
+        i for i in range(1, len(header))
+        if any(_matches(normalize(header[i]).replace("_", " "), term) for term in terms)
+    ]
+    if named:
+        columns = [
+            i for i in columns
+            if i == 0 or i in named or "salario base" in normalize(header[i] if i < len(header) else "").replace("_", " ")
+        ]
+    columns = [i for i in columns if i == 0 or any(i < len(row) and row[i] not in ("", "-") for row in matched)]
+
+    if len(matched) == len(body) and len(columns) == width:
+        return lines
+    kept = rows[:header_count] + matched
+    return ["| " + " | ".join(row[i] if i < len(row) else "" for i in columns) + " |" for row in kept]
+
+
+def compress_tables(text: str, terms: Sequence[str]) -> str:
+    """Aplica compress_table a cada bloque de líneas de tabla del texto."""
+    out: List[str] = []
+    block: List[str] = []
+    for line in (text or "").split("\n"):
+        if _is_table_line(line):
+            block.append(line)
+            continue
+        if block:
+            out.extend(compress_table(block, terms))
+            block = []
+        out.append(line)
+    if block:
+        out.extend(compress_table(block, terms))
+    return "\n".join(out)
+
+
+def truncate_lines(text: str, max_tokens: int) -> str:
+    """Corta por líneas completas hasta max_tokens (la marca de recorte incluida)."""
+    budget = max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER) - 1
+    kept, used = [], 0
+    for line in text.split("\n"):
+        if used + len(line) + 1 > budget:
+            break
+        kept.append(line)
+        used += len(line) + 1
+
+    # Una cabecera de tabla sin ninguna fila no aporta nada
+    tail = 0
+    while tail < len(kept) and _is_table_line(kept[len(kept) - 1 - tail]):
+        tail += 1
+    if tail and (tail == 1 or (tail == 2 and _is_separator(_cells(kept[-1])))):
+        del kept[len(kept) - tail:]
+
+    return "\n".join(kept + [TRUNCATION_MARKER]) if any(line.strip() for line in kept) else ""
+
+
+@dataclass
+class PackedContext:
+    """Resultado del empaquetado: piezas que entran en el prompt y estadísticas."""
+    structured_data: str = ""
+    kinship: str = ""
+    chunks: List[dict] = field(default_factory=list)
+    tokens: int = 0
+    budget: int = 0
+    input_tokens: int = 0
+    duplicates: int = 0
+    dropped: int = 0
+    truncated: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"{self.tokens}/{self.budget} tokens (input {self.input_tokens}), "
+            f"{len(self.chunks)} chunks, {self.duplicates} duplicates, "
+            f"{self.dropped} dropped, {self.truncated} truncated"
+        )
+
+
+@dataclass
+class _Piece:
+    kind: str          # "user_table" | "group_table" | "kinship" | "chunk"
+    priority: int
+    order: int
+    text: str
+    chunk: Optional[dict] = None
+
+
+class ContextPacker:
+    def __init__(self, budgets: Dict[str, int] = None, default_budget: int = CONTEXT_TOKEN_BUDGET_DEFAULT):
+        self.budgets = budgets if budgets is not None else CONTEXT_TOKEN_BUDGETS
+        self.default_budget = default_budget
+
+    def budget_for(self, intent) -> int:
+        return self.budgets.get(getattr(intent, "value", intent), self.default_budget)
+
+    def pack(
+        self,
+        query: str,
+        chunks: Sequence[dict],
+        intent=None,
+        structured_data: str = "",
+        user_context: Optional[dict] = None,
+        kinship: str = "",
+        budget: Optional[int] = None,
+    ) -> PackedContext:
+        budget = budget or self.budget_for(intent)
+        packed = PackedContext(budget=budget)
+        terms = self._table_terms(query, user_context)
+        comparison = any(term in normalize(query) for term in COMPARISON_TERMS)
+
+        pieces: List[_Piece] = []
+        user_table, group_table = self._split_structured(structured_data)
+        if user_table:
+            pieces.append(_Piece("user_table", USER_TABLE_PRIORITY, 0, user_table))
+        if group_table:
+            # Comparativas: todas las filas; si no, nivel del usuario + niveles citados
+            text = group_table if comparison else compress_tables(group_table, terms)
+            pieces.append(_Piece("group_table", GROUP_TABLE_PRIORITY, 1, text))
+        if kinship:
+            pieces.append(_Piece("kinship", KINSHIP_PRIORITY, 2, kinship))
+
+        kept_chunks: List[dict] = []
+        for order, chunk in enumerate(chunks, start=3):
+            content = chunk.get("content") or ""
+            if any(similarity(content, other.get("content") or "") >= CONTEXT_DUPLICATE_SIMILARITY for other in kept_chunks):
+                packed.duplicates += 1
+                continue
+            kept_chunks.append(chunk)
+            priority = CALCULATION_PRIORITY if chunk.get("calculation") else BRANCH_PRIORITY.get(chunk.get("retrieval"), BRANCH_PRIORITY["vector"])
+            pieces.append(_Piece("chunk", priority, order, compress_tables(content, terms), chunk))
+
+        packed.input_tokens = estimate_tokens(structured_data) + estimate_tokens(kinship) + sum(
+            estimate_tokens(c.get("content") or "") for c in chunks
+        )
+
+        # Prioridad estable: a igual prioridad, el orden de recuperación
+        selected: Dict[int, str] = {}
+        used = 0
+        for piece in sorted(pieces, key=lambda p: (p.priority, p.order)):
+            cost = estimate_tokens(piece.text) + WRAPPER_TOKENS
+            if used + cost <= budget:
+                selected[piece.order] = piece.text
+                used += cost
+                continue
+            remaining = budget - used - WRAPPER_TOKENS
+            text = truncate_lines(piece.text, remaining) if remaining >= CONTEXT_MIN_TRUNCATED_TOKENS else ""
+            if text:
+                selected[piece.order] = text
+                used += estimate_tokens(text) + WRAPPER_TOKENS
+                packed.truncated += 1
+            else:
+                packed.dropped += 1
+
+        # El prompt conserva el orden original (tablas, parentesco, chunks por rama)
+        for piece in sorted(pieces, key=lambda p: p.order):
+            if piece.order not in selected:
+                continue
+            text = selected[piece.order]
+            if piece.kind == "chunk":
+                packed.chunks.append({**piece.chunk, "content": text})
+            elif piece.kind == "kinship":
+                packed.kinship = text
+            else:
+                packed.structured_data = f"{packed.structured_data}\n\n{text}" if packed.structured_data else text
+        packed.tokens = used
+        return packed
+
+    @staticmethod
+    def _split_structured(structured_data: str):
+        """_build_salary_context -> (tabla del usuario, tabla del grupo)."""
+        if not structured_data:
+            return "", ""
+        marker = "### 📊 TABLA SALARIAL COMPLETA"
+        index = structured_data.find(marker)
+        if index == -1:
+            return structured_data.strip(), ""
+        return structured_data[:index].strip(), structured_data[index:].strip()
+
+    @staticmethod
+    def _table_terms(query: str, user_context: Optional[dict]) -> List[str]:
+        """Términos para elegir filas: nivel del usuario, niveles citados y palabras de la pregunta."""
+        terms = []
+        level = (user_context or {}).get("salary_level")
+        if level:
+            terms.append(normalize(level))
+        normalized = normalize(query)
+        terms.extend(f"nivel {match}" for match in _LEVEL_MENTION.findall(normalized))
+        terms.extend(
+            word for word in _WORD.findall(normalized)
+            if len(word) >= 5 and word not in STOPWORDS
+        )
+        return list(dict.fromkeys(terms))
+
+
+context_packer = ContextPacker()
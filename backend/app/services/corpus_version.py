@@ -0,0 +1,95 @@
+"""
+Corpus Version - Huella barata del estado de la base documental y salarial.
+
+Cualquier reseed (seed_xml, seed_vectors, seed_salary_tables...) cambia
+el número de filas, el id máximo o el updated_at de los documentos, así
+que la huella cambia y las cachés que dependen de ella se invalidan solas,
+incluso si el reseed se ejecuta en otro proceso.
+
+Los UPDATE en sitio no cambian ni el número de filas ni el id máximo
+(update_azul_prices.py reescribe default_price/name), así que la huella
+salarial es un md5 de todas las filas de salary_tables y
+salary_concept_definitions (tablas pequeñas: miles de filas) y la documental
+incluye un md5 de los version_hash distintos de document_chunks (chunk_sync
+los recalcula cuando cambia el contenido), sin leer el texto de cada chunk.
+
+La consulta es una sola ida y vuelta a Postgres y se memoriza
+CORPUS_VERSION_TTL_SECONDS por proceso para no pagarla en cada petición.
+"""
+import hashlib
+import logging
+import threading
+import time
+from typing import Dict
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.constants import CORPUS_VERSION_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_SQL = text("""
+    SELECT
+        (SELECT count(*) FROM document_chunks) AS chunk_count,
+        (SELECT max(id) FROM document_chunks) AS chunk_max_id,
+        (SELECT md5(coalesce(string_agg(DISTINCT version_hash, ','), ''))
+           FROM document_chunks) AS chunk_versions,
+        (SELECT max(updated_at) FROM legal_documents) AS documents_updated_at,
+        (SELECT md5(coalesce(string_agg(s::text, ';' ORDER BY s.id), ''))
+           FROM salary_tables s) AS salary_checksum,
+        (SELECT md5(coalesce(string_agg(c::text, ';' ORDER BY c.id), ''))
+           FROM salary_concept_definitions c) AS concept_checksum
+""")
+
+
+def _digest(*parts) -> str:
+    return hashlib.md5("|".join(str(p) for p in parts).encode()).hexdigest()[:12]
+
+
+class CorpusVersion:
+    """Memoiza la huella del corpus por proceso (thread-safe)."""
+
+    def __init__(self, ttl_seconds: int = CORPUS_VERSION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._versions: Dict[str, str] = {}
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _refresh(self, db: Session) -> Dict[str, str]:
+        now = time.monotonic()
+        with self._lock:
+            if now < self._expires_at:
+                return self._versions
+
+        row = db.execute(FINGERPRINT_SQL).one()
+        versions = {
+            "documents": _digest(row.chunk_count, row.chunk_max_id, row.chunk_versions, row.documents_updated_at),
+            "salary": _digest(row.salary_checksum, row.concept_checksum),
+        }
+        with self._lock:
+            if versions != self._versions and self._versions:
+                logger.info(f"CorpusVersion changed: {self._versions} -> {versions}")
+            self._versions = versions
+            self._expires_at = now + self.ttl_seconds
+        return versions
+
+    def documents(self, db: Session) -> str:
+        """Versión de legal_documents + document_chunks."""
+        return self._refresh(db)["documents"]
+
+    def salary(self, db: Session) -> str:
+        """Versión de salary_tables + salary_concept_definitions."""
+        return self._refresh(db)["salary"]
+
+    def combined(self, db: Session) -> str:
+        versions = self._refresh(db)
+        return f"{versions['documents']}-{versions['salary']}"
+
+    def invalidate(self) -> None:
+        """Fuerza la relectura en la próxima consulta (p.ej. tras un seed en este proceso)."""
+        with self._lock:
+            self._expires_at = 0.0
+
+
+corpus_version = CorpusVersion()
@@ -0,0 +1,101 @@
+"""
+Embedding Cache - Vectores persistidos por hash de contenido.
+
+Tras una actualización del BOE, seed_vectors/seed_xml/reingest re-embebían
+todos los artículos aunque el 95% del texto fuera idéntico. La clave es
+sha256(contenido normalizado + nombre del modelo): cambiar de modelo
+invalida la caché sin tocarla, y un artículo sin cambios nunca vuelve a
+pasar por SentenceTransformer.
+
+La tabla (embedding_cache) se consulta y escribe con sesiones propias, así
+que los vectores calculados sobreviven aunque falle la ingesta del documento.
+"""
+import hashlib
+import logging
+import unicodedata
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.constants import EMBEDDING_MODEL_NAME
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_CHUNK = 500  # hashes por SELECT ... WHERE content_hash IN (...)
+
+
+def normalize_content(text: str) -> str:
+    """Normalización que no cambia el significado: NFC + espacios colapsados."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+def content_hash(text: str, model_name: str = EMBEDDING_MODEL_NAME) -> str:
+    return hashlib.sha256(f"{model_name}\x00{normalize_content(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Lookup/almacenamiento por lotes en Postgres, con contadores de hits/misses."""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, session_factory=None):
+        self.model_name = model_name
+        self._session_factory = session_factory
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def session_factory(self):
+        if self._session_factory is None:
+            from app.db.database import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory
+
+    def hash(self, text: str) -> str:
+        return content_hash(text, self.model_name)
+
+    def lookup(self, hashes: Iterable[str]) -> Dict[str, List[float]]:
+        from app.db.models import EmbeddingCacheEntry
+
+        wanted = list(dict.fromkeys(hashes))
+        found: Dict[str, List[float]] = {}
+        try:
+            with self.session_factory() as db:
+                for offset in range(0, len(wanted), LOOKUP_CHUNK):
+                    rows = db.execute(
+                        select(EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.embedding).where(
+                            EmbeddingCacheEntry.content_hash.in_(wanted[offset:offset + LOOKUP_CHUNK])
+                        )
+                    ).all()
+                    found.update({row.content_hash: list(row.embedding) for row in rows})
+        except Exception as e:
+            # Sin caché se embebe todo: más lento, pero la ingesta sigue
+            logger.warning(f"EmbeddingCache lookup failed: {e}")
+        self.hits += len(found)
+        self.misses += len(wanted) - len(found)
+        return found
+
+    def store(self, vectors: Dict[str, List[float]]) -> None:
+        from app.db.models import EmbeddingCacheEntry
+
+        if not vectors:
+            return
+        rows = [
+            {"content_hash": h, "model_name": self.model_name, "embedding": list(v)}
+            for h, v in vectors.items()
+        ]
+        try:
+            with self.session_factory() as db:
+                for offset in range(0, len(rows), LOOKUP_CHUNK):
+                    stmt = insert(EmbeddingCacheEntry).values(rows[offset:offset + LOOKUP_CHUNK])
+                    db.execute(stmt.on_conflict_do_nothing(index_elements=["content_hash"]))
+                db.commit()
+        except Exception as e:
+            logger.warning(f"EmbeddingCache store failed: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,114 @@
+"""
+Gemini REST - Modo REST para RagEngine y QueryExpander (GEMINI_TRANSPORT=rest).
+
+GeminiRestModel expone el subconjunto de genai.GenerativeModel que usa el
+backend (generate_content, generate_content_async, stream=True y `.text`)
+pero va por el cliente HTTP compartido (http_client: pool HTTP/2, límites
+por host, reintentos) en lugar del transporte propio del SDK. Así todas las
+llamadas a Gemini del proceso comparten conexiones y configuración.
+"""
+import json
+import os
+from typing import Any, AsyncIterator, Dict, Optional
+
+import httpx
+
+from app.constants import GEMINI_API_BASE
+from app.services.http_client import http_client
+
+
+class GeminiRestError(RuntimeError):
+    """Respuesta no 2xx de la API REST de Gemini."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"Gemini API {status_code}: {detail}")
+        self.status_code = status_code
+
+
+def _camel(key: str) -> str:
+    head, *rest = key.split("_")
+    return head + "".join(part.capitalize() for part in rest)
+
+
+class GeminiResponse:
+    """Respuesta (o chunk de streaming) de generateContent con el `.text` del SDK."""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+
+    @property
+    def text(self) -> str:
+        candidates = self.data.get("candidates") or [{}]
+        parts = (candidates[0].get("content") or {}).get("parts") or []
+        texts = [part["text"] for part in parts if "text" in part]
+        if not texts:
+            # Same contract as the SDK: chunks with only finish_reason/safety metadata have no text
+            raise ValueError("Gemini response has no text parts")
+        return "".join(texts)
+
+
+class GeminiRestModel:
+    def __init__(self, model_name: str, api_key: Optional[str] = None, client=http_client):
+        self.model_name = model_name
+        self.api_key = api_key or os.getenv("GOOGLE_API_KEY")
+        self.client = client
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        # API key in a header, not in the URL (keeps it out of access logs)
+        return {"x-goog-api-key": self.api_key, "Content-Type": "application/json"}
+
+    def _url(self, method: str) -> str:
+        return f"{GEMINI_API_BASE}/models/{self.model_name}:{method}"
+
+    def _payload(self, prompt: str, generation_config: Optional[dict]) -> dict:
+        payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if generation_config:
+            payload["generationConfig"] = {_camel(key): value for key, value in dict(generation_config).items()}
+        return payload
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> GeminiResponse:
+        if response.status_code != 200:
+            raise GeminiRestError(response.status_code, response.text[:500])
+        return GeminiResponse(response.json())
+
+    def generate_content(self, prompt: str, generation_config: Optional[dict] = None) -> GeminiResponse:
+        response = self.client.post_json_sync(
+            self._url("generateContent"), self._payload(prompt, generation_config), headers=self.headers
+        )
+        return self._parse(response)
+
+    async def generate_content_async(self, prompt: str, generation_config: Optional[dict] = None, stream: bool = False):
+        """Like the SDK: a GeminiResponse, or an async iterator of chunks with stream=True."""
+        if stream:
+            return self._stream(prompt, generation_config)
+        response = await self.client.post_json(
+            self._url("generateContent"), self._payload(prompt, generation_config), headers=self.headers
+        )
+        return self._parse(response)
+
+    async def _stream(self, prompt: str, generation_config: Optional[dict]) -> AsyncIterator[GeminiResponse]:
+        """streamGenerateContent?alt=sse: one `data: {json}` line per chunk."""
+        async with self.client.stream(
+            "POST", self._url("streamGenerateContent") + "?alt=sse",
+            json=self._payload(prompt, generation_config), headers=self.headers,
+        ) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                raise GeminiRestError(response.status_code, body.decode("utf-8", errors="replace")[:500])
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    yield GeminiResponse(json.loads(line[5:]))
+
+
+def rest_transport_enabled() -> bool:
+    return os.getenv("GEMINI_TRANSPORT", "sdk").lower() == "rest"
+
+
+def generative_model(model_name: str):
+    """genai.GenerativeModel, or its REST twin over the shared pool with GEMINI_TRANSPORT=rest."""
+    if rest_transport_enabled():
+        return GeminiRestModel(model_name)
+    import google.generativeai as genai
+    return genai.GenerativeModel(model_name)
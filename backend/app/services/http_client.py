@@ -0,0 +1,239 @@
+"""
+HTTP Client - Cliente HTTP compartido para las APIs externas (Gemini, OpenAI).
+
+Un único pool de conexiones por worker en lugar de un `requests.post` /
+`httpx.post` por llamada (cada uno con su handshake TCP + TLS):
+
+- HTTP/2 con keep-alive: las llamadas a generativelanguage.googleapis.com se
+  multiplexan sobre la misma conexión.
+- Límite de peticiones concurrentes por host (HTTP_MAX_CONNECTIONS_PER_HOST).
+- Timeouts y reintentos (errores de conexión y 429/5xx, backoff exponencial,
+  respeta Retry-After hasta HTTP_RETRY_AFTER_MAX_SECONDS) configurados en un
+  solo sitio. En POST solo se reintentan errores en los que la petición no
+  llegó a salir: un ReadTimeout a mitad de una generación no se repite (y no
+  se paga dos veces).
+
+    response = await http_client.post_json(url, payload, headers=...)   # async
+    response = http_client.post_json_sync(url, payload, headers=...)    # hilos (p. ej. rutas sync)
+
+Incluye cliente async (event loop) y sync (threadpool) con la misma configuración.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.constants import (
+    HTTP_CONNECT_TIMEOUT_SECONDS,
+    HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_CONNECTIONS_PER_HOST,
+    HTTP_RETRIES,
+    HTTP_RETRY_AFTER_MAX_SECONDS,
+    HTTP_RETRY_BACKOFF_SECONDS,
+    HTTP_RETRY_STATUSES,
+    HTTP_TIMEOUT_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# The request never left the client: safe to retry even when it is not idempotent
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (httpx[http2])
+        return True
+    except ImportError:
+        logger.warning("h2 no instalado: el cliente HTTP compartido usará HTTP/1.1 (pip install 'httpx[http2]')")
+        return False
+
+
+class HttpClient:
+    def __init__(
+        self,
+        timeout: float = HTTP_TIMEOUT_SECONDS,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT_SECONDS,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        retries: int = HTTP_RETRIES,
+        backoff: float = HTTP_RETRY_BACKOFF_SECONDS,
+        max_retry_after: float = HTTP_RETRY_AFTER_MAX_SECONDS,
+        transport: Optional[httpx.BaseTransport] = None,
+        async_transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.max_per_host = max_per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        self._transport = transport
+        self._async_transport = async_transport
+        self._http2: Optional[bool] = None
+
+        self._lock = threading.Lock()
+        self._sync_client: Optional[httpx.Client] = None
+        self._sync_slots: Dict[str, threading.BoundedSemaphore] = {}
+        # The async client belongs to the event loop that created it
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop = None
+        self._async_slots: Dict[str, asyncio.Semaphore] = {}
+
+    # --- Clients (lazy) ---
+
+    def _use_http2(self) -> bool:
+        if self._http2 is None:
+            self._http2 = _http2_available()
+        return self._http2
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(
+                http2=self._use_http2(), timeout=self.timeout, limits=self.limits, transport=self._async_transport,
+            )
+            self._async_loop = loop
+            self._async_slots = {}
+        return self._async_client
+
+    @property
+    def sync_client(self) -> httpx.Client:
+        if self._sync_client is None:
+            with self._lock:
+                if self._sync_client is None:
+                    self._sync_client = httpx.Client(
+                        http2=self._use_http2(), timeout=self.timeout, limits=self.limits, transport=self._transport,
+                    )
+        return self._sync_client
+
+    # --- Per-host limits ---
+
+    @asynccontextmanager
+    async def _async_slot(self, url: str):
+        host = urlsplit(url).netloc
+        slot = self._async_slots.get(host)
+        if slot is None:
+            slot = self._async_slots[host] = asyncio.Semaphore(self.max_per_host)
+        async with slot:
+            yield
+
+    @contextmanager
+    def _sync_slot(self, url: str):
+        host = urlsplit(url).netloc
+        with self._lock:
+            slot = self._sync_slots.get(host)
+            if slot is None:
+                slot = self._sync_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+        with slot:
+            yield
+
+    # --- Retries ---
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0.0), self.max_retry_after)
+            except ValueError:
+                pass
+        return self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    @staticmethod
+    def _should_retry(method: str, attempt: int, retries: int,
+                      response: Optional[httpx.Response] = None, error: Optional[Exception] = None) -> bool:
+        if attempt >= retries:
+            return False
+        if error is not None:
+            return method.upper() in IDEMPOTENT_METHODS or isinstance(error, UNSENT_ERRORS)
+        return response.status_code in HTTP_RETRY_STATUSES
+
+    async def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs) -> httpx.Response:
+        """Async request with per-host limit and retries. Returns the last response (any status)."""
+        retries = self.retries if retries is None else retries
+        client = self.async_client
+        attempt = 0
+        while True:
+            response = None
+            try:
+                async with self._async_slot(url):
+                    response = await client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if not self._should_retry(method, attempt, retries, error=e):
+                    raise
+                logger.warning(f"HTTP {method} {urlsplit(url).netloc} failed ({e.__class__.__name__}), retrying")
+            else:
+                if not self._should_retry(method, attempt, retries, response):
+                    return response
+                logger.warning(f"HTTP {method} {urlsplit(url).netloc} -> {response.status_code}, retrying")
+            await asyncio.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    def request_sync(self, method: str, url: str, retries: Optional[int] = None, **kwargs) -> httpx.Response:
+        """Blocking variant of request() on the shared sync pool (for code running in threads)."""
+        retries = self.retries if retries is None else retries
+        client = self.sync_client
+        attempt = 0
+        while True:
+            response = None
+            try:
+                with self._sync_slot(url):
+                    response = client.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                if not self._should_retry(method, attempt, retries, error=e):
+                    raise
+                logger.warning(f"HTTP {method} {urlsplit(url).netloc} failed ({e.__class__.__name__}), retrying")
+            else:
+                if not self._should_retry(method, attempt, retries, response):
+                    return response
+                logger.warning(f"HTTP {method} {urlsplit(url).netloc} -> {response.status_code}, retrying")
+            time.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    async def post_json(self, url: str, payload: Any, headers: Optional[dict] = None,
+                        timeout: Optional[float] = None, retries: Optional[int] = None) -> httpx.Response:
+        kwargs = {"json": payload, "headers": headers}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        return await self.request("POST", url, retries=retries, **kwargs)
+
+    def post_json_sync(self, url: str, payload: Any, headers: Optional[dict] = None,
+                       timeout: Optional[float] = None, retries: Optional[int] = None) -> httpx.Response:
+        kwargs = {"json": payload, "headers": headers}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        return self.request_sync("POST", url, retries=retries, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs):
+        """Streaming response (e.g. SSE). Not retried: the body may already be half consumed."""
+        async with self._async_slot(url):
+            async with self.async_client.stream(method, url, **kwargs) as response:
+                yield response
+
+    # --- Shutdown ---
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+
+http_client = HttpClient()
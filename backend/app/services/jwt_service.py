@@ -1,10 +1,13 @@
 import jwt
 import os
+import logging
 from datetime import datetime, timedelta
 
 SECRET_KEY = os.getenv("JWT_SECRET", "supersecret")
 ALGORITHM = "HS256"
 
+logger = logging.getLogger(__name__)
+
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(hours=1)):
     to_encode = data.copy()
     expire = datetime.utcnow() + expires_delta
@@ -16,13 +19,13 @@ def verify_token(token: str):
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
     except jwt.ExpiredSignatureError:
-        print("❌ Token Error: Signature has expired", flush=True)
+        logger.info("❌ Token Error: Signature has expired")
         return None
     except jwt.InvalidTokenError as e:
-        print(f"❌ Token Error: Invalid token - {e}", flush=True)
+        logger.warning(f"❌ Token Error: Invalid token - {e}")
         return None
     except Exception as e:
-        print(f"❌ Token Error: Unexpected error - {e}", flush=True)
+        logger.error(f"❌ Token Error: Unexpected error - {e}")
         return None
 
 # --- Password Hashing Logic ---
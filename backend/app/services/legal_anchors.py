@@ -8,11 +8,14 @@ import logging
 from typing import List, Optional
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, Boolean, Integer
+from sqlalchemy import or_, select, func
 from app.db.models import DocumentChunk
 
 logger = logging.getLogger(__name__)
 
+# Intents que tienen anclas deterministas
+ANCHOR_INTENTS = ["LEAVE", "SALARY", "DISMISSAL"]
+
 
 class LegalAnchors:
     """
@@ -29,14 +32,97 @@ class LegalAnchors:
         Obtiene version_hash del convenio más reciente.
         ✅ MEJORA: Ordenar por ID desc para obtener el más reciente
         """
-        chunk = db.query(DocumentChunk).filter(
-            DocumentChunk.chunk_metadata['company'].astext == company
-        ).order_by(DocumentChunk.id.desc()).first()
+        version_hash = db.query(DocumentChunk.version_hash).filter(
+            DocumentChunk.company == company
+        ).order_by(DocumentChunk.id.desc()).limit(1).scalar()
         
-        if chunk and chunk.chunk_metadata:
-            return chunk.chunk_metadata.get('version_hash', 'default')
+        return version_hash or 'default'
+    
+    def _version_hash_subquery(self, company: str):
+        """_get_version_hash como subconsulta escalar (para no pagar una ida y vuelta aparte)."""
+        return func.coalesce(
+            select(DocumentChunk.version_hash).where(
+                DocumentChunk.company == company
+            ).order_by(DocumentChunk.id.desc()).limit(1).scalar_subquery(),
+            'default'
+        )
+    
+    def build_query(
+        self,
+        intent: str,
+        company_slug: Optional[str],
+        target_year: int,
+        version,
+    ):
+        """
+        Select base de anclas (sin is_primary ni orden).
+        intent sigue en JSONB (GIN); el resto son columnas tipadas con B-tree.
+        `version` puede ser un str o una expresión SQL (_version_hash_subquery).
+        """
+        # ✅ DEL EXPERTO: Array contains (sobre la columna entera -> usa idx_metadata_gin)
+        query = select(DocumentChunk).where(
+            DocumentChunk.chunk_metadata.contains({"intent": [intent]})
+        )
+        
+        # ✅ DEL EXPERTO: Filtros específicos por intent
+        if intent == "SALARY":
+            query = query.where(DocumentChunk.chunk_type == 'table')
+        elif intent == "DISMISSAL":
+            query = query.where(DocumentChunk.chunk_type == 'regulation')
+        elif intent == "LEAVE":
+            query = query.where(DocumentChunk.chunk_type.in_(['article', 'table']))
+        
+        # ✅ DEL EXPERTO: Manejo correcto de company_slug None
+        if company_slug:
+            query = query.where(
+                or_(
+                    DocumentChunk.company == company_slug,
+                    DocumentChunk.company == 'general'
+                )
+            )
+        else:
+            query = query.where(DocumentChunk.company == 'general')
         
-        return 'default'
+        # ✅ DEL EXPERTO: Filtro por año y version_hash
+        return query.where(
+            DocumentChunk.year == target_year,
+            DocumentChunk.version_hash == version,
+        )
+    
+    def anchor_ids(
+        self,
+        intent: str,
+        company_slug: Optional[str] = None,
+        year: Optional[int] = None,
+        limit: int = 2,
+        version: Optional[str] = None,
+    ):
+        """
+        Subquery (id, rnk) de anclas en UNA sola sentencia, componible en la
+        recuperación híbrida de RagEngine.search. Equivale a los dos intentos:
+        - INTENTO 1: solo is_primary=True, si existe alguno
+        - INTENTO 2 (Relaxed Mode): cualquiera, si no hay primarios
+        Ordenado por chunk_size desc. None si el intent no usa anclas.
+        Sin `version`, el version_hash se resuelve dentro de la misma sentencia.
+        """
+        if intent not in ANCHOR_INTENTS:
+            return None
+        
+        target_year = year or datetime.now().year
+        if version is None:
+            version = self._version_hash_subquery(company_slug) if company_slug else 'general'
+        
+        base = self.build_query(intent, company_slug, target_year, version).with_only_columns(
+            DocumentChunk.id, DocumentChunk.is_primary, DocumentChunk.chunk_size
+        ).cte(f"anchor_base_{intent.lower()}")
+        has_primary = select(base.c.id).where(base.c.is_primary.is_(True)).exists()
+        
+        return select(
+            base.c.id,
+            func.row_number().over(order_by=base.c.chunk_size.desc()).label("rnk")
+        ).where(
+            or_(base.c.is_primary.is_(True), ~has_primary)
+        ).order_by(base.c.chunk_size.desc()).limit(limit).subquery()
     
     def get_anchors(
         self,
@@ -65,7 +151,7 @@ class LegalAnchors:
             Lista de DocumentChunk que son "anclas"
         """
         
-        if intent not in ["LEAVE", "SALARY", "DISMISSAL"]:
+        if intent not in ANCHOR_INTENTS:
             logger.debug(f"LegalAnchors: Intent '{intent}' no requiere anclas")
             return []
         
@@ -82,67 +168,11 @@ class LegalAnchors:
             return self._cache[cache_key]
         
         try:
-            # ✅ DEL EXPERTO: Array contains
-            query = db.query(DocumentChunk).filter(
-                DocumentChunk.chunk_metadata['intent'].contains([intent])
-            )
-            
-            # ✅ DEL EXPERTO: Filtros específicos por intent
-            if intent == "SALARY":
-                query = query.filter(
-                    DocumentChunk.chunk_metadata['type'].astext == 'table'
-                )
-            elif intent == "DISMISSAL":
-                query = query.filter(
-                    DocumentChunk.chunk_metadata['type'].astext == 'regulation'
-                )
-            elif intent == "LEAVE":
-                query = query.filter(
-                    DocumentChunk.chunk_metadata['type'].astext.in_(['article', 'table'])
-                )
-            
-            # ✅ DEL EXPERTO: Manejo correcto de company_slug None
-            if company_slug:
-                query = query.filter(
-                    or_(
-                        DocumentChunk.chunk_metadata['company'].astext == company_slug,
-                        DocumentChunk.chunk_metadata['company'].astext == 'general'
-                    )
-                )
-            else:
-                query = query.filter(
-                    DocumentChunk.chunk_metadata['company'].astext == 'general'
-                )
-            
-            # ✅ DEL EXPERTO: Filtro por año
-            query = query.filter(
-                DocumentChunk.chunk_metadata['year'].astext.cast(Integer) == target_year
-            )
-            
-            # ✅ DEL EXPERTO: Filtro por version_hash
-            query = query.filter(
-                DocumentChunk.chunk_metadata['version_hash'].astext == version
-            )
-            
-            # ✅ DE MI CÓDIGO: Guardar estado base antes de filtro estricto
-            base_query = query
-
-            # INTENTO 1: Filtro estricto is_primary=True
-            anchors = base_query.filter(
-                DocumentChunk.chunk_metadata['is_primary'].astext.cast(Boolean) == True
-            ).order_by(
-                DocumentChunk.chunk_metadata['chunk_size'].astext.cast(Integer).desc()
-            ).limit(limit).all()
-            
-            # INTENTO 2: Fallback (Relaxed Mode)
-            if not anchors:
-                logger.warning(
-                    f"LegalAnchors: No primary anchors found for {intent}. "
-                    f"Activating Fallback (ignoring is_primary)."
-                )
-                anchors = base_query.order_by(
-                    DocumentChunk.chunk_metadata['chunk_size'].astext.cast(Integer).desc()
-                ).limit(limit).all()
+            # INTENTO 1 + INTENTO 2 (Relaxed Mode) en una sola consulta
+            ids = self.anchor_ids(intent, company_slug, target_year, limit, version=version)
+            anchors = list(db.execute(
+                select(DocumentChunk).join(ids, DocumentChunk.id == ids.c.id).order_by(ids.c.rnk)
+            ).scalars().all())
             
             # ✅ DE MI CÓDIGO: Guardar en caché
             self._cache[cache_key] = anchors
@@ -1,4 +1,8 @@
 import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
 
 logging.basicConfig(
     level=logging.INFO,
@@ -6,5 +10,152 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
+# Prometheus es opcional: sin prometheus-client (scripts, tests) las etapas se siguen logueando
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest,
+    )
+    from prometheus_client import multiprocess
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
 def log_event(event: str):
     logging.info(event)
+
+
+# ----------------------------------------------------------------------
+# Métricas (/metrics)
+# ----------------------------------------------------------------------
+
+# Buckets en segundos: de etapas en memoria (ms) a llamadas a Gemini (decenas de s)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+PROMPT_TOKEN_BUCKETS = (250, 500, 1000, 2000, 4000, 6000, 8000, 10000, 12000, 16000, 24000)
+
+if PROMETHEUS_AVAILABLE:
+    STAGE_SECONDS = Histogram(
+        "rag_stage_seconds", "Latency of each pipeline stage",
+        ["pipeline", "stage"], buckets=LATENCY_BUCKETS,
+    )
+    REQUEST_SECONDS = Histogram(
+        "rag_request_seconds", "End-to-end latency of a pipeline run",
+        ["pipeline"], buckets=LATENCY_BUCKETS,
+    )
+    RETRIEVED_CHUNKS = Counter(
+        "rag_retrieved_chunks", "Chunks returned by the hybrid retrieval, per branch",
+        ["branch"],
+    )
+    PROMPT_TOKENS = Histogram(
+        "rag_prompt_tokens", "Estimated size of the answer prompt in tokens",
+        ["intent"], buckets=PROMPT_TOKEN_BUCKETS,
+    )
+    CONTEXT_PIECES = Counter(
+        "rag_context_pieces", "Context pieces discarded or cut by the context packer",
+        ["outcome"],
+    )
+    # Contadores reales (no un collector sobre stats()): con PROMETHEUS_MULTIPROC_DIR
+    # se escriben en los ficheros de cada worker y /metrics los suma
+    CACHE_LOOKUPS = Counter(
+        "rag_cache_lookups", "Cache lookups by result",
+        ["cache", "result"],
+    )
+    CACHE_ENTRIES = Gauge(
+        "rag_cache_entries", "Entries currently held by each cache",
+        ["cache"], multiprocess_mode="livesum",
+    )
+
+
+def observe_stage(pipeline: str, stage: str, elapsed_ms: float) -> None:
+    if PROMETHEUS_AVAILABLE:
+        STAGE_SECONDS.labels(pipeline, stage).observe(elapsed_ms / 1000)
+
+
+def observe_request(pipeline: str, elapsed_s: float) -> None:
+    if PROMETHEUS_AVAILABLE:
+        REQUEST_SECONDS.labels(pipeline).observe(elapsed_s)
+
+
+def observe_retrieval(branches: Iterable[str]) -> None:
+    """Una observación por chunk recuperado, etiquetada con su rama (anchor, article, anexo, ...)."""
+    if PROMETHEUS_AVAILABLE:
+        for branch in branches:
+            RETRIEVED_CHUNKS.labels(branch).inc()
+
+
+def observe_prompt(intent, tokens: int, duplicates: int = 0, dropped: int = 0, truncated: int = 0) -> None:
+    """Tamaño del prompt final (tokens estimados) y piezas que el packer descartó o recortó."""
+    if not PROMETHEUS_AVAILABLE:
+        return
+    PROMPT_TOKENS.labels(getattr(intent, "value", intent) or "unknown").observe(tokens)
+    for outcome, count in (("duplicate", duplicates), ("dropped", dropped), ("truncated", truncated)):
+        if count:
+            CONTEXT_PIECES.labels(outcome).inc(count)
+
+
+def observe_cache_lookup(cache: str, result: str) -> None:
+    """result: hits | near_hits | misses (los mismos nombres que stats() de cada caché)."""
+    if PROMETHEUS_AVAILABLE:
+        CACHE_LOOKUPS.labels(cache, result).inc()
+
+
+def observe_cache_entries(cache: str, entries: int) -> None:
+    if PROMETHEUS_AVAILABLE:
+        CACHE_ENTRIES.labels(cache).set(entries)
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """
+    (cuerpo, content-type) para /metrics. Con varios workers de uvicorn y
+    PROMETHEUS_MULTIPROC_DIR definido, agrega los ficheros de todos los procesos.
+    """
+    if not PROMETHEUS_AVAILABLE:
+        return b"# prometheus-client not installed\n", CONTENT_TYPE_LATEST
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+class StageTimer:
+    """
+    Cronometra las etapas de una petición (ms):
+
+        timer = StageTimer("search")
+        with timer.stage("embedding"):
+            ...
+        timer.log()  # "search timings: expansion=0.1ms embedding=12.3ms ... total=80.2ms"
+
+    Cada etapa se observa además en rag_stage_seconds{pipeline, stage} y el
+    total (desde la creación hasta log()) en rag_request_seconds{pipeline}.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.timings: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, (time.perf_counter() - start) * 1000)
+
+    def record(self, stage: str, elapsed_ms: float) -> None:
+        """Registra una medida tomada fuera de stage() (p. ej. tiempo hasta el primer token)."""
+        self.timings[stage] = self.timings.get(stage, 0.0) + elapsed_ms
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+        observe_stage(self.name, stage, elapsed_ms)
+
+    def summary(self) -> Dict[str, float]:
+        return {stage: round(ms, 1) for stage, ms in self.timings.items()}
+
+    def log(self) -> None:
+        total = time.perf_counter() - self.started
+        observe_request(self.name, total)
+        parts = " ".join(f"{stage}={ms:.1f}ms" for stage, ms in self.timings.items())
+        log_event(f"{self.name} timings: {parts} total={total * 1000:.1f}ms")
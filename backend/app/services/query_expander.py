@@ -8,13 +8,36 @@ Validado por 8 opiniones expertas - Nivel producción enterprise.
 """
 import os
 import json
+import asyncio
 import re
 import logging
 import google.generativeai as genai
-from typing import Dict, Any, List, Set
+from typing import Dict, Any, List, Set, Optional
+from pydantic import BaseModel, ValidationError, field_validator
+from app.constants import HISTORY_CONTEXT_MESSAGES
+from app.services.semantic_cache import SemanticCache
+from app.services.gemini_rest import generative_model
 
 logger = logging.getLogger(__name__)
 
+
+class QueryUnderstanding(BaseModel):
+    """Esquema de la respuesta de 'query understanding' (rewrite + expansión en 1 llamada)."""
+    rewritten_query: str
+    intent: str = "GENERAL"
+    keywords_busqueda: List[str] = []
+    entidades_detectadas: List[str] = []
+    requiere_tablas: bool = False
+    grado_parentesco: Optional[int] = None
+
+    @field_validator("rewritten_query")
+    @classmethod
+    def _not_empty(cls, value: str) -> str:
+        if not value.strip():
+            raise ValueError("rewritten_query vacío")
+        return value.strip()
+
+
 class QueryExpander:
     """
     Capa 1 del RAG: Normalización semántica de la consulta del usuario.
@@ -24,15 +47,26 @@ class QueryExpander:
     # MEJORA ELITE 1: Validación estricta de Intents permitidos
     ALLOWED_INTENTS: Set[str] = {"LEAVE", "SALARY", "DISMISSAL", "GENERAL"}
 
+    GENERATION_CONFIG = {
+        "temperature": 0.0,  # Máximo determinismo
+        "response_mime_type": "application/json"
+    }
+
     def __init__(self):
+        # Caché de expansiones (exacta + semántica). El embedder lo inyecta RagEngine.
+        persistent_cache = os.getenv("QUERY_CACHE_PERSISTENT", "false").lower() == "true"
+        self.cache = SemanticCache("query_expansion", persistent=persistent_cache)
+        # El rewrite depende literalmente de la query: solo aciertos exactos
+        self.understanding_cache = SemanticCache("query_understanding", allow_near_hits=False, persistent=persistent_cache)
+
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             logger.warning("GOOGLE_API_KEY no encontrada. El QueryExpander funcionará en modo fallback.")
             self.model = None
         else:
             genai.configure(api_key=api_key)
-            # Usar gemini-2.0-flash-exp (más reciente y potente)
-            self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
+            # Usar gemini-2.0-flash-exp (más reciente y potente); GEMINI_TRANSPORT=rest -> pool HTTP compartido
+            self.model = generative_model('gemini-2.0-flash-exp')
 
     def expand(self, query: str) -> Dict[str, Any]:
         """
@@ -50,20 +84,77 @@ class QueryExpander:
                 "meta": {"source": "flash", "status": "ok"}
             }
         """
-        # Estructura de fallback por defecto
-        fallback_result = {
+        fallback_result = self._fallback_result(query)
+
+        if not self.model:
+            return fallback_result
+
+        cached = self.cache.get(query)
+        if cached is not None:
+            return self._mark_cached(cached)
+
+        try:
+            # MEJORA ELITE 2: SDK oficial + response_mime_type (fuerza JSON limpio)
+            response = self.model.generate_content(
+                self._build_prompt(query),
+                generation_config=self.GENERATION_CONFIG
+            )
+            result = self._parse_expansion(response.text, query)
+            self.cache.put(query, result)
+            return result
+
+        except Exception as e:
+            logger.error(f"Error crítico en QueryExpander: {str(e)}", exc_info=True)
+            fallback_result["meta"]["reason"] = str(e)
+            return fallback_result
+
+    async def expand_async(self, query: str) -> Dict[str, Any]:
+        """
+        Versión asíncrona de expand() para el pipeline de chat.
+        No bloquea el event loop mientras Gemini responde.
+        """
+        fallback_result = self._fallback_result(query)
+
+        if not self.model:
+            return fallback_result
+
+        # La caché puede calcular un embedding o ir a Postgres: fuera del event loop
+        cached = await asyncio.to_thread(self.cache.get, query)
+        if cached is not None:
+            return self._mark_cached(cached)
+
+        try:
+            response = await self.model.generate_content_async(
+                self._build_prompt(query),
+                generation_config=self.GENERATION_CONFIG
+            )
+            result = self._parse_expansion(response.text, query)
+            await asyncio.to_thread(self.cache.put, query, result)
+            return result
+
+        except Exception as e:
+            logger.error(f"Error crítico en QueryExpander (async): {str(e)}", exc_info=True)
+            fallback_result["meta"]["reason"] = str(e)
+            return fallback_result
+
+    def _mark_cached(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        result.setdefault("meta", {})["cache"] = "hit"
+        return result
+
+    def _fallback_result(self, query: str) -> Dict[str, Any]:
+        """Estructura de fallback por defecto."""
+        return {
             "intent": "GENERAL",
             "keywords_busqueda": [self._clean_keyword(query)], 
             "entidades_detectadas": [],
             "requiere_tablas": False,
+            "grado_parentesco": None,
             "meta": {"source": "fallback", "reason": "init_error"}
         }
 
-        if not self.model:
-            return fallback_result
-
-        # Prompt optimizado para clasificación jurídica
-        prompt = f"""
+    def _build_prompt(self, query: str) -> str:
+        """Prompt optimizado para clasificación jurídica."""
+        return f"""
         Actúa como un middleware de búsqueda jurídica para un sistema de Handling Aeroportuario (España).
         Tu objetivo es traducir la consulta del usuario a términos de búsqueda precisos para un buscador vectorial.
 
@@ -89,63 +180,196 @@ class QueryExpander:
         }}
         """
 
+    def _parse_expansion(self, raw_text: str, query: str) -> Dict[str, Any]:
+        """Valida y normaliza la respuesta JSON de Gemini."""
+        data = self._parse_json_response(raw_text)
+        
+        # --- APLICANDO MEJORAS DE NIVEL ÉLITE ---
+
+        # MEJORA ELITE 3: Validación de Intent (Sanitización)
+        intent = data.get("intent", "GENERAL").upper()
+        if intent not in self.ALLOWED_INTENTS:
+            logger.warning(f"Intent desconocido detectado: '{intent}'. Forzando GENERAL.")
+            intent = "GENERAL"
+
+        # MEJORA ELITE 4: Normalización de Keywords (Limpieza)
+        raw_keywords = data.get("keywords_busqueda", [])
+        # Si Flash falla y devuelve lista vacía, usamos la query original
+        if not raw_keywords:
+            raw_keywords = [query]
+            
+        clean_keywords = [
+            self._clean_keyword(k) 
+            for k in raw_keywords 
+            if k and len(k) < 60  # Evitar alucinaciones de frases muy largas
+        ]
+
+        requiere_tablas = data.get("requiere_tablas", False)
+
+        # MEJORA ELITE 5: Logging Estructurado (Métrica de Calidad)
+        logger.info(
+            f"QueryExpanded | Query: '{query[:30]}...' | Intent: {intent} | "
+            f"Tablas: {requiere_tablas} | KW: {len(clean_keywords)}"
+        )
+
+        return {
+            "intent": intent,
+            "keywords_busqueda": clean_keywords,
+            "entidades_detectadas": data.get("entidades_detectadas", []),
+            "requiere_tablas": requiere_tablas,
+            "grado_parentesco": data.get("grado_parentesco"),
+            "meta": {"source": "flash", "status": "ok"}
+        }
+
+    def _parse_json_response(self, raw_text: str) -> Dict[str, Any]:
+        """Parsea el JSON de Gemini tolerando bloques ```json``` alrededor."""
+        raw_text = raw_text.strip()
+        
+        # Limpieza defensiva: Eliminar bloques markdown si se escapan
+        cleaned_text = re.sub(r'```json\n?|\n?```', '', raw_text)
+        
+        return json.loads(cleaned_text)
+
+    # --- QUERY UNDERSTANDING (Rewrite + Expansión en una sola llamada) ---
+
+    def understand(self, query: str, history: List[dict] = None) -> Dict[str, Any]:
+        """
+        Una sola llamada a Gemini que resuelve el historial (rewrite) Y expande la
+        consulta (intent, keywords, entidades, requiere_tablas).
+        Sustituye a rewrite_query + expand, ahorrando un round trip por turno.
+
+        Returns:
+            Dict con la misma forma que expand() más "rewritten_query".
+            Si Gemini falla o la respuesta no valida el esquema, meta.source == "fallback".
+        """
+        if not self.model:
+            return self._understanding_fallback(query, "no_model")
+
+        # Sin historial el resultado solo depende de la query -> cacheable
+        cacheable = not history
+        if cacheable:
+            cached = self.understanding_cache.get(query)
+            if cached is not None:
+                return self._mark_cached(cached)
+
         try:
-            # MEJORA ELITE 2: SDK oficial + response_mime_type (fuerza JSON limpio)
             response = self.model.generate_content(
-                prompt,
-                generation_config={
-                    "temperature": 0.0,  # Máximo determinismo
-                    "response_mime_type": "application/json"
-                }
+                self._build_understanding_prompt(query, history or []),
+                generation_config=self.GENERATION_CONFIG
             )
+            result = self._parse_understanding(response.text, query)
+            if cacheable and result["meta"]["source"] != "fallback":
+                self.understanding_cache.put(query, result)
+            return result
 
-            raw_text = response.text.strip()
-            
-            # Limpieza defensiva: Eliminar bloques markdown si se escapan
-            cleaned_text = re.sub(r'```json\n?|\n?```', '', raw_text)
-            
-            data = json.loads(cleaned_text)
-            
-            # --- APLICANDO MEJORAS DE NIVEL ÉLITE ---
-
-            # MEJORA ELITE 3: Validación de Intent (Sanitización)
-            intent = data.get("intent", "GENERAL").upper()
-            if intent not in self.ALLOWED_INTENTS:
-                logger.warning(f"Intent desconocido detectado: '{intent}'. Forzando GENERAL.")
-                intent = "GENERAL"
-
-            # MEJORA ELITE 4: Normalización de Keywords (Limpieza)
-            raw_keywords = data.get("keywords_busqueda", [])
-            # Si Flash falla y devuelve lista vacía, usamos la query original
-            if not raw_keywords:
-                raw_keywords = [query]
-                
-            clean_keywords = [
-                self._clean_keyword(k) 
-                for k in raw_keywords 
-                if k and len(k) < 60  # Evitar alucinaciones de frases muy largas
-            ]
-
-            requiere_tablas = data.get("requiere_tablas", False)
-
-            # MEJORA ELITE 5: Logging Estructurado (Métrica de Calidad)
-            logger.info(
-                f"QueryExpanded | Query: '{query[:30]}...' | Intent: {intent} | "
-                f"Tablas: {requiere_tablas} | KW: {len(clean_keywords)}"
-            )
+        except Exception as e:
+            logger.error(f"Error en QueryExpander.understand: {str(e)}", exc_info=True)
+            return self._understanding_fallback(query, str(e))
 
-            return {
-                "intent": intent,
-                "keywords_busqueda": clean_keywords,
-                "entidades_detectadas": data.get("entidades_detectadas", []),
-                "requiere_tablas": requiere_tablas,
-                "meta": {"source": "flash", "status": "ok"}
-            }
+    async def understand_async(self, query: str, history: List[dict] = None) -> Dict[str, Any]:
+        """Versión asíncrona de understand()."""
+        if not self.model:
+            return self._understanding_fallback(query, "no_model")
+
+        cacheable = not history
+        if cacheable:
+            cached = await asyncio.to_thread(self.understanding_cache.get, query)
+            if cached is not None:
+                return self._mark_cached(cached)
+
+        try:
+            response = await self.model.generate_content_async(
+                self._build_understanding_prompt(query, history or []),
+                generation_config=self.GENERATION_CONFIG
+            )
+            result = self._parse_understanding(response.text, query)
+            if cacheable and result["meta"]["source"] != "fallback":
+                await asyncio.to_thread(self.understanding_cache.put, query, result)
+            return result
 
         except Exception as e:
-            logger.error(f"Error crítico en QueryExpander: {str(e)}", exc_info=True)
-            fallback_result["meta"]["reason"] = str(e)
-            return fallback_result
+            logger.error(f"Error en QueryExpander.understand_async: {str(e)}", exc_info=True)
+            return self._understanding_fallback(query, str(e))
+
+    def _understanding_fallback(self, query: str, reason: str) -> Dict[str, Any]:
+        result = self._fallback_result(query)
+        result["rewritten_query"] = query
+        result["meta"]["reason"] = reason
+        return result
+
+    def _build_understanding_prompt(self, query: str, history: List[dict]) -> str:
+        relevant_history = history[-HISTORY_CONTEXT_MESSAGES:]
+        history_text = "\n".join(
+            f"{msg.get('role')}: {msg.get('content')}" for msg in relevant_history
+        ) or "(sin historial)"
+
+        return f"""
+        Actúa como un middleware de búsqueda jurídica para un sistema de Handling Aeroportuario (España).
+
+        Conversación previa:
+        {history_text}
+
+        Nueva consulta del usuario: "{query}"
+
+        Instrucciones:
+        1. 'rewritten_query': Si la consulta hace referencia a algo mencionado antes (ej: "y eso?", "cuánto es?"),
+           reescríbela de forma completa y autónoma. Si ya es clara y completa, devuélvela tal cual.
+        2. Identifica el Intent Principal de la consulta reescrita (SOLO UNO):
+           - LEAVE (Vacaciones, Permisos, Bajas, Días libres)
+           - SALARY (Nómina, Tablas, Pluses, Horas extra, Diferencias salariales)
+           - DISMISSAL (Despido, Finiquito, Sanciones)
+           - GENERAL (Otros temas)
+        3. Genera 'keywords_busqueda': Lista de 3-5 términos jurídicos/técnicos sinónimos.
+           - Ej: "tío malo" -> ["permiso retribuido", "hospitalización", "enfermedad grave", "parientes"]
+           - Ej: "cuanto cobro nivel 3" -> ["tabla salarial", "retribución anual", "grupo profesional"]
+        4. Detecta 'requiere_tablas': true si la pregunta implica valores numéricos, salarios o grados de parentesco.
+        5. 'entidades_detectadas': familiares, niveles, grupos o conceptos mencionados.
+           'grado_parentesco': grado de consanguinidad/afinidad (1-4) si se menciona un familiar, si no null.
+
+        Devuelve SOLO un JSON válido con este formato:
+        {{
+            "rewritten_query": "STRING",
+            "intent": "STRING",
+            "keywords_busqueda": ["STRING", ...],
+            "entidades_detectadas": ["STRING", ...],
+            "requiere_tablas": boolean,
+            "grado_parentesco": integer | null
+        }}
+        """
+
+    def _parse_understanding(self, raw_text: str, query: str) -> Dict[str, Any]:
+        """Valida la respuesta contra QueryUnderstanding; si no valida -> fallback."""
+        try:
+            parsed = QueryUnderstanding.model_validate(self._parse_json_response(raw_text))
+        except (ValueError, ValidationError) as e:
+            logger.warning(f"QueryUnderstanding inválido, usando fallback: {e}")
+            return self._understanding_fallback(query, "schema_validation")
+
+        intent = parsed.intent.upper()
+        if intent not in self.ALLOWED_INTENTS:
+            logger.warning(f"Intent desconocido detectado: '{intent}'. Forzando GENERAL.")
+            intent = "GENERAL"
+
+        clean_keywords = [
+            self._clean_keyword(k)
+            for k in (parsed.keywords_busqueda or [parsed.rewritten_query])
+            if k and len(k) < 60
+        ] or [self._clean_keyword(parsed.rewritten_query)]
+
+        logger.info(
+            f"QueryUnderstood | Query: '{query[:30]}...' | Rewritten: '{parsed.rewritten_query[:40]}' | "
+            f"Intent: {intent} | Tablas: {parsed.requiere_tablas} | KW: {len(clean_keywords)}"
+        )
+
+        return {
+            "rewritten_query": parsed.rewritten_query,
+            "intent": intent,
+            "keywords_busqueda": clean_keywords,
+            "entidades_detectadas": parsed.entidades_detectadas,
+            "requiere_tablas": parsed.requiere_tablas,
+            "grado_parentesco": parsed.grado_parentesco,
+            "meta": {"source": "flash", "status": "ok", "stage": "understanding"}
+        }
 
     def _clean_keyword(self, keyword: str) -> str:
         """Helper para limpiar keywords (minúsculas, espacios extra, puntuación)."""
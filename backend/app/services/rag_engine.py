@@ -1,11 +1,12 @@
 from sentence_transformers import SentenceTransformer
-from sqlalchemy import select, func
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, union_all
+from sqlalchemy.orm import Session, joinedload
 from app.db.models import DocumentChunk, LegalDocument
+from app.db.database import run_with_session
+from app.db.vector_index import apply_search_tuning
 import numpy as np
 import google.generativeai as genai
 import os
-import requests
 import json
 import logging
 from datetime import datetime
@@ -13,16 +14,23 @@ from app.constants import (
     EMBEDDING_MODEL_NAME,
     EMBEDDING_DIMENSION,
     HISTORY_CONTEXT_MESSAGES,
-    MAX_CONTEXT_CHARS
+    RETRIEVAL_BRANCHES,
+    BRANCH_STRIDE,
+    SALARY_SEARCH_KEYWORDS
 )
 from app.prompts import PROMPT_TEMPLATES, IntentType
 from app.services.calculator_service import CalculatorService
 from app.services.query_expander import QueryExpander
 from app.services.legal_anchors import LegalAnchors
+from app.services.monitoring import StageTimer, observe_prompt, observe_retrieval
+from app.services.context_packer import context_packer, estimate_tokens
+from app.services.gemini_rest import generative_model
 from app.services.hybrid_calculator import HybridSalaryCalculator, SalaryData, CalculationResult
 from app.schemas.salary import CalculationRequest
 from sqlalchemy.orm import Session # Typed typing
 import re
+from collections import Counter
+from contextlib import nullcontext
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +51,8 @@ class RagEngine:
         
         # Initialize Query Expander (Capa 1: Hybrid RAG)
         self.query_expander = QueryExpander()
+        # Near-hits semánticos de la caché de expansión con el MiniLM ya cargado aquí
+        self.query_expander.cache.embedder = self.generate_embedding
         
         # Initialize Legal Anchors (Capa 2: Hybrid RAG)
         self.legal_anchors = LegalAnchors()
@@ -53,11 +63,12 @@ class RagEngine:
         if api_key:
             genai.configure(api_key=api_key)
             # Use 2.0-flash and direct REST call for grounding to bypass SDK tool validation issues
-            self.gen_model = genai.GenerativeModel('gemini-2.0-flash')
+            # (GEMINI_TRANSPORT=rest: same interface over the shared HTTP/2 pool)
+            self.gen_model = generative_model('gemini-2.0-flash')
             
             # ✅ FASE 2: Initialize Hybrid Calculator
             self.hybrid_calculator = HybridSalaryCalculator(
-                gemini_model=genai.GenerativeModel('gemini-2.0-flash-exp')
+                gemini_model=generative_model('gemini-2.0-flash-exp')
             )
         else:
             self.hybrid_calculator = None
@@ -107,7 +118,7 @@ class RagEngine:
     def model(self):
         """Lazy load the embedding model only when needed (saves ~400MB RAM per worker)"""
         if self._model is None:
-            print(f"[INFO] Loading SentenceTransformer model ({EMBEDDING_MODEL_NAME})...")
+            logger.info(f"Loading SentenceTransformer model ({EMBEDDING_MODEL_NAME})...")
             self._model = SentenceTransformer(EMBEDDING_MODEL_NAME)
         return self._model
 
@@ -176,9 +187,12 @@ class RagEngine:
             }
         return None
 
-    def search(self, query: str, company_slug: str = None, db: Session = None, limit: int = 10):
+    def search(self, query: str, company_slug: str = None, db: Session = None, limit: int = 10, expansion: dict = None, ef_search: int = None, probes: int = None, timer: StageTimer = None):
         """
-        Semantic search using PgVector cosine similarity.
+        Semantic search using PgVector cosine similarity (HNSW index, see app/db/vector_index.py).
+        If `expansion` is provided (already computed by the async pipeline), Capa 1 is skipped.
+        `ef_search` (HNSW) / `probes` (IVFFlat) override the ANN recall vs latency trade-off for this request.
+        `timer` collects per-stage timings; without one, search logs its own.
         """
         if not db:
             # Fallback to old Elasticsearch if no DB session provided
@@ -198,221 +212,215 @@ class RagEngine:
                 })
             return formatted_results
         
-        # ===== CAPA 1: QUERY EXPANSION (Hybrid RAG) =====
-        # Expand query to legal keywords using Gemini Flash
-        expansion = self.query_expander.expand(query)
-        expanded_query = self.query_expander.get_expanded_query_text(expansion)
+        owns_timer = timer is None
+        timer = timer or StageTimer("search")
+        try:
+            return self._run_search_stages(query, company_slug, db, limit, expansion, ef_search, probes, timer)
+        finally:
+            if owns_timer:
+                timer.log()
+
+    def _run_search_stages(self, query: str, company_slug: str, db: Session, limit: int, expansion: dict, ef_search: int, probes: int, timer: StageTimer):
+        """
+        Pipeline de search() en etapas explícitas. Cada operación cara se
+        ejecuta como mucho UNA vez por petición y queda cronometrada:
+        
+            expansion -> embedding -> retrieval (anclas + híbrida, 1 SQL) -> calculation -> format
+        
+        Las ramas (anclas incluidas) van en una sola sentencia, así que su
+        latencia no se puede separar: "retrieval" mide la sentencia completa y
+        lo que aporta cada rama se cuenta en rag_retrieved_chunks_total{branch}.
+        """
+        # ===== ETAPA 1: QUERY EXPANSION (Hybrid RAG, Capa 1) =====
+        # Expand query to legal keywords using Gemini Flash (omitida si ya viene del pipeline async)
+        with timer.stage("expansion"):
+            if expansion is None:
+                expansion = self.query_expander.expand(query)
+            expanded_query = self.query_expander.get_expanded_query_text(expansion)
         intent = expansion['intent']
         requiere_tablas = expansion['requiere_tablas']
         
-        print(f"🔍 Query Expansion:")
-        print(f"   Original: '{query}'")
-        print(f"   Intent: {intent}")
-        print(f"   Requiere tablas: {requiere_tablas}")
-        print(f"   Expanded: '{expanded_query}'")
-        
-        # ✨ FASE 2: Detectar si es query de cálculo
-        is_calculation = self._is_calculation_query(query)
-        if is_calculation:
-            print(f"🧮 Calculation query detected!")
-        # 3. Legal Anchors (Capa 2) - Determinista
-        anchor_results = []
-        if expansion.get("requiere_tablas") or expansion.get("domain") == "LABORAL" or intent in ["LEAVE", "SALARY", "DISMISSAL"]:
-            # ✅ MEJORA: Pasar SIEMPRE company_slug para filtrar por convenio del usuario
-            logger.info(f"Legal Anchors: buscando anchors para {expansion['intent']} en {company_slug}")
-            anchor_results = self.legal_anchors.get_anchors(
-                intent=expansion['intent'],
-                db=db,
-                company_slug=company_slug, # Clave: el usuario define el contexto
-                limit=3
-            )
-            
-            # Si encontramos anchors, añadirlos al contexto para RAG
-            if anchor_results:
-                logger.info(f"✅ Anchors encontrados: {len(anchor_results)}")
-                
-                # Detectar cálculo si tenemos anchors
-                if self._is_calculation_query(query):
-                    calc = self._handle_calculation(
-                        query=query,
-                        expansion=expansion,
-                        anchor_results=anchor_results,
-                        company_slug=company_slug
-                    )
-                    
-                    if calc.get("calculation"):
-                         return [{
-                            "id": anchor_results[0].id,
-                            "content": calc["answer"],
-                            "article_ref": "Cálculo",
-                            "document": anchor_results[0].document,
-                            "calculation": calc["calculation"],
-                            'score': 1.0  # Perfect score for calculations
-                        }]
-                else:
-                    print("   ⚠️ Calculation failed, falling back to standard RAG")
-            else:
-                print("   ⚠️ No anchor tables found, falling back to standard RAG")
+        logger.debug(
+            "🔍 Query Expansion: '%s' -> '%s'", query, expanded_query,
+            extra={"intent": intent, "requiere_tablas": requiere_tablas},
+        )
         
         # FILTRO CHIT-CHAT: Ahorra costes de embeddings y retrieval
         if intent == "GENERAL" and not requiere_tablas and len(query.split()) < 2:
-             print("💬 Chit-chat detectado (muy corto). Saltando retriever.")
+             logger.info("💬 Chit-chat detectado (muy corto). Saltando retriever.")
              return []
 
-        search_text = expanded_query if expanded_query else query
-        query_embedding = self.generate_embedding(search_text)
+        # ===== ETAPA 2: EMBEDDING (una sola vez) =====
+        with timer.stage("embedding"):
+            search_text = expanded_query if expanded_query else query
+            query_embedding = self.generate_embedding(search_text)
         
-        # Búsqueda Vectorial Base
-        from sqlalchemy.orm import joinedload
-        stmt = select(DocumentChunk).join(LegalDocument).options(
-            joinedload(DocumentChunk.document)  # Eager load to prevent N+1 queries
-        ).order_by(
-            DocumentChunk.embedding.cosine_distance(query_embedding)
-        )
-        
-        if company_slug:
-            stmt = stmt.filter(
-                (LegalDocument.company == company_slug) | 
-                (LegalDocument.company.is_(None)) |
-                (LegalDocument.company.ilike('general'))
-            )
-
-        stmt = stmt.limit(limit)
-        base_results = list(db.execute(stmt).scalars().all())
+        # ===== ETAPA 3: RECUPERACIÓN (anclas Capa 2 + híbrida): una sola ida y vuelta a Postgres =====
+        with timer.stage("retrieval"):
+            # Override por petición de ef_search/probes (por defecto: valor de la conexión, sin SQL extra)
+            if ef_search is not None or probes is not None:
+                apply_search_tuning(db, ef_search=max(ef_search, limit) if ef_search is not None else None, probes=probes)
 
-        # Lista final acumulativa para mantener orden
-        final_results_list = []
-        seen_ids = set()
+            stmt = self._build_retrieval_statement(query, company_slug, intent, query_embedding, limit)
+            rows = db.execute(stmt).all()
+        unique_chunks = [chunk for chunk, _ in rows]
+        branches = {chunk.id: RETRIEVAL_BRANCHES[position // BRANCH_STRIDE] for chunk, position in rows}
+        observe_retrieval(branches.values())
+        anchor_results = [chunk for chunk in unique_chunks if branches[chunk.id] == "anchor"]
+        
+        for chunk in unique_chunks:
+            if branches[chunk.id] != "vector":
+                logger.debug("   ⭐⭐ %s Force-added: %s", branches[chunk.id].upper(), chunk.article_ref)
+        
+        # ===== ETAPA 4: CÁLCULO determinista sobre las anclas de la etapa 3 (una sola vez) =====
+        if anchor_results and self._is_calculation_query(query):
+            logger.info("🧮 Calculation query detected!")
+            with timer.stage("calculation"):
+                calc = self._handle_calculation(
+                    query=query,
+                    expansion=expansion,
+                    anchor_results=anchor_results,
+                    company_slug=company_slug
+                )
+            if calc.get("calculation"):
+                return [{
+                    "id": anchor_results[0].id,
+                    "content": calc["answer"],
+                    "article_ref": "Cálculo",
+                    "document": anchor_results[0].document,
+                    "calculation": calc["calculation"],
+                    'score': 1.0  # Perfect score for calculations
+                }]
+            logger.warning("⚠️ Calculation failed, falling back to standard RAG")
+        
+        logger.info(f"📊 Resultados finales: {len(unique_chunks)} chunks únicos", extra={"branches": dict(Counter(branches.values()))})
+
+        # ===== ETAPA 5: FORMATO =====
+        with timer.stage("format"):
+            formatted_results = []
+            for chunk in unique_chunks:
+                formatted_results.append({
+                    "id": chunk.id,
+                    "content": chunk.content,
+                    "article_ref": chunk.article_ref,
+                    "document_title": chunk.document.title if chunk.document else "Unknown",
+                    "company": chunk.document.company if chunk.document else "Unknown",
+                    "document_id": chunk.document.category if chunk.document else "unknown", # Access parent doc if needed
+                    "version_hash": chunk.version_hash,
+                    "retrieval": branches[chunk.id],
+                    "score": 1.0  # Placeholder
+                })
+        
+        return formatted_results
 
+    def _build_retrieval_statement(self, query: str, company_slug: str, intent: str, query_embedding, limit: int):
+        """
+        Las cinco recuperaciones de search() en UNA sentencia (CTE + UNION ALL).
+        Cada rama aporta (id, position) con position = rama * BRANCH_STRIDE + rango
+        dentro de la rama, en el orden de prioridad de siempre:
+        
+            anchor -> article -> anexo -> anexo_fallback -> vector
+        
+        El dedup se hace en el servidor (MIN(position) por id) y se devuelve la
+        lista final ya ordenada y limitada: filas (DocumentChunk, position).
+        """
+        query_lower = query.lower()
+        exclude_pmr = "pmr" not in query_lower
+        branches = []
+        
+        def ranked(branch: str, subquery, sort_key):
+            """Rango calculado FUERA del LIMIT para no impedir el uso de índices (HNSW)."""
+            offset = RETRIEVAL_BRANCHES.index(branch) * BRANCH_STRIDE
+            return select(
+                subquery.c.id,
+                (offset + func.row_number().over(order_by=sort_key)).label("position")
+            )
+        
+        # 0. Anchors (Determinista, Capa 2): version_hash e is_primary resueltos en SQL
+        # (solo compone la subquery; su coste va dentro de la etapa "retrieval")
+        anchor_ids = self.legal_anchors.anchor_ids(intent, company_slug, limit=3)
+        if anchor_ids is not None:
+            logger.debug("⚓ Inyectando Legal Anchors para Intent: %s", intent)
+            branches.append(ranked("anchor", anchor_ids, anchor_ids.c.rnk))
+        
         # 1. Búsqueda de Artículo Específico (Prioridad Alta)
-        import re
         art_match = re.search(r'art[ií]culo\s+(\d+)', query, re.IGNORECASE)
-        estatuto_match = re.search(r'estatuto', query, re.IGNORECASE)
-        
         if art_match:
             art_num = art_match.group(1)
-            print(f"📜 Article reference detected: {art_num}")
-            art_filter = DocumentChunk.article_ref.ilike(f'%Art%culo {art_num}%')
+            logger.debug("📜 Article reference detected: %s", art_num)
             doc_filter = None
-            if estatuto_match:
-                 print(f"   ⚖️  'Estatuto' detected, narrowing search.")
+            if re.search(r'estatuto', query, re.IGNORECASE):
+                 logger.debug("   ⚖️  'Estatuto' detected, narrowing search.")
                  doc_filter = LegalDocument.title.ilike('%Estatuto%')
             elif company_slug:
                  doc_filter = (LegalDocument.company == company_slug) | (LegalDocument.company.ilike('general'))
             
             if doc_filter is not None:
-                priority_stmt = select(DocumentChunk).join(LegalDocument).filter(doc_filter & art_filter).limit(3)
-                priority_results = list(db.execute(priority_stmt).scalars().all())
-                
-                # Añadimos directamente a lista final
-                for pr in priority_results:
-                    if pr.id not in seen_ids:
-                        print(f"   ⭐⭐ SPECIFIC ARTICLE Force-added: {pr.article_ref}")
-                        final_results_list.append(pr)
-                        seen_ids.add(pr.id)
-
-        # 2. Búsqueda Híbrida de Tablas/Anexos (Si es Salario)
-        salary_keywords = ['precio', 'salario', 'retribución', 'retribucion', 'paga', 'sueldo', 
-                          'complemento', 'plus', 'extraordinaria', 'perentoria',
-                          'nocturna', 'festiva', 'tabla', 'anexo', 'euros', '€']
-        
-        is_salary_query = any(k in query.lower() for k in salary_keywords)
+                article = select(DocumentChunk.id).join(LegalDocument).where(
+                    doc_filter & DocumentChunk.article_ref.ilike(f'%Art%culo {art_num}%')
+                ).order_by(DocumentChunk.id).limit(3).subquery("article_branch")
+                branches.append(ranked("article", article, article.c.id))
         
-        if is_salary_query and company_slug:
-            print(f"💰 Salary intent detected in search: forcing retrieval of ANEXOs/Tablas")
-            
-            priority_stmt = select(DocumentChunk).join(LegalDocument).filter(
-                (LegalDocument.company == company_slug) &
-                ((DocumentChunk.article_ref.ilike('%ANEXO%')) | (DocumentChunk.article_ref.ilike('%TABLA%')))
-            ).order_by(
-                func.length(DocumentChunk.content).desc()
+        # 2. Búsqueda Híbrida de Tablas/Anexos (Si es Salario)
+        if company_slug and any(k in query_lower for k in SALARY_SEARCH_KEYWORDS):
+            logger.debug("💰 Salary intent detected in search: forcing retrieval of ANEXOs/Tablas")
+            anexo_filter = (LegalDocument.company == company_slug) & (
+                DocumentChunk.article_ref.ilike('%ANEXO%') | DocumentChunk.article_ref.ilike('%TABLA%')
             )
             
-            if "pmr" not in query.lower():
-                 priority_stmt = priority_stmt.filter(
+            content_length = func.length(DocumentChunk.content).label("content_length")
+            anexo = select(DocumentChunk.id, content_length).join(LegalDocument).where(anexo_filter)
+            if exclude_pmr:
+                 anexo = anexo.where(
                      ~DocumentChunk.article_ref.ilike('%PMR%'),
                      ~DocumentChunk.content.ilike('%PMR%')
                  )
-
-            priority_stmt = priority_stmt.limit(3)
-            anexo_results = list(db.execute(priority_stmt).scalars().all())
-            
-            for ar in anexo_results:
-                if ar.id not in seen_ids:
-                    print(f"   ⭐⭐ PRIORITY Force-added: {ar.article_ref}")
-                    final_results_list.append(ar)
-                    seen_ids.add(ar.id)
+            anexo = anexo.order_by(content_length.desc()).limit(3).subquery("anexo_branch")
+            branches.append(ranked("anexo", anexo, anexo.c.content_length.desc()))
             
             # General Fallback
-            anexo_stmt = select(DocumentChunk).join(LegalDocument).filter(
-                (LegalDocument.company == company_slug) &
-                ((DocumentChunk.article_ref.ilike('%ANEXO%')) | (DocumentChunk.article_ref.ilike('%TABLA%')))
+            fallback = select(DocumentChunk.id).join(LegalDocument).where(anexo_filter)
+            if exclude_pmr:
+                 fallback = fallback.where(~DocumentChunk.article_ref.ilike('%PMR%'))
+            fallback = fallback.order_by(DocumentChunk.id).limit(5).subquery("anexo_fallback_branch")
+            branches.append(ranked("anexo_fallback", fallback, fallback.c.id))
+        
+        # 3. Búsqueda Vectorial Base (relleno, ANN sobre el índice HNSW)
+        distance = DocumentChunk.embedding.cosine_distance(query_embedding).label("distance")
+        vector = select(DocumentChunk.id, distance).join(LegalDocument)
+        if company_slug:
+            vector = vector.where(
+                (LegalDocument.company == company_slug) | 
+                (LegalDocument.company.is_(None)) |
+                (LegalDocument.company.ilike('general'))
             )
-            if "pmr" not in query.lower():
-                 anexo_stmt = anexo_stmt.filter(~DocumentChunk.article_ref.ilike('%PMR%'))
-            
-            anexo_fallback_results = db.execute(anexo_stmt.limit(5)).scalars().all()
-            for ar in anexo_fallback_results:
-                if ar.id not in seen_ids:
-                     final_results_list.append(ar)
-                     seen_ids.add(ar.id)
-
-        # 3. Anchors (Determinista)
-        anchor_results = []
-        if requiere_tablas or intent in ["LEAVE", "SALARY", "DISMISSAL"] or expansion.get("domain") == "LABORAL":
-            print(f"⚓ Inyectando Legal Anchors para Intent: {intent}")
-            anchor_results = self.legal_anchors.get_anchors(intent, db, company_slug, limit=2)
-            
-             # Insert anchors AT THE TOP if we have them
-            for ar in reversed(anchor_results): # Reverse to keep order when inserting at 0
-                 if ar.id not in seen_ids:
-                     print(f"   ⚓ ANCHOR Injected: {ar.article_ref}")
-                     final_results_list.insert(0, ar)
-                     seen_ids.add(ar.id)
-            
-            # Detectar cálculo si tenemos anchors
-            if anchor_results and self._is_calculation_query(query):
-                calc = self._handle_calculation(
-                    query=query,
-                    expansion=expansion,
-                    anchor_results=anchor_results,
-                    company_slug=company_slug
-                )
-                if calc.get("calculation"):
-                        return [{
-                        "id": anchor_results[0].id,
-                        "content": calc["answer"],
-                        "article_ref": "Cálculo",
-                        "document": anchor_results[0].document,
-                        "calculation": calc["calculation"],
-                        'score': 1.0
-                    }]
-
-        # 4. Añadir resultados vectoriales base (relleno)
-        for br in base_results:
-            if br.id not in seen_ids:
-                final_results_list.append(br)
-                seen_ids.add(br.id)
-        
-        # Limitar al número solicitado
-        unique_chunks = final_results_list[:limit]
-        
-        print(f"📊 Resultados finales: {len(unique_chunks)} chunks únicos")
-
-        # Format results
-        formatted_results = []
-        for chunk in unique_chunks:
-            formatted_results.append({
-                "id": chunk.id,
-                "content": chunk.content,
-                "article_ref": chunk.article_ref,
-                "document_title": chunk.document.title if chunk.document else "Unknown",
-                "company": chunk.document.company if chunk.document else "Unknown",
-                "document_id": chunk.document.category if chunk.document else "unknown", # Access parent doc if needed
-                "score": 1.0  # Placeholder
-            })
-        
-        return formatted_results
+        vector = vector.order_by(distance).limit(limit).subquery("vector_branch")
+        branches.append(ranked("vector", vector, vector.c.distance))
+        
+        # Dedup en servidor: cada chunk se queda con su rama más prioritaria
+        candidates = union_all(*branches).cte("candidates")
+        deduped = select(
+            candidates.c.id, func.min(candidates.c.position).label("position")
+        ).group_by(candidates.c.id).subquery("deduped")
+        
+        return select(DocumentChunk, deduped.c.position).join(
+            deduped, DocumentChunk.id == deduped.c.id
+        ).options(
+            joinedload(DocumentChunk.document)  # Eager load to prevent N+1 queries
+        ).order_by(deduped.c.position).limit(limit)
+
+    async def search_async(self, query: str, company_slug: str = None, limit: int = 10, expansion: dict = None, ef_search: int = None, probes: int = None, timer: StageTimer = None):
+        """
+        Async variant of search() for the chat pipeline.
+        Query expansion awaits Gemini without holding a thread; the SQL part
+        runs in the threadpool with its own DB session.
+        """
+        if expansion is None:
+            with (timer.stage("expansion") if timer else nullcontext()):
+                expansion = await self.query_expander.expand_async(query)
+        return await run_with_session(
+            lambda db: self.search(query=query, company_slug=company_slug, db=db, limit=limit, expansion=expansion, ef_search=ef_search, probes=probes, timer=timer)
+        )
 
     def rewrite_query(self, current_query: str, history: list = None):
         """
@@ -424,13 +432,96 @@ class RagEngine:
         # ✅ CORRECCIÓN: Evitar crash si history es None
         history = history or []
         
-        # FAST PATH: If query clearly indicates continuation, merge immediately without LLM
+        merged = self._fast_path_merge(current_query, history)
+        if merged:
+            return merged
+
+        rewritten = current_query
+        
+        if self.gen_model:
+            try:
+                response = self.gen_model.generate_content(self._build_rewrite_prompt(current_query, history))
+                rewritten = response.text.strip()
+            except Exception as e:
+                logger.warning(f"Error rewriting query: {e}")
+                rewritten = current_query
+
+        return self._enhance_rewritten_query(rewritten)
+
+    async def rewrite_query_async(self, current_query: str, history: list = None):
+        """Async variant of rewrite_query() (same fast path and enhancements)."""
+        history = history or []
+        
+        merged = self._fast_path_merge(current_query, history)
+        if merged:
+            return merged
+
+        rewritten = current_query
+        
+        if self.gen_model:
+            try:
+                response = await self.gen_model.generate_content_async(self._build_rewrite_prompt(current_query, history))
+                rewritten = response.text.strip()
+            except Exception as e:
+                logger.warning(f"Error rewriting query: {e}")
+                rewritten = current_query
+
+        return self._enhance_rewritten_query(rewritten)
+
+    def understand_query(self, current_query: str, history: list = None):
+        """
+        Query understanding: rewrite + expansion in ONE Gemini call.
+        Returns (final_query, expansion) where expansion has the expand() shape
+        and can be passed to search(expansion=...).
+        """
+        history = history or []
+        merged = self._fast_path_merge(current_query, history)
+        if merged:
+            understanding = self.query_expander.understand(merged)
+        else:
+            understanding = self.query_expander.understand(current_query, history)
+        return self._finalize_understanding(current_query, merged, understanding)
+
+    async def understand_query_async(self, current_query: str, history: list = None):
+        """Async variant of understand_query()."""
+        history = history or []
+        merged = self._fast_path_merge(current_query, history)
+        if merged:
+            understanding = await self.query_expander.understand_async(merged)
+        else:
+            understanding = await self.query_expander.understand_async(current_query, history)
+        return self._finalize_understanding(current_query, merged, understanding)
+
+    def _finalize_understanding(self, current_query: str, merged: str, understanding: dict):
+        """
+        Applies the deterministic post-rewrite enhancements and, if the LLM stage
+        failed schema validation, falls back to the keyword heuristics.
+        """
+        if merged:
+            # Fast path already applied its own synonyms
+            final_query = merged
+        else:
+            final_query = self._enhance_rewritten_query(understanding.get("rewritten_query") or current_query)
+
+        if understanding["meta"].get("source") == "fallback":
+            heuristic_intent = self.detect_intent(final_query).name
+            understanding["intent"] = heuristic_intent
+            understanding["requiere_tablas"] = heuristic_intent == IntentType.SALARY.name
+            understanding["keywords_busqueda"] = [self.query_expander._clean_keyword(final_query)]
+
+        return final_query, understanding
+
+    def _fast_path_merge(self, current_query: str, history: list):
+        """
+        FAST PATH: If query clearly indicates continuation, merge immediately without LLM.
+        Returns the merged query or None.
+        """
         clean_q = current_query.strip().lower()
         if clean_q.startswith(("y ", "pero ", "entonces ", "ademas ", "también ")):
              last_user_msg = next((m['content'] for m in reversed(history) if m['role'] == 'user'), None)
              if last_user_msg:
                  merged = f"{last_user_msg} {current_query}"
-                 print(f"⚡ Fast-Path Context Merge: '{last_user_msg}' + '{current_query}'")
+                 logger.debug("⚡ Fast-Path Context Merge: '%s' + '%s'", last_user_msg, current_query)
                  
                  # Apply synonyms on merged result directly here for fast path return
                  merged_lower = merged.lower()
@@ -452,15 +543,14 @@ class RagEngine:
                      merged = f"{merged} refrigerio descanso pausa retribuida"
                      
                  return merged
+        return None
 
-        rewritten = current_query
+    def _build_rewrite_prompt(self, current_query: str, history: list) -> str:
+        # Format last N messages for context
+        relevant_history = history[-HISTORY_CONTEXT_MESSAGES:] 
+        history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in relevant_history])
         
-        if self.gen_model:
-            # Format last N messages for context
-            relevant_history = history[-HISTORY_CONTEXT_MESSAGES:] 
-            history_text = "\n".join([f"{msg['role']}: {msg['content']}" for msg in relevant_history])
-            
-            prompt = f"""Dada esta conversación:
+        return f"""Dada esta conversación:
 {history_text}
 
 Nueva pregunta del usuario: {current_query}
@@ -469,23 +559,8 @@ Si la nueva pregunta hace referencia a algo mencionado antes (ej: "y eso?", "cu
 Si ya es clara y completa, devuélvela tal cual.
 
 Pregunta reescrita:"""
-            
-            try:
-                response = self.gen_model.generate_content(prompt)
-                rewritten_response = response.text.strip()
-                
-                # Heuristic Fallback: If LLM failed to change anything but query looks dependent
-                if rewritten_response == current_query and history:
-                    last_user_msg = next((m['content'] for m in reversed(history) if m['role'] == 'user'), None)
-                    if last_user_msg and len(current_query.split()) < 4: # Only merge if query is short
-                        pass # merged logic below if needed, but keeping it simple for now
-                    
-                rewritten = rewritten_response
-                
-            except Exception as e:
-                print(f"Error rewriting query: {e}")
-                rewritten = current_query
 
+    def _enhance_rewritten_query(self, rewritten: str) -> str:
         # --- POST-REWRITE ENHANCEMENTS (Synonyms & Keywords) ---
         # Apply these on the FINAL rewritten query (or original if no rewrite)
         rewritten_lower = rewritten.lower()
@@ -502,12 +577,12 @@ Pregunta reescrita:"""
         # FIX: Permitir enriquecimiento SIMULTÁNEO (Dinero + Baja)
         if is_salary_query and 'anexo' not in rewritten_lower:
             rewritten = f"{rewritten} ANEXO tabla salarial retribución"
-            print(f"💰 Salary query detected (post-merge), enhanced to search in ANEXOS")
+            logger.debug("💰 Salary query detected (post-merge), enhanced to search in ANEXOS")
             rewritten_lower = rewritten.lower() # Update for next check
             
         if is_it_query:
             rewritten = f"{rewritten} incapacidad temporal IT complemento baja"
-            print(f"🏥 Sickness query detected, enhanced with synonyms: IT, incapacidad, complemento")
+            logger.debug("🏥 Sickness query detected, enhanced with synonyms: IT, incapacidad, complemento")
             rewritten_lower = rewritten.lower()
 
         # FOOD/BREAK SYNONYMS
@@ -515,12 +590,12 @@ Pregunta reescrita:"""
         if any(k in rewritten_lower for k in food_keywords):
              if 'refrigerio' not in rewritten_lower:
                  rewritten = f"{rewritten} refrigerio descanso pausa retribuida"
-                 print(f"🥪 Food query detected (post-merge), enhanced with synonyms: refrigerio, descanso")
+                 logger.debug("🥪 Food query detected (post-merge), enhanced with synonyms: refrigerio, descanso")
 
         # REST/SHIFT SYNONYMS (Statute uses 'jornada' not 'turno' often)
         if 'descanso' in rewritten_lower and ('turno' in rewritten_lower or 'turnos' in rewritten_lower):
             rewritten = f"{rewritten} jornada descanso entre jornadas 12 horas doce horas Artículo 34 Estatuto"
-            print(f"🛌 Rest/Shift query detected, enhanced with: jornada, 12 horas, doce horas, Artículo 34")
+            logger.debug("🛌 Rest/Shift query detected, enhanced with: jornada, 12 horas, doce horas, Artículo 34")
 
         return rewritten
 
@@ -531,6 +606,75 @@ Pregunta reescrita:"""
         if not self.gen_model:
             return {"text": "Error: GOOGLE_API_KEY no configurada en el servidor.", "audit": None}
 
+        final_prompt = self._build_answer_prompt(query, context_chunks, intent, user_context, structured_data, history)
+
+        # Use Direct REST call for ALL generations to ensure Tool availability
+        # This bypasses the SDK validation issues we faced.
+        try:
+            response = self.gen_model.generate_content(final_prompt)
+            return {"text": response.text, "audit": None, "prompt_bytes": len(final_prompt.encode('utf-8'))}
+        except Exception as e:
+            logger.error(f"API Error: {e}")
+            return {"text": "Error de conexión con el servicio de IA.", "audit": None}
+
+    async def generate_answer_async(self, query: str, context_chunks: list, intent: IntentType = IntentType.GENERAL, user_context: dict = None, structured_data: str = None, history: list = None, timer: StageTimer = None):
+        """
+        Async variant of generate_answer(): awaits Gemini without blocking a worker thread.
+        With a `timer`, prompt building is timed as its own "prompt_build" stage.
+        """
+        if not self.gen_model:
+            return {"text": "Error: GOOGLE_API_KEY no configurada en el servidor.", "audit": None}
+
+        with (timer.stage("prompt_build") if timer else nullcontext()):
+            final_prompt = self._build_answer_prompt(query, context_chunks, intent, user_context, structured_data, history or [])
+
+        try:
+            response = await self.gen_model.generate_content_async(final_prompt)
+            return {"text": response.text, "audit": None, "prompt_bytes": len(final_prompt.encode('utf-8'))}
+        except Exception as e:
+            logger.error(f"API Error: {e}")
+            return {"text": "Error de conexión con el servicio de IA.", "audit": None}
+
+    async def stream_answer_async(self, query: str, context_chunks: list, intent: IntentType = IntentType.GENERAL, user_context: dict = None, structured_data: str = None, history: list = None, timer: StageTimer = None):
+        """
+        Streaming variant of generate_answer_async() (Gemini stream=True).
+        Yields {"token": str} per chunk as Gemini produces it, then one final dict
+        with the same shape as generate_answer_async() ({"text", "audit", "prompt_bytes"}).
+        prompt_bytes is only set when the whole answer was streamed without errors.
+        """
+        if not self.gen_model:
+            error = "Error: GOOGLE_API_KEY no configurada en el servidor."
+            yield {"token": error}
+            yield {"text": error, "audit": None}
+            return
+
+        with (timer.stage("prompt_build") if timer else nullcontext()):
+            final_prompt = self._build_answer_prompt(query, context_chunks, intent, user_context, structured_data, history or [])
+
+        parts = []
+        try:
+            response = await self.gen_model.generate_content_async(final_prompt, stream=True)
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. only finish_reason/safety metadata)
+                    continue
+                if text:
+                    parts.append(text)
+                    yield {"token": text}
+        except Exception as e:
+            logger.error(f"API Error (stream): {e}")
+            error = "Error de conexión con el servicio de IA."
+            # Keep whatever was already streamed; never cached (no prompt_bytes)
+            yield {"token": ("\n\n" if parts else "") + error}
+            yield {"text": "".join(parts) + ("\n\n" if parts else "") + error, "audit": None}
+            return
+
+        yield {"text": "".join(parts), "audit": None, "prompt_bytes": len(final_prompt.encode('utf-8'))}
+
+    def _build_answer_prompt(self, query: str, context_chunks: list, intent: IntentType, user_context: dict, structured_data: str, history: list) -> str:
+        """Builds the final RAG prompt (context XML + profile + history + instructions)."""
         # --- KINSHIP TABLE INJECTION ---
         # If query contains family keywords, inject the official table
         from app.data.kinship import KINSHIP_KEYWORDS, get_kinship_table_markdown
@@ -541,11 +685,18 @@ Pregunta reescrita:"""
         kinship_context = ""
         if is_family_related:
             kinship_context = get_kinship_table_markdown()
-            print("👨‍👩‍👧‍👦 Family intent detected: Injecting Kinship Table into context")
+            logger.debug("👨‍👩‍👧‍👦 Family intent detected: Injecting Kinship Table into context")
             
+        # Pack context pieces by token budget (priority, dedup, compressed tables)
+        packed = context_packer.pack(
+            query, context_chunks, intent,
+            structured_data=structured_data or "", user_context=user_context, kinship=kinship_context,
+        )
+        logger.info(f"📦 Context packed: {packed.summary()}")
+
         # Build XML sections for RAG documents
         xml_chunks = []
-        for c in context_chunks:
+        for c in packed.chunks:
              # Basic cleanup to avoid breaking XML
              safe_content = c['content'].replace('<', '&lt;').replace('>', '&gt;')
              xml_chunks.append(f"<documento source='{c.get('article_ref', 'Documento')}'>\n{safe_content}\n</documento>")
@@ -555,7 +706,7 @@ Pregunta reescrita:"""
         # Assemble <contexto_interno>
         context_text = "<contexto_interno>\n"
         
-        if structured_data:
+        if packed.structured_data:
              # Extract metadata for XML attributes
              # Default to 2025 as dynamic retrieval is complex without deeper refactoring
              # Ideally this comes from the CalculatorService, but user_context is a good proxy for intent.
@@ -563,24 +714,19 @@ Pregunta reescrita:"""
              safe_group = user_context.get('job_group', 'Generico') if user_context else 'Generico'
              safe_level = user_context.get('salary_level', 'Generico') if user_context else 'Generico'
              
-             context_text += f"<tabla_salarial año='{safe_year}' grupo='{safe_group}' nivel='{safe_level}'>\n{structured_data}\n</tabla_salarial>\n"
+             context_text += f"<tabla_salarial año='{safe_year}' grupo='{safe_group}' nivel='{safe_level}'>\n{packed.structured_data}\n</tabla_salarial>\n"
 
-        if kinship_context:
-            context_text += f"<tabla_parentesco>\n{kinship_context}\n</tabla_parentesco>\n"
+        if packed.kinship:
+            context_text += f"<tabla_parentesco>\n{packed.kinship}\n</tabla_parentesco>\n"
             
         context_text += f"<documentos_rag>\n{docs_xml}\n</documentos_rag>\n"
         context_text += "</contexto_interno>"
-
-        
-        # Truncate if context is too long (Gemini has token limits)
-        if len(context_text) > MAX_CONTEXT_CHARS:
-            print(f"[WARN] Context truncated from {len(context_text)} to {MAX_CONTEXT_CHARS} chars")
-            context_text = context_text[:MAX_CONTEXT_CHARS] + "\n\n...[contexto truncado por longitud]"
         
         # Select Prompt Template based on Intent
         system_prompt = PROMPT_TEMPLATES.get(intent, PROMPT_TEMPLATES[IntentType.GENERAL])
         
         # Inject User Context if available
+        # (every field rendered here must be in answer_cache.PROFILE_FIELDS)
         user_info = ""
         if user_context:
             user_info = f"""
@@ -607,31 +753,6 @@ DATOS DEL USUARIO (Personaliza la respuesta para este perfil):
                 content = msg.get('content', '').replace('\n', ' ')
                 history_text += f"- {role}: {content}\n"
             history_text += "\n"
-
-        # Assemble <contexto_interno>
-        # Truncate if context is too long (Gemini has token limits)
-        if len(context_text) > MAX_CONTEXT_CHARS:
-            print(f"[WARN] Context truncated from {len(context_text)} to {MAX_CONTEXT_CHARS} chars")
-            context_text = context_text[:MAX_CONTEXT_CHARS] + "\n\n...[contexto truncado por longitud]"
-        
-        # Select Prompt Template based on Intent
-        system_prompt = PROMPT_TEMPLATES.get(intent, PROMPT_TEMPLATES[IntentType.GENERAL])
-        
-        # Inject User Context if available
-        user_info = ""
-        if user_context:
-            user_info = f"""
-DATOS DEL USUARIO (Personaliza la respuesta para este perfil):
-- Nombre: {user_context.get('preferred_name', 'Usuario')}
-- Grupo Laboral: {user_context.get('job_group', 'No especificado')}
-- Nivel Salarial: {user_context.get('salary_level', 'No especificado')}
-- Tipo Contrato: {user_context.get('contract_type', 'No especificado')}
-
-                REGLA DE ORO DE DINERO (PRIORIDAD MÁXIMA): 
-                Los datos bajo el título 'DATOS OFICIALES DE TABLA SALARIAL' son 100% CORRECTOS y provienen de la calculadora oficial.
-                SÍ hay cualquier contradicción entre el texto de los artículos (Convenio) y los valores de la tabla oficial, PREVALECE SIEMPRE LA TABLA.
-                Usa el valor exacto de la tabla para el Nivel {user_context.get('salary_level')} y Grupo {user_context.get('job_group')} del usuario.
-                """
         
         # Prompt más flexible que permite usar búsqueda externa HÍBRIDA
         final_prompt = f"""
@@ -660,17 +781,8 @@ DATOS DEL USUARIO (Personaliza la respuesta para este perfil):
                - Si usas info de fuera, sé conciso.
                - Si usas info interna, cita el artículo.
             """
-
-        # Use Direct REST call for ALL generations to ensure Tool availability
-        # This bypasses the SDK validation issues we faced.
-        try:
-            response = self.gen_model.generate_content(final_prompt)
-            return {"text": response.text, "audit": None}
-        except Exception as e:
-            print(f"API Error: {e}")
-            return {"text": "Error de conexión con el servicio de IA.", "audit": None}
-        
-        return {"text": "No se ha configurado la API Key de Google.", "audit": None}
+        observe_prompt(intent, estimate_tokens(final_prompt), packed.duplicates, packed.dropped, packed.truncated)
+        return final_prompt
     
     # ✅ FASE 2: Métodos de Calculadora Híbrida
     
@@ -775,19 +887,20 @@ DATOS DEL USUARIO (Personaliza la respuesta para este perfil):
         # No basta con que parezca una tabla, tiene que contener los niveles que buscamos.
         salary_data = None
         target_chunk = None
+        attempted_ids = set()
 
         for anchor in anchor_results:
             # Filtro básico de tipo (ya existente)
-            is_table = anchor.chunk_metadata.get("type") == "table"
+            is_table = anchor.chunk_type == "table"
             is_anexo = "anexo" in anchor.article_ref.lower() or "tabla" in anchor.article_ref.lower()
             
             if not (is_table or is_anexo):
                 continue
 
             # Intentar extracción con este anchor
+            attempted_ids.add(anchor.id)
             try:
-                chunk_year = anchor.chunk_metadata.get("year")
-                year = chunk_year if isinstance(chunk_year, int) else datetime.now().year
+                year = anchor.year or datetime.now().year
                 
                 logger.info(f"🔎 Probando extracción en anchor: {anchor.article_ref}")
                 
@@ -810,20 +923,19 @@ DATOS DEL USUARIO (Personaliza la respuesta para este perfil):
                 logger.error(f"Error parseando anchor {anchor.id}: {e}")
                 continue
         
-        # Si después del loop nada funcionó, intentamos el fallback del primero (por si acaso)
-        if not salary_data:
+        # Si después del loop nada funcionó, probar el primero SOLO si el loop no lo intentó ya
+        # (antes se repetía la misma extracción con Gemini sobre el mismo chunk)
+        if not salary_data and anchor_results[0].id not in attempted_ids:
             logger.warning("Ningún anchor permitió la extracción. Fallback a lógica original con [0]")
             target_chunk = anchor_results[0]
-            # (Aquí podríamos reintentar o simplemente fallar, pero mantenemos el flujo para que devuelva el error estándar)
-            # Re-run extraction execution to generate the failure logs/return cleanly
-            chunk_year = target_chunk.chunk_metadata.get("year")
-            year = chunk_year if isinstance(chunk_year, int) else datetime.now().year
+            year = target_chunk.year or datetime.now().year
             salary_data = self.hybrid_calculator.extract_salary_data(
                 table_content=target_chunk.content,
                 query=query,
                 company=company_slug or "general",
                 year=year,
             )
+        target_chunk = target_chunk or anchor_results[0]
 
         if not salary_data:
             logger.error("No se pudieron extraer datos de ninguna tabla")
@@ -847,7 +959,7 @@ DATOS DEL USUARIO (Personaliza la respuesta para este perfil):
             logger.error("Validación falló")
             return {
                 "answer": "El cálculo no pasó la validación de coherencia.",
-                "sources": [table_chunk],
+                "sources": [target_chunk],
                 "calculation": None,
             }
 
@@ -855,7 +967,7 @@ DATOS DEL USUARIO (Personaliza la respuesta para este perfil):
 
         return {
             "answer": answer,
-            "sources": [table_chunk],
+            "sources": [target_chunk],
             "calculation": result.to_dict(),
         }
 
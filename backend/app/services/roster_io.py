@@ -0,0 +1,309 @@
+"""
+Roster IO - Simulación de nóminas desde ficheros de plantilla (CSV / Parquet).
+
+Cada fila del fichero es un CalculationRequest:
+
+- columnas con el nombre de un campo (company_slug, user_group, user_level,
+  payments, contract_percentage, contract_type, irpf_percentage,
+  gross_annual_salary, ...) -> ese campo
+- employee_id (opcional) -> se copia tal cual al resultado
+- cualquier otra columna -> dynamic_variables[código] (celdas vacías se ignoran)
+
+El fichero se recorre en chunks de ROSTER_CHUNK_ROWS filas (memoria acotada
+aunque tenga 50k filas) y cada chunk pasa por BatchCalculatorService, cuyas
+tarifas y perfiles resueltos se reutilizan en todo el fichero. Los resultados
+se emiten también por chunks, con una columna por concepto del desglose.
+
+Una primera pasada valida todas las filas y recoge las empresas, para poder
+fallar antes de empezar a emitir y fijar las columnas de conceptos
+(necesario para la cabecera CSV y el esquema Parquet).
+
+Parquet usa pyarrow (opcional: solo se importa al leer/escribir Parquet).
+"""
+import csv
+import io
+import shutil
+import tempfile
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from app.constants import ROSTER_CHUNK_ROWS, SECTOR_COMPANIES
+from app.schemas.salary import CalculationRequest, SalaryResponse
+from app.services.batch_calculator import BatchCalculatorService
+from app.services.tariff_model import tariff_model
+
+ROSTER_FORMATS = ("csv", "parquet")
+REQUEST_FIELDS = [name for name in CalculationRequest.model_fields if name != "dynamic_variables"]
+ID_COLUMN = "employee_id"
+PROFILE_COLUMNS = [ID_COLUMN, "company_slug", "user_group", "user_level"]
+RESULT_COLUMNS = ["base_salary_monthly", "variable_salary", "gross_monthly_total", "net_salary_monthly", "annual_gross"]
+
+# Conceptos que genera el propio calculador (los dinámicos salen de las definiciones)
+FIXED_CONCEPTS = [
+    "Salario Base (Parte Proporcional)",
+    "Prorrata Pagas Extra",
+    "Plus Función (Categoría)",
+    "Plus Progresión",
+]
+DEDUCTION_CONCEPTS = [
+    "SS: Contingencias Comunes",
+    "SS: Desempleo",
+    "SS: Formación Profesional",
+    "Retención IRPF",
+]
+
+# Conceptos cuyo paréntesis final cambia por empleado: "SS: Desempleo (1.55%)" -> "SS: Desempleo"
+VARYING_DETAIL_CONCEPTS = ["Plus Progresión"] + DEDUCTION_CONCEPTS
+
+
+class RosterError(ValueError):
+    """Fichero de plantilla inválido (formato, cabecera o fila)."""
+
+
+def roster_format(filename: Optional[str], default: str = "csv") -> str:
+    """Formato por extensión (.csv / .parquet)."""
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    if extension in ROSTER_FORMATS:
+        return extension
+    if extension == "pq":
+        return "parquet"
+    return default
+
+
+def concept_column(name: str) -> str:
+    """Nombre de columna estable para un concepto del desglose."""
+    for base in VARYING_DETAIL_CONCEPTS:
+        if name.startswith(f"{base} ("):
+            return base
+    return name
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise RosterError("Parquet requiere pyarrow (pip install pyarrow)") from e
+    return pyarrow
+
+
+# ----------------------------------------------------------------------
+# Lectura
+# ----------------------------------------------------------------------
+
+def iter_roster_rows(path: str, fmt: str, chunk_size: int = ROSTER_CHUNK_ROWS) -> Iterator[List[dict]]:
+    """Filas crudas del fichero en listas de hasta chunk_size. Ficheros ilegibles -> RosterError."""
+    if fmt == "parquet":
+        pa = _pyarrow()
+        try:
+            for batch in pa.parquet.ParquetFile(path).iter_batches(batch_size=chunk_size):
+                yield batch.to_pylist()
+        except pa.ArrowException as e:
+            raise RosterError(f"Parquet inválido: {e}") from e
+        return
+
+    try:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            chunk = []
+            for row in csv.DictReader(f):
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+    except (UnicodeDecodeError, csv.Error) as e:
+        # Típico de exportaciones de Excel en Latin-1/cp1252
+        raise RosterError(f"CSV ilegible, guárdalo como UTF-8: {e}") from e
+
+
+def _is_empty(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def row_to_request(row: dict, line: int) -> Tuple[Optional[str], CalculationRequest]:
+    """(employee_id, CalculationRequest) de una fila; RosterError con el número de fila si no es válida."""
+    fields = {}
+    dynamic_variables = {}
+    try:
+        for column, value in row.items():
+            if column is None or _is_empty(value):
+                continue
+            column = column.strip()
+            if column == ID_COLUMN:
+                continue
+            if column in REQUEST_FIELDS:
+                fields[column] = value.strip() if isinstance(value, str) else value
+            else:
+                dynamic_variables[column] = float(value)
+        request = CalculationRequest(**fields, dynamic_variables=dynamic_variables)
+    except (ValidationError, ValueError, TypeError) as e:
+        raise RosterError(f"Fila {line}: {e}") from e
+
+    employee_id = row.get(ID_COLUMN)
+    return (None if _is_empty(employee_id) else str(employee_id)), request
+
+
+def iter_roster_requests(path: str, fmt: str, chunk_size: int = ROSTER_CHUNK_ROWS) -> Iterator[List[Tuple[Optional[str], CalculationRequest]]]:
+    line = 1
+    for rows in iter_roster_rows(path, fmt, chunk_size):
+        chunk = []
+        for row in rows:
+            line += 1  # la fila 1 es la cabecera
+            chunk.append(row_to_request(row, line))
+        yield chunk
+
+
+def scan_roster(path: str, fmt: str, chunk_size: int = ROSTER_CHUNK_ROWS) -> Tuple[int, Set[str]]:
+    """Primera pasada: valida todas las filas. Devuelve (nº de filas, empresas)."""
+    if fmt not in ROSTER_FORMATS:
+        raise RosterError(f"Formato no soportado: {fmt} (usa {', '.join(ROSTER_FORMATS)})")
+    total = 0
+    companies: Set[str] = set()
+    for chunk in iter_roster_requests(path, fmt, chunk_size):
+        total += len(chunk)
+        companies.update(request.company_slug for _, request in chunk)
+    if total == 0:
+        raise RosterError("El fichero no contiene filas")
+    return total, companies
+
+
+# ----------------------------------------------------------------------
+# Cálculo
+# ----------------------------------------------------------------------
+
+class RosterCalculator:
+    """Calcula un roster completo chunk a chunk con un único BatchCalculatorService."""
+
+    def __init__(self, db: Session, chunk_size: int = ROSTER_CHUNK_ROWS):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.batch = BatchCalculatorService(db)
+
+    def concept_columns(self, companies: Iterable[str]) -> List[str]:
+        """Columnas de desglose: fijas + nombres de conceptos activos de esas empresas + deducciones."""
+        slugs = {"convenio-sector" if company in SECTOR_COMPANIES else company for company in companies}
+        tariffs = tariff_model.get_many(self.db, sorted(slugs))
+        columns = list(FIXED_CONCEPTS)
+        for slug in sorted(slugs):
+            for definition in tariffs[slug].definitions.values():
+                column = concept_column(definition.name)
+                if column not in columns and column not in DEDUCTION_CONCEPTS:
+                    columns.append(column)
+        return columns + DEDUCTION_CONCEPTS
+
+    def iter_results(self, path: str, fmt: str) -> Iterator[List[dict]]:
+        """Filas de salida (dict columna -> valor) por chunk."""
+        for chunk in iter_roster_requests(path, fmt, self.chunk_size):
+            response = self.batch.calculate_batch([request for _, request in chunk])
+            yield [
+                result_row(employee_id, request, result)
+                for (employee_id, request), result in zip(chunk, response.results)
+            ]
+
+
+def result_row(employee_id: Optional[str], request: CalculationRequest, result: SalaryResponse) -> dict:
+    row = {
+        ID_COLUMN: employee_id,
+        "company_slug": request.company_slug,
+        "user_group": request.user_group,
+        "user_level": request.user_level,
+    }
+    row.update({column: getattr(result, column) for column in RESULT_COLUMNS})
+    for concept in result.breakdown:
+        column = concept_column(concept.name)
+        row[column] = round(row.get(column, 0.0) + concept.amount, 2)
+    return row
+
+
+# ----------------------------------------------------------------------
+# Escritura (generadores para StreamingResponse o un fichero)
+# ----------------------------------------------------------------------
+
+def iter_csv(result_chunks: Iterable[List[dict]], concept_columns: List[str]) -> Iterator[str]:
+    """CSV en texto, un bloque por chunk (la cabecera va en el primero)."""
+    columns = PROFILE_COLUMNS + RESULT_COLUMNS + concept_columns
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    for rows in result_chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _DrainableSink(io.RawIOBase):
+    """Destino de escritura para pyarrow que se vacía tras cada row group."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def iter_parquet(result_chunks: Iterable[List[dict]], concept_columns: List[str]) -> Iterator[bytes]:
+    """Parquet en bytes: un row group por chunk, emitido en cuanto se escribe."""
+    pa = _pyarrow()
+    schema = pa.schema(
+        [(column, pa.string()) for column in PROFILE_COLUMNS]
+        + [(column, pa.float64()) for column in RESULT_COLUMNS + concept_columns]
+    )
+    sink = _DrainableSink()
+    writer = pa.parquet.ParquetWriter(sink, schema)
+    try:
+        for rows in result_chunks:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def iter_output(result_chunks: Iterable[List[dict]], concept_columns: List[str], fmt: str) -> Iterator:
+    if fmt == "parquet":
+        return iter_parquet(result_chunks, concept_columns)
+    return iter_csv(result_chunks, concept_columns)
+
+
+def spool_upload(fileobj, fmt: str) -> str:
+    """Copia un upload a un fichero temporal en disco (sin cargarlo en memoria). El llamador lo borra."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=f".{fmt}") as tmp:
+        shutil.copyfileobj(fileobj, tmp, length=1024 * 1024)
+    return tmp.name
+
+
+def simulate_roster(db: Session, path: str, input_format: str, output_format: str,
+                    chunk_size: int = ROSTER_CHUNK_ROWS) -> Tuple[int, Iterator]:
+    """
+    Valida el fichero y devuelve (nº de filas, generador de salida).
+    Los errores de validación (RosterError) se lanzan aquí, antes de emitir nada.
+    """
+    if output_format not in ROSTER_FORMATS:
+        raise RosterError(f"Formato no soportado: {output_format} (usa {', '.join(ROSTER_FORMATS)})")
+    if "parquet" in (input_format, output_format):
+        _pyarrow()
+    total, companies = scan_roster(path, input_format, chunk_size)
+    calculator = RosterCalculator(db, chunk_size)
+    columns = calculator.concept_columns(companies)
+    return total, iter_output(calculator.iter_results(path, input_format), columns, output_format)
@@ -0,0 +1,256 @@
+"""
+Semantic Cache - Caché de resultados de QueryExpander.
+
+Los usuarios repiten las mismas preguntas ("cuánto cobra nivel 3",
+"permiso por hospitalización") miles de veces. Esta caché evita la llamada
+a Gemini en la ruta crítica de RagEngine.search:
+
+- Clave exacta: texto normalizado (minúsculas, sin tildes ni puntuación).
+- Near-hit: similitud coseno de embeddings (MiniLM de RagEngine) >= umbral.
+- Eviction: TTL + LRU, con contadores de hits/misses.
+- Almacenamiento: en proceso, con tabla Postgres opcional compartida por
+  todos los workers de uvicorn (QUERY_CACHE_PERSISTENT=true).
+"""
+import copy
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from app.constants import (
+    QUERY_CACHE_MAX_ENTRIES,
+    QUERY_CACHE_TTL_SECONDS,
+    QUERY_CACHE_SIMILARITY_THRESHOLD,
+)
+from app.services.monitoring import observe_cache_entries, observe_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(text: str) -> str:
+    """'¿Cuánto cobra el Nivel 3?' -> 'cuanto cobra el nivel 3'"""
+    stripped = ''.join(
+        c for c in unicodedata.normalize('NFD', text or "")
+        if unicodedata.category(c) != 'Mn'
+    ).lower()
+    stripped = re.sub(r'[^a-z0-9ñ]+', ' ', stripped)
+    return ' '.join(stripped.split())
+
+
+def _numbers(normalized: str) -> set:
+    return set(re.findall(r'\d+', normalized))
+
+
+class SemanticCache:
+    """
+    Caché LRU/TTL con búsqueda exacta + semántica.
+    Thread-safe: RagEngine.search se ejecuta en el threadpool.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_entries: int = QUERY_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = QUERY_CACHE_TTL_SECONDS,
+        similarity_threshold: float = QUERY_CACHE_SIMILARITY_THRESHOLD,
+        allow_near_hits: bool = True,
+        persistent: bool = False,
+        embedder: Optional[Callable[[str], Any]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.allow_near_hits = allow_near_hits
+        self.persistent = persistent
+        self.embedder = embedder
+        self._clock = clock
+
+        # key -> (value, expires_at, unit_embedding | None)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --- API pública ---
+
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        key = normalize_query(query)
+        if not key:
+            return None
+
+        value = self._get_exact(key)
+        if value is not None:
+            self._count("hits")
+            return copy.deepcopy(value)
+
+        embedding = None
+        if self.allow_near_hits and self.embedder:
+            embedding = self._embed(query)
+            if embedding is not None:
+                value = self._get_near(key, embedding)
+                if value is not None:
+                    self._count("near_hits")
+                    return copy.deepcopy(value)
+
+        if self.persistent:
+            value = self._db_get(key, embedding)
+            if value is not None:
+                # Promocionar a memoria local
+                self._store(key, value, embedding)
+                self._count("hits")
+                return copy.deepcopy(value)
+
+        self._count("misses")
+        return None
+
+    def put(self, query: str, value: Dict[str, Any]) -> None:
+        key = normalize_query(query)
+        if not key:
+            return
+
+        embedding = self._embed(query) if (self.allow_near_hits and self.embedder) else None
+        self._store(key, copy.deepcopy(value), embedding)
+
+        if self.persistent:
+            self._db_put(key, query, value, embedding)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            observe_cache_entries(self.namespace, 0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+            }
+
+    # --- Memoria local ---
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        observe_cache_lookup(self.namespace, counter)
+
+    def _get_exact(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at, _ = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.evictions += 1
+                observe_cache_entries(self.namespace, len(self._entries))
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def _get_near(self, key: str, embedding: np.ndarray):
+        numbers = _numbers(key)
+        now = self._clock()
+        best_key, best_score = None, self.similarity_threshold
+
+        with self._lock:
+            for candidate_key, (_, expires_at, candidate_emb) in self._entries.items():
+                if candidate_emb is None or expires_at <= now:
+                    continue
+                # "nivel 3" y "nivel 4" son casi idénticos semánticamente: exigir mismos números
+                if _numbers(candidate_key) != numbers:
+                    continue
+                score = float(np.dot(candidate_emb, embedding))
+                if score >= best_score:
+                    best_key, best_score = candidate_key, score
+
+            if best_key is None:
+                return None
+            self._entries.move_to_end(best_key)
+            logger.debug(f"SemanticCache[{self.namespace}] near-hit '{key}' ~ '{best_key}' ({best_score:.3f})")
+            return self._entries[best_key][0]
+
+    def _store(self, key: str, value, embedding) -> None:
+        with self._lock:
+            self._entries[key] = (value, self._clock() + self.ttl_seconds, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            observe_cache_entries(self.namespace, len(self._entries))
+
+    def _embed(self, query: str) -> Optional[np.ndarray]:
+        try:
+            vector = np.asarray(self.embedder(query), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            return vector / norm if norm else None
+        except Exception as e:
+            logger.warning(f"SemanticCache[{self.namespace}]: embedding failed: {e}")
+            return None
+
+    # --- Postgres (compartida entre workers) ---
+
+    def _db_get(self, key: str, embedding: Optional[np.ndarray]):
+        from app.db.database import SessionLocal
+        from app.db.models import SemanticCacheEntry
+
+        min_created = datetime.utcnow() - timedelta(seconds=self.ttl_seconds)
+        try:
+            with SessionLocal() as db:
+                base = db.query(SemanticCacheEntry).filter(
+                    SemanticCacheEntry.namespace == self.namespace,
+                    SemanticCacheEntry.created_at >= min_created,
+                )
+                row = base.filter(SemanticCacheEntry.cache_key == key).first()
+                if row is None and embedding is not None:
+                    distance = SemanticCacheEntry.embedding.cosine_distance(embedding.tolist())
+                    candidate = base.filter(SemanticCacheEntry.embedding.isnot(None)).add_columns(distance).order_by(distance).first()
+                    if candidate:
+                        entry, dist = candidate
+                        if 1 - dist >= self.similarity_threshold and _numbers(entry.cache_key) == _numbers(key):
+                            row = entry
+                return row.payload if row else None
+        except Exception as e:
+            logger.warning(f"SemanticCache[{self.namespace}]: DB lookup failed: {e}")
+            return None
+
+    def _db_put(self, key: str, query: str, value, embedding: Optional[np.ndarray]) -> None:
+        from sqlalchemy.dialects.postgresql import insert
+        from app.db.database import SessionLocal
+        from app.db.models import SemanticCacheEntry
+
+        values = {
+            "namespace": self.namespace,
+            "cache_key": key,
+            "query_text": query,
+            "payload": value,
+            "embedding": embedding.tolist() if embedding is not None else None,
+            "created_at": datetime.utcnow(),
+        }
+        stmt = insert(SemanticCacheEntry).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["namespace", "cache_key"],
+            set_={k: stmt.excluded[k] for k in ("query_text", "payload", "embedding", "created_at")},
+        )
+        try:
+            with SessionLocal() as db:
+                db.execute(stmt)
+                db.commit()
+        except Exception as e:
+            logger.warning(f"SemanticCache[{self.namespace}]: DB write failed: {e}")
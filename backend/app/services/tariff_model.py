@@ -0,0 +1,219 @@
+"""
+Tariff Model - Tablas salariales compiladas en memoria por empresa.
+
+Cada /calculadoras/smart hacía varias consultas a salary_tables (exacta +
+fallbacks contains/like), otra a salary_concept_definitions y, para EasyJet,
+abría y parseaba data/structure_templates/easyjet.json dos veces. Aquí cada
+empresa se carga UNA vez (una consulta por tabla) y se compila a:
+
+- group -> level -> {concept: amount}   (mismas reglas de precedencia que las consultas)
+- definiciones de conceptos activas (con level_values)
+- estructura de categorías de la plantilla (EasyJet)
+
+El modelo se comparte entre peticiones y se invalida solo cuando cambia
+corpus_version.salary (checksum de salary_tables y de las definiciones: reseeds
+y UPDATE en sitio) y, como red de seguridad, cada TARIFF_MODEL_TTL_SECONDS.
+En la ruta caliente el calculador no hace I/O.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.constants import TARIFF_MODEL_TTL_SECONDS
+from app.db.models import SalaryConceptDefinition, SalaryTable
+from app.services.corpus_version import corpus_version
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'structure_templates')
+
+# Empresas cuya plantilla define categorías/niveles que el calculador necesita
+TEMPLATE_FILES = {
+    "easyjet": "easyjet.json",
+}
+
+# (id, year, group, level, concept, amount)
+SalaryRow = Tuple[int, int, str, str, str, float]
+
+
+@dataclass(frozen=True)
+class ConceptDefinition:
+    """Copia inmutable de SalaryConceptDefinition (compartida entre hilos)."""
+    code: str
+    name: str
+    input_type: str
+    default_price: float
+    level_values: Optional[dict]
+
+
+@dataclass(frozen=True)
+class TemplateCategory:
+    """Categoría de la plantilla: grupo al que pertenece y niveles por nombre."""
+    group: str
+    data: dict
+    levels: Dict[str, dict] = field(default_factory=dict)
+
+
+def _prices(rows: Iterable[SalaryRow]) -> Dict[str, float]:
+    # Igual que iterar el resultado SQL: la última fila de cada concepto gana
+    prices = {}
+    for _, _, _, _, concept, amount in rows:
+        prices[concept] = amount if amount is not None else 0.0
+    return prices
+
+
+class CompanyTariff:
+    """Tarifa compilada de una empresa (salary_tables.company_id == slug)."""
+
+    def __init__(
+        self,
+        slug: str,
+        rows: Iterable[SalaryRow],
+        definitions: Iterable[ConceptDefinition] = (),
+        template: Optional[dict] = None,
+    ):
+        self.slug = slug
+        self.definitions: Dict[str, ConceptDefinition] = {d.code: d for d in definitions}
+        self.categories: Dict[str, TemplateCategory] = self._compile_template(template)
+
+        # group -> filas en orden de id (orden físico de las consultas sin ORDER BY)
+        self._rows_by_group: Dict[str, List[SalaryRow]] = {}
+        for row in sorted(rows, key=lambda r: r[0]):
+            self._rows_by_group.setdefault(row[2], []).append(row)
+
+        # (group, level) -> precios, como `ORDER BY year DESC` + dict (gana el año más antiguo)
+        self._exact: Dict[Tuple[str, str], Dict[str, float]] = {}
+        # group -> level -> concept -> amount del año más reciente (tabla por grupo)
+        self._latest: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for group, group_rows in self._rows_by_group.items():
+            by_level: Dict[str, List[SalaryRow]] = {}
+            # year DESC con NULLs primero (como Postgres), id como desempate estable
+            for row in sorted(group_rows, key=lambda r: (r[1] is not None, -(r[1] or 0), r[0])):
+                by_level.setdefault(row[3], []).append(row)
+            for level, level_rows in by_level.items():
+                self._exact[(group, level)] = _prices(level_rows)
+                latest = self._latest.setdefault(group, {}).setdefault(level, {})
+                for _, _, _, _, concept, amount in level_rows:
+                    latest.setdefault(concept, amount)
+
+    @staticmethod
+    def _compile_template(template: Optional[dict]) -> Dict[str, TemplateCategory]:
+        categories: Dict[str, TemplateCategory] = {}
+        for group in ((template or {}).get('structure') or {}).get('groups', []):
+            for category in group.get('categories', []):
+                # La primera aparición gana (mismo orden que el recorrido original)
+                categories.setdefault(category['name'], TemplateCategory(
+                    group=group['name'],
+                    data=category,
+                    levels={level['level']: level for level in reversed(category.get('levels', []))},
+                ))
+        return categories
+
+    def prices(self, group: str, level: str) -> Dict[str, float]:
+        """Precios de group/level exactos ({} si no hay filas)."""
+        return dict(self._exact.get((group, level), {}))
+
+    def prices_matching(self, group: str, fragment: str) -> Tuple[Dict[str, float], Optional[str]]:
+        """
+        Equivalente a `level LIKE '%fragment%'` dentro del grupo.
+        Devuelve (precios, primer level que coincide).
+        """
+        rows = [row for row in self._rows_by_group.get(group, []) if fragment in (row[3] or "")]
+        return _prices(rows), (rows[0][3] if rows else None)
+
+    def group_levels(self, group: str) -> Dict[str, Dict[str, float]]:
+        """level -> concept -> amount (año más reciente) para todos los niveles del grupo."""
+        return {level: dict(concepts) for level, concepts in self._latest.get(group, {}).items()}
+
+
+class TariffModel:
+    """Registro de CompanyTariff por empresa, invalidado por corpus_version.salary o por TTL."""
+
+    def __init__(self, ttl_seconds: float = TARIFF_MODEL_TTL_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._tariffs: Dict[str, CompanyTariff] = {}
+        self._version: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._templates: Dict[str, Optional[dict]] = {}
+
+    def get(self, db: Session, slug: str) -> CompanyTariff:
+        return self.get_many(db, [slug])[slug]
+
+    def get_many(self, db: Session, slugs: Iterable[str]) -> Dict[str, CompanyTariff]:
+        """Tarifas de varias empresas; las que faltan se cargan juntas (una consulta por tabla)."""
+        slugs = list(dict.fromkeys(slugs))
+        version = corpus_version.salary(db)  # memoizado por proceso (CORPUS_VERSION_TTL_SECONDS)
+        now = self._clock()
+        with self._lock:
+            if version != self._version or now >= self._expires_at:
+                if version != self._version and self._version is not None:
+                    logger.info(f"TariffModel: salary version {self._version} -> {version}, recompiling")
+                self._tariffs.clear()
+                self._version = version
+                self._expires_at = now + self.ttl_seconds
+            missing = [slug for slug in slugs if slug not in self._tariffs]
+            if missing:
+                self._tariffs.update(self._load(db, missing))
+            return {slug: self._tariffs[slug] for slug in slugs}
+
+    def _load(self, db: Session, slugs: List[str]) -> Dict[str, CompanyTariff]:
+        rows: Dict[str, List[SalaryRow]] = {slug: [] for slug in slugs}
+        for company_id, *row in db.execute(
+            select(
+                SalaryTable.company_id, SalaryTable.id, SalaryTable.year, SalaryTable.group,
+                SalaryTable.level, SalaryTable.concept, SalaryTable.amount,
+            ).where(SalaryTable.company_id.in_(slugs))
+        ):
+            rows[company_id].append(tuple(row))
+
+        definitions: Dict[str, List[ConceptDefinition]] = {slug: [] for slug in slugs}
+        for d in db.execute(
+            select(SalaryConceptDefinition).where(
+                SalaryConceptDefinition.company_slug.in_(slugs),
+                SalaryConceptDefinition.is_active == True,
+            ).order_by(SalaryConceptDefinition.id)
+        ).scalars():
+            definitions[d.company_slug].append(ConceptDefinition(
+                code=d.code,
+                name=d.name,
+                input_type=d.input_type,
+                default_price=d.default_price,
+                level_values=d.level_values,
+            ))
+
+        tariffs = {}
+        for slug in slugs:
+            tariffs[slug] = CompanyTariff(slug, rows[slug], definitions[slug], self._template(slug))
+            logger.info(f"TariffModel: compiled {slug} ({len(rows[slug])} rows, {len(definitions[slug])} concepts)")
+        return tariffs
+
+    def _template(self, slug: str) -> Optional[dict]:
+        # Las plantillas son ficheros del repo: se leen una vez por proceso
+        if slug not in self._templates:
+            template = None
+            filename = TEMPLATE_FILES.get(slug)
+            if filename:
+                try:
+                    with open(os.path.join(TEMPLATES_DIR, filename), 'r', encoding='utf-8') as f:
+                        template = json.load(f)
+                except Exception as e:
+                    logger.warning(f"TariffModel: could not load template {filename}: {e}")
+            self._templates[slug] = template
+        return self._templates[slug]
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._tariffs.clear()
+            self._version = None
+
+
+tariff_model = TariffModel()
@@ -1,8 +1,34 @@
+"""
+Audit log of RAG interactions and auditor verdicts (logs/audit.jsonl).
+
+log_audit_event() only enqueues the raw event: hashing the context, JSON
+encoding and the file append happen in a background writer thread
+(AuditLogWriter) that flushes in batches (AUDIT_LOG_BATCH_SIZE events or every
+AUDIT_LOG_FLUSH_SECONDS), rotates the file past AUDIT_LOG_MAX_BYTES into
+gzip-compressed backups and, with AUDIT_LOG_POSTGRES=true, also COPYs each
+batch into the audit_events table.
+"""
 import os
 import json
+import gzip
+import glob
+import queue
+import shutil
+import atexit
 import logging
+import threading
+import time
 from datetime import datetime
 import hashlib
+from typing import Callable, List, Optional
+
+from app.constants import (
+    AUDIT_LOG_BACKUPS,
+    AUDIT_LOG_BATCH_SIZE,
+    AUDIT_LOG_FLUSH_SECONDS,
+    AUDIT_LOG_MAX_BYTES,
+    AUDIT_LOG_QUEUE_MAX_EVENTS,
+)
 
 # Configure logging to a file in the root 'logs' directory
 # Assuming this file is in backend/app/utils/
@@ -15,31 +41,198 @@ log_file = os.path.join(log_dir, 'audit.jsonl')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("audit_logger")
 
-def log_audit_event(query: str, intent: str, response: str, context: str, auditor_result: dict):
+RESPONSE_SNIPPET_CHARS = 500
+_STOP = object()
+
+
+def build_audit_event(timestamp: datetime, query: str, intent: str, response: str, context: str, auditor_result: dict) -> dict:
     """
-    Logs the RAG interaction and Audit result to a JSONL file.
-    Hashes the context to ensure data integrity without storing massive text blobs.
+    The JSONL record. Hashes the context to ensure data integrity without storing massive text blobs.
     """
-    try:
-        # Create a hash of the context to track what the model "saw"
-        # This is useful for debugging: "Why did it say X? Because Context Hash was Y"
-        context_hash = hashlib.sha256(context.encode('utf-8', errors='ignore')).hexdigest()
-        
-        event = {
-            "timestamp": datetime.now().isoformat(),
-            "query": query,
-            "intent": intent,
-            "response_snippet": response[:500] + "..." if len(response) > 500 else response,
-            "context_hash": context_hash,
-            "auditor_verdict": {
-                "approved": auditor_result.get("aprobado", False),
-                "reason": auditor_result.get("razon", "Unknown"),
-                "risk": auditor_result.get("nivel_riesgo", "UNKNOWN")
-            }
+    # Create a hash of the context to track what the model "saw"
+    # This is useful for debugging: "Why did it say X? Because Context Hash was Y"
+    context_hash = hashlib.sha256(context.encode('utf-8', errors='ignore')).hexdigest()
+
+    return {
+        "timestamp": timestamp.isoformat(),
+        "query": query,
+        "intent": intent,
+        "response_snippet": response[:RESPONSE_SNIPPET_CHARS] + "..." if len(response) > RESPONSE_SNIPPET_CHARS else response,
+        "context_hash": context_hash,
+        "auditor_verdict": {
+            "approved": auditor_result.get("aprobado", False),
+            "reason": auditor_result.get("razon", "Unknown"),
+            "risk": auditor_result.get("nivel_riesgo", "UNKNOWN")
+        }
+    }
+
+
+def postgres_audit_sink(events: List[dict]) -> None:
+    """Sink opcional: COPY binario del lote a audit_events (una transacción por lote)."""
+    from app.db.bulk_loader import copy_rows
+    from app.db.database import engine
+    from app.db.models import AuditEvent
+
+    rows = [
+        {
+            "created_at": datetime.fromisoformat(event["timestamp"]),
+            "query": event["query"],
+            "intent": event["intent"],
+            "response_snippet": event["response_snippet"],
+            "context_hash": event["context_hash"],
+            "approved": event["auditor_verdict"]["approved"],
+            "reason": event["auditor_verdict"]["reason"],
+            "risk": event["auditor_verdict"]["risk"],
         }
-        
-        with open(log_file, 'a', encoding='utf-8') as f:
-            f.write(json.dumps(event, ensure_ascii=False) + '\n')
-            
-    except Exception as e:
-        logger.error(f"Failed to log audit event: {e}")
+        for event in events
+    ]
+    with engine.begin() as conn:
+        copy_rows(conn, AuditEvent.__table__, rows)
+
+
+class AuditLogWriter:
+    """
+    Background batched writer for the audit log.
+
+        writer.submit(raw)  # request thread: one put_nowait, nothing else
+        writer.flush()      # waits until everything submitted so far is written
+        writer.close()      # flush + stop the thread (atexit)
+
+    The thread is started lazily on the first submit (and restarted in a
+    forked worker, where the parent's thread does not exist).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = AUDIT_LOG_BATCH_SIZE,
+        flush_interval: float = AUDIT_LOG_FLUSH_SECONDS,
+        max_bytes: int = AUDIT_LOG_MAX_BYTES,
+        backups: int = AUDIT_LOG_BACKUPS,
+        max_pending: int = AUDIT_LOG_QUEUE_MAX_EVENTS,
+        sink: Optional[Callable[[List[dict]], None]] = None,
+    ):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.sink = sink
+        self.dropped = 0
+        self.written = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # --- Request thread ---
+
+    def submit(self, raw: tuple) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(raw)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Blocks until the events submitted before this call are written (tests, shutdown)."""
+        if not self._alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 10.0) -> None:
+        if not self._alive():
+            return
+        self._queue.put(_STOP, timeout=timeout)
+        self._thread.join(timeout)
+
+    def _alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _ensure_started(self) -> None:
+        if self._alive():
+            return
+        with self._lock:
+            if not self._alive():
+                self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+                self._thread.start()
+
+    # --- Writer thread ---
+
+    def _run(self) -> None:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is _STOP or isinstance(item, threading.Event):
+                self._write(batch)
+                batch = []
+                if item is _STOP:
+                    return
+                item.set()
+            elif item is not None:
+                batch.append(item)
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _write(self, batch: list) -> None:
+        if not batch:
+            return
+        events = []
+        for raw in batch:
+            try:
+                events.append(build_audit_event(*raw))
+            except Exception as e:
+                logger.error(f"Failed to build audit event: {e}")
+
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write("".join(json.dumps(event, ensure_ascii=False) + '\n' for event in events))
+            self.written += len(events)
+            self._rotate_if_needed()
+        except Exception as e:
+            logger.error(f"Failed to write {len(events)} audit events: {e}")
+
+        if self.sink and events:
+            try:
+                self.sink(events)
+            except Exception as e:
+                logger.error(f"Audit sink failed for {len(events)} events: {e}")
+
+    def _rotate_if_needed(self) -> None:
+        """audit.jsonl -> audit-<timestamp>.jsonl.gz, keeping the newest `backups` files."""
+        if os.path.getsize(self.path) < self.max_bytes:
+            return
+        stem, ext = os.path.splitext(self.path)
+        rotated = f"{stem}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{ext}"
+        os.replace(self.path, rotated)
+        with open(rotated, 'rb') as src, gzip.open(rotated + '.gz', 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated)
+
+        for old in sorted(glob.glob(f"{glob.escape(stem)}-*{ext}.gz"))[:-self.backups or None]:
+            os.remove(old)
+        logger.info(f"Audit log rotated -> {os.path.basename(rotated)}.gz")
+
+
+audit_writer = AuditLogWriter(
+    log_file,
+    sink=postgres_audit_sink if os.getenv("AUDIT_LOG_POSTGRES", "false").lower() == "true" else None,
+)
+atexit.register(audit_writer.close)
+
+
+def log_audit_event(query: str, intent: str, response: str, context: str, auditor_result: dict):
+    """
+    Logs the RAG interaction and Audit result to audit.jsonl (and the optional Postgres sink).
+    Non-blocking: the event is queued and hashed/written in batches by audit_writer.
+    """
+    audit_writer.submit((datetime.now(), query, intent, response, context, auditor_result))
@@ -0,0 +1,167 @@
+"""
+Batched embedding generation for ingestion scripts.
+
+Encoding one chunk per `SentenceTransformer.encode` call means one forward
+pass at batch size 1 per article. BatchEmbedder collects texts and encodes
+them in configurable batches, optionally spread over a multi-process pool
+(sentence-transformers' own pool, useful on CPU-only hosts), and logs a
+throughput report in chunks/s.
+
+With an EmbeddingCache, texts whose content hash was already embedded are
+served from Postgres and only new/changed texts reach the model.
+
+Usage:
+    with BatchEmbedder(batch_size=64, workers=4, cache=EmbeddingCache()) as embedder:
+        vectors = embedder.embed(texts)
+    embedder.log_report()
+"""
+import time
+from typing import Dict, List, Sequence
+
+from app.constants import EMBEDDING_BATCH_SIZE, EMBEDDING_DIMENSION
+from app.utils.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class BatchEmbedder:
+    """Encodes texts in batches; one instance per ingestion run (the pool is reused)."""
+
+    def __init__(self, model=None, batch_size: int = EMBEDDING_BATCH_SIZE, workers: int = 0, cache=None):
+        """
+        Args:
+            model: SentenceTransformer instance (default: the lazily-loaded rag_engine model)
+            batch_size: Texts per forward pass
+            workers: Number of encoding processes (0/1 = in-process)
+            cache: Optional EmbeddingCache (content-hash -> vector)
+        """
+        self._model = model
+        self.batch_size = max(1, batch_size)
+        self.workers = workers
+        self.cache = cache
+        self._pool = None
+
+        self.total_chunks = 0
+        self.total_seconds = 0.0
+        self.failed_chunks = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            from app.services.rag_engine import rag_engine
+            self._model = rag_engine.model
+        return self._model
+
+    def __enter__(self):
+        if self.workers > 1:
+            logger.info(f"Starting embedding pool with {self.workers} CPU processes")
+            self._pool = self.model.start_multi_process_pool(target_devices=["cpu"] * self.workers)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+        return False
+
+    def embed(self, texts: Sequence[str], label: str = "") -> List[List[float]]:
+        """
+        Returns one vector per text, in order. A batch that fails is retried text by
+        text; a text that still fails gets a zero vector (same fallback as before:
+        low similarity, but the ingestion does not crash).
+        """
+        texts = list(texts)
+        if not texts or self.cache is None:
+            return self._embed_uncached(texts, label)
+
+        hashes = [self.cache.hash(text) for text in texts]
+        vectors = self.cache.lookup(hashes)
+        missing: Dict[str, str] = {}  # hash -> text (identical texts embedded once)
+        for content_hash, text in zip(hashes, texts):
+            if content_hash not in vectors:
+                missing.setdefault(content_hash, text)
+
+        if missing:
+            fresh = dict(zip(missing, self._embed_uncached(list(missing.values()), label)))
+            # Zero vectors are failures: never persist them
+            self.cache.store({h: v for h, v in fresh.items() if any(v)})
+            vectors.update(fresh)
+
+        prefix = f"{label}: " if label else ""
+        logger.info(f"   {prefix}{len(texts)} chunks, {len(missing)} embedded, {len(texts) - len(missing)} from cache")
+        return [vectors[content_hash] for content_hash in hashes]
+
+    def _embed_uncached(self, texts: List[str], label: str) -> List[List[float]]:
+        if not texts:
+            return []
+
+        start = time.perf_counter()
+        vectors: List[List[float]] = []
+        for offset in range(0, len(texts), self.batch_size):
+            batch = texts[offset:offset + self.batch_size]
+            vectors.extend(self._encode_batch(batch))
+            self._report_progress(label, offset + len(batch), len(texts), time.perf_counter() - start)
+
+        self.total_chunks += len(texts)
+        self.total_seconds += time.perf_counter() - start
+        return vectors
+
+    def _encode_batch(self, batch: List[str]) -> List[List[float]]:
+        try:
+            return [vector.tolist() for vector in self._encode(batch)]
+        except Exception as e:
+            logger.warning(f"Batch of {len(batch)} failed ({e}), retrying one by one")
+
+        vectors = []
+        for text in batch:
+            try:
+                vectors.append(self._encode([text])[0].tolist())
+            except Exception as e:
+                logger.error(f"Embedding failed for '{text[:50]}...': {e}")
+                self.failed_chunks += 1
+                vectors.append([0.0] * EMBEDDING_DIMENSION)
+        return vectors
+
+    def _encode(self, batch: List[str]):
+        if self._pool is not None:
+            return self.model.encode_multi_process(batch, self._pool, batch_size=self.batch_size)
+        return self.model.encode(batch, batch_size=self.batch_size, show_progress_bar=False)
+
+    def _report_progress(self, label: str, done: int, total: int, elapsed: float) -> None:
+        rate = done / elapsed if elapsed else 0.0
+        prefix = f"{label}: " if label else ""
+        logger.info(f"   {prefix}embedded {done}/{total} chunks ({rate:.1f} chunks/s)")
+
+    @property
+    def throughput(self) -> float:
+        return self.total_chunks / self.total_seconds if self.total_seconds else 0.0
+
+    def log_report(self) -> None:
+        logger.info(
+            f"Embedding throughput: {self.total_chunks} chunks in {self.total_seconds:.1f}s "
+            f"({self.throughput:.1f} chunks/s, batch_size={self.batch_size}, "
+            f"workers={self.workers or 1}, failed={self.failed_chunks})"
+        )
+        if self.cache is not None:
+            stats = self.cache.stats()
+            logger.info(
+                f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_ratio']:.0%} of chunks skipped the model)"
+            )
+
+
+def add_embedding_arguments(parser) -> None:
+    """--batch-size / --workers / --no-cache flags shared by the ingestion scripts."""
+    parser.add_argument('--batch-size', type=int, default=EMBEDDING_BATCH_SIZE,
+                        help=f'Chunks per embedding forward pass (default: {EMBEDDING_BATCH_SIZE})')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='Embedding processes for CPU-only hosts (default: in-process)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Ignore the content-hash embedding cache and re-embed everything')
+
+
+def build_embedder(batch_size: int = EMBEDDING_BATCH_SIZE, workers: int = 0, use_cache: bool = True) -> BatchEmbedder:
+    """BatchEmbedder for an ingestion run (content-hash cache enabled by default)."""
+    from app.services.embedding_cache import EmbeddingCache
+
+    return BatchEmbedder(batch_size=batch_size, workers=workers, cache=EmbeddingCache() if use_cache else None)
@@ -1,11 +1,27 @@
 """
 Logging configuration for scripts and utilities.
 Provides consistent logging setup across all maintenance scripts.
+
+The API uses setup_structured_logging(): records are queued from the request
+thread and written (as JSON) by a background listener thread, so workers never
+block on stdout. Each record carries the request ID bound by bind_request().
 """
+import atexit
+import copy
+import json
 import logging
+import os
+import queue
+import random
 import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional
 
+from app.constants import LOG_DEBUG_SAMPLE_RATE, LOG_QUEUE_MAX_RECORDS
+
 def setup_logging(
     level: int = logging.INFO,
     log_file: Optional[str] = None,
@@ -50,3 +66,141 @@ def get_logger(name: str) -> logging.Logger:
         Logger instance
     """
     return logging.getLogger(name)
+
+
+# ----------------------------------------------------------------------
+# Structured logging (API)
+# ----------------------------------------------------------------------
+
+_request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+_debug_sampled: ContextVar[Optional[bool]] = ContextVar("debug_sampled", default=None)
+_debug_sample_rate = LOG_DEBUG_SAMPLE_RATE
+_listener: Optional[QueueListener] = None
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+
+
+def bind_request(request_id: Optional[str] = None) -> str:
+    """
+    Binds a request ID (incoming X-Request-ID or a new one) to the current
+    context and decides once whether this request's DEBUG lines are sampled.
+    """
+    request_id = request_id or uuid.uuid4().hex
+    _request_id.set(request_id)
+    _debug_sampled.set(random.random() < _debug_sample_rate)
+    return request_id
+
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Adds request_id to every record and samples DEBUG lines: a request keeps
+    all or none of them (decided in bind_request), so sampled traces are complete.
+    Outside a request, DEBUG lines are sampled one by one.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        if record.levelno > logging.DEBUG:
+            return True
+        sampled = _debug_sampled.get()
+        return sampled if sampled is not None else random.random() < _debug_sample_rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra={...}` fields are emitted as top-level keys."""
+
+    RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", None),
+            "msg": record.getMessage(),
+        }
+        payload.update((key, value) for key, value in vars(record).items() if key not in self.RESERVED)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class _BoundedQueueHandler(QueueHandler):
+    """QueueHandler that never blocks the caller: when the writer falls behind, records are dropped."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback here (args may change after the call);
+        # JSON encoding and the actual write happen in the listener thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_structured_logging(
+    level: Optional[str] = None,
+    json_format: Optional[bool] = None,
+    sample_rate: Optional[float] = None,
+    stream=None,
+) -> QueueListener:
+    """
+    Configures the root logger for the API (idempotent):
+
+        root -> _BoundedQueueHandler (request thread) -> QueueListener thread -> stdout
+
+    Defaults come from the environment: LOG_LEVEL (INFO), LOG_FORMAT (json | text),
+    LOG_DEBUG_SAMPLE_RATE. With LOG_LEVEL=DEBUG only sampled requests emit DEBUG lines.
+    """
+    global _listener, _debug_sample_rate
+    if _listener is None:
+        atexit.register(stop_structured_logging)
+    stop_structured_logging()
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    if json_format is None:
+        json_format = os.getenv("LOG_FORMAT", "json").lower() == "json"
+    if sample_rate is None:
+        sample_rate = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", LOG_DEBUG_SAMPLE_RATE))
+    _debug_sample_rate = sample_rate
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_MAX_RECORDS)
+    handler = _BoundedQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+    return _listener
+
+
+def stop_structured_logging() -> None:
+    """Flushes the queue and stops the writer thread (registered with atexit)."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
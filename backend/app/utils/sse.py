@@ -0,0 +1,21 @@
+"""
+Server-Sent Events helpers for streaming endpoints.
+"""
+import json
+from typing import Any
+
+# Headers for text/event-stream responses (no proxy buffering, no caching)
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """
+    Formats one SSE frame: `event: <name>` + `data: <json>` + blank line.
+    Multi-line payloads are impossible because the data is always compact JSON.
+    """
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
@@ -1,5 +1,8 @@
 
 import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from bs4 import BeautifulSoup
 import json
@@ -9,6 +12,30 @@ import re
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Candidate title elements before a table (see index_tables)
+TITLE_TAGS = ["p", "h1", "h2", "h3"]
+TITLE_LOOKBACK = 5
+TABLE_YEARS = (2021, 2022, 2023, 2024, 2025)
+
+# company_id -> XML in data/xml (iberia/groundforce have dedicated extractors)
+SALARY_SOURCES = {
+    "iberia": "iberia.xml",
+    "groundforce": "groundforce.xml",
+    "menzies": "menzies.xml",
+    "swissport": "swissport.xml",
+    "aviapartner": "aviapartner.xml",
+    "wfs": "wfs.xml",
+    "easyjet": "easyjet.xml",
+    "azul-handling": "azul.xml",
+    "convenio-sector": "general.xml",
+}
+
+# Companies that apply another company's tables (same rows, different company_id)
+# Jet2, Norwegian, South, etc. usan el convenio sectorial.
+SALARY_ALIASES = {
+    "convenio-sector": ["jet2", "norwegian", "south"],
+}
+
 def parse_spanish_number(text):
     """
     Parses a Spanish formatted number (e.g., '1.021,46') into a float (1021.46).
@@ -121,9 +148,11 @@ def extract_iberia_salaries(xml_path):
     # Search for patterns like "Cuantías máximas por categoría X" or specifically known groups
     # We can perform a quick scan or regex on the text content
     
+    # One pass over the paragraphs (reused by every section below)
+    paragraphs = [(p, p.get_text(strip=True)) for p in soup.find_all("p")]
+    
     known_groups = set()
-    for p in soup.find_all("p"):
-        text = p.get_text(strip=True)
+    for p, text in paragraphs:
         if "Cuantías máximas por categoría" in text:
             # Extract group name
             raw = text.replace("Cuantías máximas por categoría", "").strip()
@@ -137,6 +166,8 @@ def extract_iberia_salaries(xml_path):
         logger.warning("No specific groups found, defaulting to 'General'")
     else:
         logger.info(f"Found groups: {known_groups}")
+    # Stable record order across runs (set order depends on the hash seed)
+    known_groups = sorted(known_groups)
 
     # Parse rows
     results = []
@@ -231,8 +262,7 @@ def extract_iberia_salaries(xml_path):
 
     # 3. Extract Horas Perentorias
     perentorias_data = []
-    for p in soup.find_all("p"):
-        txt = p.get_text(strip=True)
+    for p, txt in paragraphs:
         # Look for "Horas perentorias" and "2023"
         if "Horas perentorias" in txt and "2023" in txt:
             # Heuristic Group Identification
@@ -281,8 +311,7 @@ def extract_iberia_salaries(xml_path):
 
     # 4. Extract "Cuantías Máximas" (Variables)
     pluses_data = []
-    for p in soup.find_all("p"):
-        txt = p.get_text(strip=True)
+    for p, txt in paragraphs:
         if "Cuantías máximas por categoría" in txt:
             raw = txt.replace("Cuantías máximas por categoría", "").strip()
             g_name = clean_group_name(raw)
@@ -520,7 +549,54 @@ def extract_groundforce_salaries(xml_path):
         
     return results
 
-def extract_boe_salaries(xml_path, company_id):
+def load_document(xml_path):
+    """
+    Parses a BOE XML once (lxml XML builder: same tree as html.parser for
+    these well-formed documents, several times faster).
+    """
+    with open(xml_path, "r", encoding="utf-8") as f:
+        content = f.read()
+    return BeautifulSoup(content, "xml")
+
+def _table_title(table, recent_titles):
+    """
+    Title of a table: its caption, else the nearest preceding p/h1-h3 that looks
+    meaningful (looking back up to TITLE_LOOKBACK elements), else the element
+    right before the last one checked.
+    """
+    caption = table.find("caption")
+    if caption:
+        return caption.get_text(strip=True)
+    
+    candidates = list(reversed(recent_titles))  # nearest first
+    for txt in candidates[:TITLE_LOOKBACK]:
+        # Basic heuristic: ignore empty or very short 'filler' texts
+        if len(txt) > 5 and "Euros" not in txt and "Tabla" not in txt:
+            return txt
+    if len(candidates) > TITLE_LOOKBACK:
+        return candidates[TITLE_LOOKBACK]  # Fallback to immediate previous
+    return ""
+
+def index_tables(soup):
+    """
+    [(table, title_text)] in document order, built in ONE linear pass.
+    The last TITLE_LOOKBACK + 1 title candidates are kept in a ring buffer
+    instead of walking find_previous() back from every table.
+    """
+    recent_titles = deque(maxlen=TITLE_LOOKBACK + 1)
+    indexed = []
+    for element in soup.find_all(TITLE_TAGS + ["table"]):
+        if element.name == "table":
+            indexed.append((element, _table_title(element, recent_titles)))
+        else:
+            recent_titles.append(element.get_text(strip=True))
+    return indexed
+
+def _title_year(title_text, default):
+    """First of TABLE_YEARS mentioned in the title (checked in ascending order)."""
+    return next((year for year in TABLE_YEARS if str(year) in title_text), default)
+
+def extract_boe_salaries(xml_path, company_id, soup=None):
     """
     Generic extractor for BOE-style XML files (Menzies, Swissport, etc.)
     that contain embedded HTML tables in the <texto> tag.
@@ -531,16 +607,13 @@ def extract_boe_salaries(xml_path, company_id):
     """
     logger.info(f"extract_boe_salaries: Parsing {xml_path} for {company_id}...")
     
-    with open(xml_path, "r", encoding="utf-8") as f:
-        content = f.read()
-    
-    # Use html.parser to be more lenient with mixed content and namespaces
-    soup = BeautifulSoup(content, "html.parser")
+    if soup is None:
+        soup = load_document(xml_path)
     
     # BOE XMLs usually have a <texto> tag containing the HTML body
     # But sometimes parsers fail to find it or it's named differently.
     # robust approach: Search ALL tables in the document.
-    tables = soup.find_all("table")
+    tables = index_tables(soup)
     logger.info(f"Found {len(tables)} tables (global search) in {company_id}")
     
     results = []
@@ -548,33 +621,9 @@ def extract_boe_salaries(xml_path, company_id):
     # Context state
     current_year = 2025 # Default to latest, or extract from text
     
-    for i, table in enumerate(tables):
-        # 1. Identify Context (Title/Preceding Text)
-        caption = table.find("caption")
-        if caption:
-            title_text = caption.get_text(strip=True)
-        else:
-            # Look backwards for a meaningful title
-            prev = table.find_previous(["p", "h1", "h2", "h3"])
-            title_text = ""
-            steps = 0
-            while prev and steps < 5:
-                # Basic heuristic: ignore empty or very short 'filler' texts
-                txt = prev.get_text(strip=True)
-                if len(txt) > 5 and "Euros" not in txt and "Tabla" not in txt:
-                    title_text = txt
-                    break
-                prev = prev.find_previous(["p", "h1", "h2", "h3"])
-                steps += 1
-            if not title_text and prev:
-                 title_text = prev.get_text(strip=True) # Fallback to immediate previous
-        
+    for i, (table, title_text) in enumerate(tables):
         # Determine Year from title if possible
-        if "2021" in title_text: current_year = 2021
-        elif "2022" in title_text: current_year = 2022
-        elif "2023" in title_text: current_year = 2023
-        elif "2024" in title_text: current_year = 2024
-        elif "2025" in title_text: current_year = 2025
+        current_year = _title_year(title_text, current_year)
         
         # Determine Table Logic
         headers = [th.get_text(strip=True) for th in table.find_all("th")]
@@ -938,54 +987,85 @@ def _parse_concept_columns_table(table, company_id, year, forced_group=None):
     
     return results
 
+def normalize_record(row):
+    """SalaryTable-shaped dict with consistent types."""
+    record = {
+        "company_id": row["company_id"],
+        "year": int(row["year"]),
+        "group": row["group"],
+        "level": row["level"],
+        "concept": row["concept"],
+        "amount": float(row["amount"]),
+    }
+    if row.get("variable_type"):
+        record["variable_type"] = row["variable_type"]
+    return record
+
+def extract_company(company_id, xml_path):
+    """Extracts one company's grid (runs in a worker process)."""
+    if company_id == "iberia":
+        rows = extract_iberia_salaries(xml_path)
+    elif company_id == "groundforce":
+        rows = extract_groundforce_salaries(xml_path)
+    else:
+        rows = extract_boe_salaries(xml_path, company_id)
+    return [normalize_record(row) for row in rows]
+
+def extract_all(base_path, companies=None, workers=None):
+    """
+    Extracts every company in SALARY_SOURCES (or `companies`) in a process pool,
+    one XML per process, and expands SALARY_ALIASES. Records come back in
+    SALARY_SOURCES order. A company that fails is logged and skipped.
+    """
+    base_path = Path(base_path)
+    sources = {
+        company_id: base_path / filename
+        for company_id, filename in SALARY_SOURCES.items()
+        if (companies is None or company_id in companies) and (base_path / filename).exists()
+    }
+    
+    results = {}
+    if workers == 1 or len(sources) <= 1:
+        for company_id, xml_path in sources.items():
+            try:
+                results[company_id] = extract_company(company_id, xml_path)
+            except Exception as e:
+                logger.error(f"Failed to extract {company_id}: {e}")
+    else:
+        with ProcessPoolExecutor(max_workers=workers or min(len(sources), os.cpu_count() or 1)) as pool:
+            futures = {company_id: pool.submit(extract_company, company_id, xml_path)
+                       for company_id, xml_path in sources.items()}
+            for company_id, future in futures.items():
+                try:
+                    results[company_id] = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to extract {company_id}: {e}")
+    
+    all_data = []
+    for company_id, rows in results.items():
+        logger.info(f"{company_id}: {len(rows)} records")
+        all_data.extend(rows)
+        for alias in SALARY_ALIASES.get(company_id, []):
+            logger.info(f"Mapping {company_id} data to: {alias}")
+            all_data.extend(dict(row, company_id=alias) for row in rows)
+    return all_data
+
 if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Extract salary grids from the BOE XMLs')
+    parser.add_argument('companies', nargs='*', help='company_ids (default: all in SALARY_SOURCES)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Parallel processes (default: one per document, 1 = sequential)')
+    parser.add_argument('--output', help='Write the normalized records to this JSON file')
+    args = parser.parse_args()
+
     base_path = Path(__file__).resolve().parent.parent / "data" / "xml"
-    
-    # 1. Iberia
-    iberia_file = base_path / "iberia.xml"
-    if iberia_file.exists():
-        print("--- EXTRACTING IBERIA ---")
-        try:
-            iberia_data = extract_iberia_salaries(iberia_file)
-            print(f"Iberia Records: {len(iberia_data)}")
-        except Exception as e:
-            logger.error(f"Error extracting Iberia: {e}")
-
-    # 2. Groundforce
-    groundforce_file = base_path / "groundforce.xml"
-    if groundforce_file.exists():
-        print("\n--- EXTRACTING GROUNDFORCE ---")
-        try:
-            gf_data = extract_groundforce_salaries(groundforce_file)
-            print(f"Groundforce Records: {len(gf_data)}")
-        except Exception as e:
-            logger.error(f"Error extracting Groundforce: {e}")
-            
-    # 3. Menzies (Generic BOE)
-    menzies_file = base_path / "menzies.xml"
-    if menzies_file.exists():
-        print("\n--- EXTRACTING MENZIES ---")
-        try:
-            menzies_data = extract_boe_salaries(menzies_file, "menzies")
-            print(f"Menzies Records: {len(menzies_data)}")
-            if len(menzies_data) > 0:
-                print("Sample Menzies record:")
-                print(json.dumps(menzies_data[0], indent=2, ensure_ascii=False))
-        except Exception as e:
-            logger.error(f"Error extracting Menzies: {e}")
-
-    # 4. Swissport (Generic BOE)
-    swiss_file = base_path / "swissport.xml"
-    if swiss_file.exists():
-        print("\n--- EXTRACTING SWISSPORT ---")
-        try:
-            swiss_data = extract_boe_salaries(swiss_file, "swissport")
-            print(f"Swissport Records: {len(swiss_data)}")
-            if len(swiss_data) > 0:
-                print("Sample Swissport record:")
-                print(json.dumps(swiss_data[0], indent=2, ensure_ascii=False))
-        except Exception as e:
-            logger.error(f"Error extracting Swissport: {e}")
-            # traceback.print_exc()
-
-    print(f"\nExtraction complete.")
+    start = time.perf_counter()
+    records = extract_all(base_path, companies=args.companies or None, workers=args.workers)
+    print(f"\nExtraction complete: {len(records)} records in {time.perf_counter() - start:.2f}s")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(records, f, indent=2, ensure_ascii=False)
@@ -2,7 +2,10 @@ import os
 import json
 import re
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from bs4 import BeautifulSoup
+from lxml import etree
 import warnings
 from bs4 import XMLParsedAsHTMLWarning
 
@@ -13,92 +16,142 @@ warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from boe_config import BOE_DOCUMENTS
 
-def parse_boe_xml(doc_config):
-    slug = doc_config['slug']
-    boe_id = doc_config['boe_id']
-    title = doc_config['title']
-    
+# Tags that drive the section split (same set the BeautifulSoup path walks)
+SECTION_TAGS = ('h5', 'p', 'table')
+
+
+def get_data_base_dir():
     # Docker path
     if os.path.exists("/app/data"):
-        base_dir = "/app/data"
-    else:
-        # Local fallback
-        base_dir = os.path.join(os.getcwd(), "backend", "data")
-    
-    xml_path = os.path.join(base_dir, "xml", f"{slug}.xml")
-    
-    # Ensure parsed directory exists
-    parsed_dir = os.path.join(base_dir, "xml_parsed")
-    os.makedirs(parsed_dir, exist_ok=True)
-    output_path = os.path.join(parsed_dir, f"{slug}.json")
-    
-    if not os.path.exists(xml_path):
-        print(f"⚠️ XML not found for {slug}: {xml_path}")
-        return
+        return "/app/data"
+    # Local fallback
+    return os.path.join(os.getcwd(), "backend", "data")
 
-    print(f"📖 Parsing {slug} ({boe_id})...")
-    
-    with open(xml_path, 'r', encoding='utf-8') as f:
-        content = f.read()
 
+# ----------------------------------------------------------------------
+# Element streams: (tag, text, classes, rows) in document order.
+# rows is only set for tables: list of rows, each a list of cell texts.
+# ----------------------------------------------------------------------
+
+def iter_elements_bs4(content):
+    """Original path: whole document in memory as a BeautifulSoup tree."""
     # Use html.parser which is robust for BOE's HTML-like XML
     soup = BeautifulSoup(content, 'html.parser')
-    
-    articles = []
-    
+
     # Iterate over all tags in order to preserve flow
     # We look for H5 (headers), P (paragraphs/tables preamble), TABLE (tables)
-    all_tags = soup.find_all(['h5', 'p', 'table'])
-    
+    for element in soup.find_all(list(SECTION_TAGS)):
+        rows = None
+        if element.name == 'table':
+            rows = [
+                [c.get_text(strip=True) for c in row.find_all(['td', 'th'])]
+                for row in element.find_all('tr')
+            ]
+        yield element.name, element.get_text(strip=True), element.get('class', []), rows
+
+
+def _lxml_text(element):
+    # Same as BeautifulSoup's get_text(strip=True): stripped strings, empty ones dropped
+    return "".join(s.strip() for s in element.itertext() if s.strip())
+
+
+def iter_elements_lxml(xml_path):
+    """
+    Streaming path: lxml iterparse, constant memory per section.
+
+    find_all() yields elements in pre-order (a <table> before the <p> inside its
+    cells) but an element's text is only complete at its "end" event, so
+    elements are queued at "start", filled at "end" and emitted in queue order.
+    Once no section element is open, the parsed subtree is released.
+    """
+    pending = []   # [tag, element, item-or-None] in start (pre-)order
+    open_count = 0
+
+    for event, element in etree.iterparse(xml_path, events=('start', 'end')):
+        if not isinstance(element.tag, str) or element.tag not in SECTION_TAGS:
+            if event == 'end' and open_count == 0:
+                element.clear(keep_tail=True)
+            continue
+
+        if event == 'start':
+            pending.append([element, None])
+            open_count += 1
+            continue
+
+        rows = None
+        if element.tag == 'table':
+            rows = [
+                [_lxml_text(c) for c in row.iter('td', 'th')]
+                for row in element.iter('tr')
+            ]
+        for entry in pending:
+            if entry[0] is element:
+                entry[1] = (element.tag, _lxml_text(element), element.get('class', '').split(), rows)
+                break
+        open_count -= 1
+
+        while pending and pending[0][1] is not None:
+            yield pending.pop(0)[1]
+
+        if open_count == 0:
+            element.clear(keep_tail=True)
+            # Drop already-processed siblings so the tree does not grow with the document
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+
+# ----------------------------------------------------------------------
+# Section split (shared by both element streams)
+# ----------------------------------------------------------------------
+
+def build_articles(elements):
+    """Generator of article sections ({"article", "content"}) from an element stream."""
     current_article = {
         "article": "Preámbulo/Inicio",
         "content": ""
     }
-    
-    for element in all_tags:
-        # Get clean text
-        text = element.get_text(strip=True)
-        
+
+    for tag, text, classes, rows in elements:
         # 1. Explicit Headers (h5)
         # BOE uses <h5 class="articulo">Artículo X. Title</h5>
         # But sometimes just <h5> without class or different class
-        if element.name == 'h5':
+        if tag == 'h5':
             # Identify if it's a new section
             # Heuristic: <h5 class="articulo"> OR text starts with "Artículo", "ANEXO", "CAPÍTULO", "DISPOSICIÓN"
             is_new_section = False
-            if 'articulo' in element.get('class', []):
+            if 'articulo' in classes:
                 is_new_section = True
             elif any(x in text.upper() for x in ["ARTÍCULO", "ANEXO", "DISPOSICIÓN", "CAPÍTULO", "PREÁMBULO", "TÍTULO"]):
                 is_new_section = True
-            
+
             if is_new_section:
                 if current_article["content"].strip():
-                    articles.append(current_article)
-                
+                    yield current_article
+
                 current_article = {
                     "article": text,
                     "content": text + "\n"
                 }
                 continue
-        
+
         # 2. Paragraphs (p) - Check if they are actually Headers disguised as P
-        if element.name == 'p':
+        if tag == 'p':
             # Some XMLs put "ANEXO I" in a <p class="centro_negrita"> or <p class="anexo_num">
             is_header_p = False
-            p_class = element.get('class', [])
-            
+            p_class = classes
+
             # Helper to check if text looks like a header
             upper_text = text.upper().strip()
-            
+
             # Specific classes used for headers in BOE
             # USER CHECKLIST: Add 'centro_redonda'
             if any(c in p_class for c in ['anexo', 'anexo_num', 'capitulo_num', 'titulo_num', 'articulo', 'centro_redonda']):
                  # Extra check for centro_redonda: only if it contains specific keywords to avoid false positives
                  if 'centro_redonda' in p_class and not any(k in upper_text for k in ['ANEXO', 'TABLA', 'INDICE']):
-                     pass 
+                     pass
                  else:
                      is_header_p = True
-            
+
             # Check length to avoid long paragraphs being treated as headers
             elif len(text) < 150:
                 # Must start with known keywords
@@ -107,15 +160,15 @@ def parse_boe_xml(doc_config):
                    upper_text.startswith("DISPOSICIÓN") or upper_text.startswith("CAPÍTULO") or \
                    upper_text.startswith("TÍTULO") or upper_text.startswith("PARTE"):
                     is_header_p = True
-                
+
                 # Special case: "Tabla Salarial" or "Tabla de Equivalencias" often appears as a semi-header
                 if ("TABLA SALARIAL" in upper_text or "TABLA DE EQUIVALENCIAS" in upper_text) and len(text) < 100:
                      is_header_p = True
-            
+
             if is_header_p:
                 if current_article["content"].strip():
-                    articles.append(current_article)
-                
+                    yield current_article
+
                 current_article = {
                     "article": text,
                     "content": text + "\n"
@@ -125,25 +178,53 @@ def parse_boe_xml(doc_config):
                 current_article["content"] += text + "\n"
 
         # 3. Tables
-        if element.name == 'table':
-            rows = element.find_all('tr')
+        if tag == 'table':
             if len(rows) > 0:
                 print(f"   [DEBUG] Found table with {len(rows)} rows in '{current_article['article'][:30]}...'")
-            
+
             md_table = ""
-            for row in rows:
-                cols = row.find_all(['td', 'th'])
+            for cols in rows:
                 # Simple markdown table: | col1 | col2 |
-                row_text = "| " + " | ".join([c.get_text(strip=True) for c in cols]) + " |"
+                row_text = "| " + " | ".join(cols) + " |"
                 md_table += row_text + "\n"
-            
+
             # Add to content
             current_article["content"] += "\n" + md_table + "\n"
 
     # Append last article
     if current_article["content"].strip():
-        articles.append(current_article)
-    
+        yield current_article
+
+
+def parse_articles(xml_path, parser='lxml'):
+    if parser == 'bs4':
+        with open(xml_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        return list(build_articles(iter_elements_bs4(content)))
+    return list(build_articles(iter_elements_lxml(xml_path)))
+
+
+def parse_boe_xml(doc_config, parser='lxml'):
+    slug = doc_config['slug']
+    boe_id = doc_config['boe_id']
+    title = doc_config['title']
+
+    base_dir = get_data_base_dir()
+    xml_path = os.path.join(base_dir, "xml", f"{slug}.xml")
+
+    # Ensure parsed directory exists
+    parsed_dir = os.path.join(base_dir, "xml_parsed")
+    os.makedirs(parsed_dir, exist_ok=True)
+    output_path = os.path.join(parsed_dir, f"{slug}.json")
+
+    if not os.path.exists(xml_path):
+        print(f"⚠️ XML not found for {slug}: {xml_path}")
+        return
+
+    print(f"📖 Parsing {slug} ({boe_id})...")
+
+    articles = parse_articles(xml_path, parser)
+
     # Save JSON
     final_data = {
         "title": title,
@@ -151,18 +232,76 @@ def parse_boe_xml(doc_config):
         "url": f"https://www.boe.es/buscar/doc.php?id={boe_id}",
         "articles": articles
     }
-    
+
     with open(output_path, "w", encoding='utf-8') as f:
         json.dump(final_data, f, indent=2, ensure_ascii=False)
-        
+
     print(f"✅ Parsed {len(articles)} sections for {slug}")
 
-def batch_process():
-    for doc in BOE_DOCUMENTS:
-        try:
-            parse_boe_xml(doc)
-        except Exception as e:
-            print(f"❌ Error parsing {doc['slug']}: {e}")
+def batch_process(workers=None, parser='lxml'):
+    """Parse all BOE_DOCUMENTS; workers > 1 parses them in parallel processes."""
+    if workers is not None and workers <= 1:
+        for doc in BOE_DOCUMENTS:
+            try:
+                parse_boe_xml(doc, parser)
+            except Exception as e:
+                print(f"❌ Error parsing {doc['slug']}: {e}")
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(parse_boe_xml, doc, parser): doc for doc in BOE_DOCUMENTS}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"❌ Error parsing {futures[future]['slug']}: {e}")
+
+def benchmark(repeat=3):
+    """Times the BeautifulSoup and lxml paths on data/xml/*.xml and checks identical output."""
+    import contextlib
+    import glob
+    import io
+
+    xml_dir = os.path.join(get_data_base_dir(), "xml")
+    paths = sorted(glob.glob(os.path.join(xml_dir, "*.xml")))
+    if not paths:
+        print(f"⚠️ No XML files in {xml_dir}")
+        return
+
+    def timed(parser, path):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                articles = parse_articles(path, parser)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, json.dumps(articles, indent=2, ensure_ascii=False)
+
+    print(f"{'file':<18}{'bs4 (s)':>10}{'lxml (s)':>10}{'speedup':>9}  identical")
+    total_bs4 = total_lxml = 0.0
+    for path in paths:
+        bs4_time, bs4_out = timed('bs4', path)
+        lxml_time, lxml_out = timed('lxml', path)
+        total_bs4 += bs4_time
+        total_lxml += lxml_time
+        print(f"{os.path.basename(path):<18}{bs4_time:>10.3f}{lxml_time:>10.3f}"
+              f"{bs4_time / lxml_time:>8.1f}x  {'✅' if bs4_out == lxml_out else '❌'}")
+    print(f"{'total':<18}{total_bs4:>10.3f}{total_lxml:>10.3f}{total_bs4 / total_lxml:>8.1f}x")
 
 if __name__ == "__main__":
-    batch_process()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Parse BOE XMLs into xml_parsed/*.json')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Parallel processes (default: one per CPU, 1 = sequential)')
+    parser.add_argument('--parser', choices=['lxml', 'bs4'], default='lxml',
+                        help='lxml streaming parser (default) or the BeautifulSoup tree parser')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Compare both parsers on data/xml/*.xml (no JSON written)')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+    else:
+        batch_process(workers=args.workers, parser=args.parser)
@@ -0,0 +1,73 @@
+"""
+Migration: Add ANN vector index (HNSW, cosine) to document_chunks.embedding
+Date: 2026-10-18
+Reason: Performance optimization - RagEngine.search orders by cosine distance;
+        without an index every search is a sequential scan + sort over all chunks.
+        Falls back to IVFFlat when pgvector < 0.5.0 (no HNSW support).
+"""
+
+import sys
+import os
+
+# Add backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.database import engine
+from app.db.vector_index import existing_index, create_index_sql, pgvector_version
+from app.constants import VECTOR_INDEX_NAME
+from sqlalchemy import text
+
+def upgrade():
+    """Add vector index to embedding column"""
+    print("🔧 Adding vector index to document_chunks.embedding...")
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        version = pgvector_version(conn)
+        if version is None:
+            print("   ❌ pgvector extension not installed (CREATE EXTENSION vector)")
+            return
+        print(f"   pgvector {'.'.join(map(str, version))}")
+
+        # Check if index already exists
+        current = existing_index(conn)
+        if current and current[1]:
+            print(f"   ℹ️ Index already exists, skipping... ({current[0]})")
+            return
+        if current:
+            print("   ⚠️ Found INVALID index (failed previous build), dropping it...")
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {VECTOR_INDEX_NAME}"))
+
+        # Create index (does not block reads/writes on document_chunks)
+        create_index_query = create_index_sql(conn, concurrently=True)
+        print(f"   {create_index_query}")
+        conn.execute(text(create_index_query))
+        conn.execute(text("ANALYZE document_chunks"))
+
+        print("   ✅ Index created successfully!")
+
+def downgrade():
+    """Remove vector index from embedding column"""
+    print("🔧 Removing vector index from document_chunks.embedding...")
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {VECTOR_INDEX_NAME}"))
+
+        print("   ✅ Index removed successfully!")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Database migration for document_chunks.embedding vector index')
+    parser.add_argument('action', choices=['upgrade', 'downgrade', 'rebuild'],
+                       help='Migration action to perform (rebuild = downgrade + upgrade, e.g. after IVFFlat bulk loads)')
+
+    args = parser.parse_args()
+
+    if args.action == 'upgrade':
+        upgrade()
+    elif args.action == 'downgrade':
+        downgrade()
+    else:
+        downgrade()
+        upgrade()
@@ -0,0 +1,84 @@
+"""
+Migration: Add idx_metadata_gin + idx_chunks_company_type_year on document_chunks
+Date: 2026-10-18
+Reason: Performance optimization - LegalAnchors filters on intent (containment on
+        chunk_metadata -> GIN jsonb_path_ops) and on the typed columns company,
+        chunk_type and year (composite B-tree). The single-column typed indexes come
+        with migrate_promote_chunk_metadata_columns.py.
+        Index definitions live in DocumentChunk.__table_args__ (app/db/models.py).
+"""
+
+import sys
+import os
+
+# Add backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.database import engine
+from app.db.models import DocumentChunk
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+
+METADATA_INDEXES = [ix for ix in DocumentChunk.__table__.indexes if ix.name.startswith('idx_')]
+
+def create_index_sql(index, dialect) -> str:
+    """CREATE INDEX CONCURRENTLY for an Index declared in DocumentChunk.__table_args__"""
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=dialect))
+    return ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+
+def upgrade():
+    """Add chunk_metadata indexes"""
+    print("🔧 Adding chunk_metadata indexes...")
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for index in METADATA_INDEXES:
+            # Check if index already exists (and finished building)
+            row = conn.execute(
+                text("""
+                    SELECT i.indisvalid FROM pg_index i
+                    JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname = :name
+                """),
+                {"name": index.name}
+            ).fetchone()
+
+            if row and row[0]:
+                print(f"   ℹ️ {index.name} already exists, skipping...")
+                continue
+            if row:
+                print(f"   ⚠️ {index.name} is INVALID (failed previous build), dropping it...")
+                conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}"))
+
+            # Does not block writes on document_chunks
+            conn.execute(text(create_index_sql(index, conn.dialect)))
+            print(f"   ✅ {index.name} created")
+
+        conn.execute(text("ANALYZE document_chunks"))
+
+    print("   ✅ Indexes created successfully!")
+
+def downgrade():
+    """Remove chunk_metadata indexes"""
+    print("🔧 Removing chunk_metadata indexes...")
+
+    with engine.connect() as conn:
+        for index in METADATA_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        conn.commit()
+
+        print("   ✅ Indexes removed successfully!")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Database migration for chunk_metadata indexes')
+    parser.add_argument('action', choices=['upgrade', 'downgrade'],
+                       help='Migration action to perform')
+
+    args = parser.parse_args()
+
+    if args.action == 'upgrade':
+        upgrade()
+    else:
+        downgrade()
@@ -0,0 +1,88 @@
+"""
+Migration: Promote hot chunk_metadata keys to typed columns on document_chunks
+Date: 2026-10-18
+Reason: Performance optimization - LegalAnchors cast JSONB text to Integer/Boolean
+        per row (year, chunk_size, is_primary). Typed B-tree columns give the
+        planner real statistics. Columns: company, chunk_type, year, is_primary,
+        chunk_size, version_hash (backfilled from chunk_metadata).
+"""
+
+import sys
+import os
+
+# Add backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.database import engine
+from app.db.models import DocumentChunk
+from app.db.schema_patch import CHUNK_METADATA_COLUMNS, backfill_chunk_metadata_columns
+from sqlalchemy import text, inspect
+
+# JSONB expression indexes from migrate_add_metadata_indexes.py, superseded by the typed columns
+OBSOLETE_INDEXES = [
+    'idx_metadata_type',
+    'idx_metadata_company',
+    'idx_metadata_year',
+    'idx_version_hash',
+    'idx_metadata_is_primary',
+    'idx_metadata_chunk_size',
+    'idx_company_type_year',
+]
+
+def upgrade():
+    """Add typed columns, backfill them and swap the indexes"""
+    print("🔧 Promoting chunk_metadata keys to typed columns...")
+
+    with engine.connect() as conn:
+        # Check which columns already exist
+        columns = [c["name"] for c in inspect(conn).get_columns("document_chunks")]
+        for name, sql_type in CHUNK_METADATA_COLUMNS.items():
+            if name in columns:
+                print(f"   ℹ️ Column {name} already exists, skipping...")
+                continue
+            conn.execute(text(f"ALTER TABLE document_chunks ADD COLUMN {name} {sql_type}"))
+            print(f"   ✅ Column {name} added")
+
+        # Backfill (idempotent: always recomputed from chunk_metadata)
+        rows = backfill_chunk_metadata_columns(conn)
+        print(f"   ✅ Backfilled {rows} chunks")
+
+        for name in OBSOLETE_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        print("   ✅ Obsolete JSONB expression indexes dropped")
+
+        for index in DocumentChunk.__table__.indexes:
+            index.create(bind=conn, checkfirst=True)
+        conn.commit()
+        print("   ✅ Column indexes created")
+
+        conn.execute(text("ANALYZE document_chunks"))
+        conn.commit()
+
+    print("   ✅ Migration completed successfully!")
+
+def downgrade():
+    """Remove typed columns (chunk_metadata keeps all the data)"""
+    print("🔧 Removing typed chunk_metadata columns...")
+
+    with engine.connect() as conn:
+        for name in CHUNK_METADATA_COLUMNS:
+            # Dropping a column also drops its indexes
+            conn.execute(text(f"ALTER TABLE document_chunks DROP COLUMN IF EXISTS {name}"))
+        conn.commit()
+
+        print("   ✅ Columns removed successfully!")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Database migration for typed chunk_metadata columns')
+    parser.add_argument('action', choices=['upgrade', 'downgrade'],
+                       help='Migration action to perform')
+
+    args = parser.parse_args()
+
+    if args.action == 'upgrade':
+        upgrade()
+    else:
+        downgrade()
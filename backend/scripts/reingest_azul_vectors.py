@@ -12,6 +12,8 @@ load_dotenv()
 
 from app.db.models import LegalDocument, DocumentChunk
 from app.services.rag_engine import RagEngine
+from app.services.embedding_cache import EmbeddingCache
+from app.utils.embedding_batches import BatchEmbedder
 
 # Constants
 COMPANY_SLUG = "azul-handling"
@@ -68,16 +70,17 @@ def reingest():
         
         print("🧠 Generando Embeddings e Insertando Chunks...")
         chunks_to_add = []
+        valid = [art for art in articles if art.get("content", "").strip()]
         
-        for art in articles:
+        # Solo se embeben los artículos cuyo contenido cambió (caché por hash de contenido)
+        embedder = BatchEmbedder(model=rag.model, cache=EmbeddingCache(session_factory=SessionLocal))
+        embeddings = embedder.embed([art.get("content", "") for art in valid], label=COMPANY_SLUG)
+        embedder.log_report()
+        
+        for art, embedding in zip(valid, embeddings):
             content = art.get("content", "")
             ref = art.get("article", "Referencia")
             
-            if not content.strip():
-                continue
-                
-            embedding = rag.generate_embedding(content)
-            
             chunk = DocumentChunk(
                 document_id=doc.id,
                 article_ref=ref,
@@ -3,12 +3,13 @@ import sys
 import json
 import logging
 from sqlalchemy.orm import Session
-# Add project root directory to path (parent of backend)
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+# Add backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from backend.database import SessionLocal, engine
-from backend.models import SalaryTable, Company
-from backend.scripts.extract_salary_tables import extract_boe_salaries
+from app.db.database import SessionLocal
+from app.db.models import SalaryTable
+from app.db.bulk_loader import copy_rows
+from scripts.extract_salary_tables import extract_boe_salaries
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,15 +26,15 @@ def seed_from_template(template_path, companies_to_seed):
     try:
         # 1. Clear existing data for these companies
         logger.info(f"Clearing old data for companies: {companies_to_seed}")
+        # (same transaction as the insert: the companies are never left without rows)
         session.query(SalaryTable).filter(SalaryTable.company_id.in_(companies_to_seed)).delete(synchronize_session=False)
-        session.commit()
         
         # 2. Extract Dynamic Data from XML if available
         # Ideally, we map the template 'company_id' (e.g. convenio-sector) to an XML file.
         # For now, hardcoded for Sector logic.
         extracted_data = []
         if template['meta']['company_id'] == 'convenio-sector':
-            xml_path = os.path.join(os.path.dirname(__file__), '../backend/data/xml/general.xml')
+            xml_path = os.path.join(os.path.dirname(__file__), '../data/xml/general.xml')
             if os.path.exists(xml_path):
                 logger.info("Extracting dynamic values from general.xml...")
                 extracted_data = extract_boe_salaries(xml_path, 'convenio-sector')
@@ -159,7 +160,7 @@ def seed_from_template(template_path, companies_to_seed):
 
         # Batch Insert
         logger.info(f"Inserting {len(records_to_insert)} records...")
-        session.bulk_save_objects(records_to_insert)
+        copy_rows(session.connection(), SalaryTable.__table__, records_to_insert)
         session.commit()
         logger.info("Done.")
         
@@ -170,7 +171,7 @@ def seed_from_template(template_path, companies_to_seed):
         session.close()
 
 if __name__ == "__main__":
-    template_file = os.path.join(os.path.dirname(__file__), '../backend/data/structure_templates/convenio_sector.json')
+    template_file = os.path.join(os.path.dirname(__file__), '../data/structure_templates/convenio_sector.json')
     companies = ["convenio-sector", "jet2", "norwegian", "south"] 
     seed_from_template(template_file, companies)
 
@@ -7,7 +7,8 @@ Improvements:
 - Proper logging instead of print statements
 - Type hints added
 - Context manager for DB session
-- Bulk inserts for better performance
+- Bulk inserts via binary COPY (app/db/bulk_loader)
+- Batched embeddings (--batch-size, optional --workers process pool)
 - Data validation
 """
 import json
@@ -22,23 +23,25 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.db.database import SessionLocal
 from app.db.models import LegalDocument, DocumentChunk
-from app.services.rag_engine import rag_engine
+from app.db.bulk_loader import copy_rows
+from app.utils.embedding_batches import BatchEmbedder, add_embedding_arguments, build_embedder
 from app.utils.company_detector import detect_company_from_filename, detect_category_from_filename
 from app.utils.paths import get_data_dir
 from app.utils.logging_config import setup_logging, get_logger
-from app.constants import EMBEDDING_DIMENSION
+from app.constants import EMBEDDING_BATCH_SIZE
 
 # Setup logging
 setup_logging()
 logger = get_logger(__name__)
 
-def seed_single_document(json_file: Path, db: Session) -> Optional[int]:
+def seed_single_document(json_file: Path, db: Session, embedder: BatchEmbedder) -> Optional[int]:
     """
     Seed a single JSON document into the database.
     
     Args:
         json_file: Path to JSON file
         db: Database session
+        embedder: Batched embedding generator (shared across documents)
         
     Returns:
         Number of articles seeded, or None if skipped/failed
@@ -70,9 +73,9 @@ def seed_single_document(json_file: Path, db: Session) -> Optional[int]:
         db.add(doc)
         db.flush()  # Get doc.id without committing
         
-        # Prepare chunks for bulk insert
+        # Prepare chunks for bulk insert (embeddings are generated in batches afterwards)
         articles = data.get("articles", [])
-        chunks: List[DocumentChunk] = []
+        pending = []
         
         for article in articles:
             content = article.get("content", "").strip()
@@ -83,14 +86,6 @@ def seed_single_document(json_file: Path, db: Session) -> Optional[int]:
                 logger.warning(f"Skipping article {article_ref}: empty content")
                 continue
             
-            # Generate embedding with error handling
-            try:
-                embedding = rag_engine.generate_embedding(content)
-            except Exception as e:
-                logger.error(f"Failed to generate embedding for {article_ref}: {e}")
-                # Use zero vector as fallback
-                embedding = [0.0] * EMBEDDING_DIMENSION
-            
             # --- METADATA TAGGING (FIX RED TEAM) ---
             chunk_type = "text"
             is_primary = False
@@ -112,13 +107,18 @@ def seed_single_document(json_file: Path, db: Session) -> Optional[int]:
             
             chunk_metadata = {
                 "type": chunk_type,
-                "is_primary": str(is_primary).lower(), # "true" / "false"
+                "is_primary": is_primary,
                 "company": company,
                 "ref": article_ref
             }
             # ----------------------------------------
-
-            chunk = DocumentChunk(
+            pending.append((content, article_ref, chunk_metadata))
+        
+        # Generate embeddings in batches (one forward pass per batch, not per article)
+        embeddings = embedder.embed([content for content, _, _ in pending], label=json_file.name)
+        
+        chunks: List[DocumentChunk] = [
+            DocumentChunk(
                 document_id=doc.id,
                 content=content,
                 embedding=embedding,
@@ -128,11 +128,12 @@ def seed_single_document(json_file: Path, db: Session) -> Optional[int]:
                 # Also populate the legacy 'doc_id' if needed or just leave null
                 doc_id=f"{doc.id}_{article_ref}" 
             )
-            chunks.append(chunk)
+            for (content, article_ref, chunk_metadata), embedding in zip(pending, embeddings)
+        ]
         
-        # Bulk insert chunks
+        # Bulk insert chunks (binary COPY in the same transaction as the document)
         if chunks:
-            db.bulk_save_objects(chunks)
+            copy_rows(db.connection(), DocumentChunk.__table__, chunks)
             db.commit()
             logger.info(f"✅ Seeded {len(chunks)} articles for {doc.title}")
             return len(chunks)
@@ -149,7 +150,7 @@ def seed_single_document(json_file: Path, db: Session) -> Optional[int]:
         db.rollback()
         return None
 
-def seed_documents() -> None:
+def seed_documents(batch_size: int = EMBEDDING_BATCH_SIZE, workers: int = 0, use_cache: bool = True) -> None:
     """
     Seed all JSON documents from data directory.
     """
@@ -167,9 +168,9 @@ def seed_documents() -> None:
     skipped = 0
     failed = 0
     
-    with SessionLocal() as db:
+    with SessionLocal() as db, build_embedder(batch_size, workers, use_cache) as embedder:
         for json_file in json_files:
-            result = seed_single_document(json_file, db)
+            result = seed_single_document(json_file, db, embedder)
             
             if result is not None:
                 if result > 0:
@@ -187,6 +188,13 @@ def seed_documents() -> None:
     logger.info(f"  Skipped: {skipped} documents (already exist)")
     logger.info(f"  Failed: {failed} documents")
     logger.info(f"  Total articles: {total_articles}")
+    embedder.log_report()
 
 if __name__ == "__main__":
-    seed_documents()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Seed legal documents with vector embeddings')
+    add_embedding_arguments(parser)
+    args = parser.parse_args()
+    
+    seed_documents(batch_size=args.batch_size, workers=args.workers, use_cache=not args.no_cache)
@@ -9,20 +9,70 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.db.database import SessionLocal
 from app.db.models import LegalDocument, DocumentChunk
-from app.services.rag_engine import rag_engine
-from app.constants import EMBEDDING_DIMENSION, SALARY_KEYWORDS
+from app.constants import EMBEDDING_BATCH_SIZE, SALARY_KEYWORDS
+from app.utils.embedding_batches import BatchEmbedder, add_embedding_arguments, build_embedder
 from app.utils.paths import get_xml_parsed_dir
+from app.services.chunk_sync import sync_document
 from app.utils.logging_config import setup_logging, get_logger
 from sqlalchemy import select
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 from sqlalchemy.orm import Session
 
 # Setup logging
 setup_logging()
 logger = get_logger(__name__)
 
-def seed_from_json(json_file: Path, db: Session) -> Optional[int]:
+def article_contents(articles: list) -> List[Tuple[str, str]]:
+    """(article_ref, content) per article, with the annex keyword enrichment applied."""
+    contents = []
+    for article in articles:
+        content = article.get("content", "")
+        article_ref = article.get("article", "")
+        
+        # Enrich content for Annexes (Phase 1 semantic enrichment)
+        if "ANEXO" in article_ref.upper() or "TABLA" in article_ref.upper():
+            content += f"\n\n(Palabras clave: {SALARY_KEYWORDS})"
+        contents.append((article_ref, content))
+    return contents
+
+def company_for_slug(company_slug: str) -> Optional[str]:
+    # Map slug to company name for DB
+    # "general" and "estatuto" are global (company=None or 'general')
+    # Others use their slug as company identifier
+    if company_slug in ["general", "estatuto"]:
+        return None  # Global documents
+    return company_slug
+
+def sync_from_json(json_file: Path, db: Session, embedder: BatchEmbedder) -> Optional[int]:
+    """Incremental seed: diff the JSON against the existing chunks (one transaction per document)."""
+    with open(json_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    
+    title = data.get("title", "Unknown")
+    company_slug = data.get("company_slug", "general")
+    print(f"\n📄 Syncing: {title} ({company_slug})")
+    
+    try:
+        diff = sync_document(
+            db,
+            title,
+            article_contents(data.get("articles", [])),
+            embedder,
+            company=company_for_slug(company_slug),
+            category="Convenio" if company_slug != "estatuto" else "Legislación",
+            url_source=data.get("url", ""),
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error syncing {json_file.name}: {e}")
+        return None
+    
+    print(f"   ✅ {diff.summary()} (new ~changed -removed =unchanged)")
+    return len(diff.inserted) + len(diff.updated)
+
+def seed_from_json(json_file: Path, db: Session, embedder: BatchEmbedder) -> Optional[int]:
     """Seed a single JSON file into the database."""
     with open(json_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
@@ -33,13 +83,7 @@ def seed_from_json(json_file: Path, db: Session) -> Optional[int]:
     
     print(f"\n📄 Processing: {title} ({company_slug})")
     
-    # Map slug to company name for DB
-    # "general" and "estatuto" are global (company=None or 'general')
-    # Others use their slug as company identifier
-    if company_slug in ["general", "estatuto"]:
-        company_name = None  # Global documents
-    else:
-        company_name = company_slug
+    company_name = company_for_slug(company_slug)
     
     # 1. Check if document already exists
     stmt = select(LegalDocument).where(
@@ -68,23 +112,15 @@ def seed_from_json(json_file: Path, db: Session) -> Optional[int]:
     articles = data.get("articles", [])
     print(f"   Propagating {len(articles)} articles...")
     
+    pairs = article_contents(articles)
+    refs = [article_ref for article_ref, _ in pairs]
+    contents = [content for _, content in pairs]
+    
+    # Generate embeddings in batches (failed texts fall back to a zero vector inside the embedder)
+    embeddings = embedder.embed(contents, label=company_slug)
+    
     count = 0
-    for article in articles:
-        content = article.get("content", "")
-        article_ref = article.get("article", "")
-        
-        # Enrich content for Annexes (Phase 1 semantic enrichment)
-        if "ANEXO" in article_ref.upper() or "TABLA" in article_ref.upper():
-            content += f"\n\n(Palabras clave: {SALARY_KEYWORDS})"
-        
-        # Generate embedding with error handling
-        try:
-            embedding = rag_engine.generate_embedding(content)
-        except Exception as e:
-            print(f"      ⚠️ Embedding failed for '{article_ref[:50]}...': {e}")
-            # Fallback: zero vector (will have low similarity but won't crash)
-            embedding = [0.0] * EMBEDDING_DIMENSION
-        
+    for content, article_ref, embedding in zip(contents, refs, embeddings):
         chunk = DocumentChunk(
             document_id=doc.id,
             content=content,
@@ -93,14 +129,14 @@ def seed_from_json(json_file: Path, db: Session) -> Optional[int]:
         )
         db.add(chunk)
         count += 1
-        if count % 50 == 0:
-            print(f"      Processed {count}...")
     
     db.commit()
     print(f"   ✅ Seeded {count} chunks for {company_slug}")
+    return count
 
-def batch_process():
-    """Batch process all JSON files in xml_parsed directory."""
+def batch_process(batch_size: int = EMBEDDING_BATCH_SIZE, workers: int = 0, use_cache: bool = True,
+                  incremental: bool = False):
+    """Batch process all JSON files in xml_parsed directory (incremental: diff-and-upsert)."""
     logger.info("🌱 Batch Seeding XML-derived Documents...")
     
     parsed_dir = get_xml_parsed_dir()
@@ -121,14 +157,26 @@ def batch_process():
     total_seeded = 0
     
     try:
-        for json_file in json_files:
-            result = seed_from_json(json_file, db)
-            if result:
-                total_seeded += result
+        with build_embedder(batch_size, workers, use_cache) as embedder:
+            for json_file in json_files:
+                seed = sync_from_json if incremental else seed_from_json
+                result = seed(json_file, db, embedder)
+                if result:
+                    total_seeded += result
         
         logger.info(f"✅ Batch seeding complete! Total articles: {total_seeded}")
+        embedder.log_report()
     finally:
         db.close()
 
 if __name__ == "__main__":
-    batch_process()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Seed XML-derived documents with vector embeddings')
+    add_embedding_arguments(parser)
+    parser.add_argument('--incremental', action='store_true',
+                        help='Diff against existing chunks (insert/update/delete) instead of drop-and-reinsert')
+    args = parser.parse_args()
+    
+    batch_process(batch_size=args.batch_size, workers=args.workers, use_cache=not args.no_cache,
+                  incremental=args.incremental)
@@ -0,0 +1,65 @@
+"""
+Simula la nómina de un fichero de plantilla (CSV/Parquet) y escribe los
+resultados (CSV/Parquet) en streaming, chunk a chunk.
+
+    python scripts/simulate_roster.py plantilla.csv nominas.parquet --chunk-size 2000
+"""
+import sys
+import time
+import logging
+from pathlib import Path
+
+# Add backend to sys.path to allow imports from app
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from app.constants import ROSTER_CHUNK_ROWS
+from app.db.database import SessionLocal
+from app.services.roster_io import RosterError, roster_format, simulate_roster
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run(input_path: str, output_path: str, input_format=None, output_format=None, chunk_size: int = ROSTER_CHUNK_ROWS):
+    input_format = input_format or roster_format(input_path)
+    output_format = output_format or roster_format(output_path, default=input_format)
+
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        total, chunks = simulate_roster(db, input_path, input_format, output_format, chunk_size)
+        logger.info(f"Roster {input_path}: {total} employees, writing {output_format} to {output_path}")
+
+        if output_format == "csv":
+            with open(output_path, "w", encoding="utf-8", newline="") as f:
+                for block in chunks:
+                    f.write(block)
+        else:
+            with open(output_path, "wb") as f:
+                for block in chunks:
+                    f.write(block)
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"✅ {total} payrolls in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)")
+    except RosterError as e:
+        logger.error(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Batch payroll simulation for a roster file')
+    parser.add_argument('input', help='Roster file (.csv or .parquet), one CalculationRequest per row')
+    parser.add_argument('output', help='Results file (.csv or .parquet)')
+    parser.add_argument('--input-format', choices=['csv', 'parquet'], default=None,
+                        help='Override the format inferred from the input extension')
+    parser.add_argument('--output-format', choices=['csv', 'parquet'], default=None,
+                        help='Override the format inferred from the output extension')
+    parser.add_argument('--chunk-size', type=int, default=ROSTER_CHUNK_ROWS,
+                        help=f'Rows per chunk (default: {ROSTER_CHUNK_ROWS})')
+    args = parser.parse_args()
+
+    run(args.input, args.output, args.input_format, args.output_format, args.chunk_size)
@@ -0,0 +1,119 @@
+"""
+EXPLAIN check: LegalAnchors queries must be served by the document_chunks indexes
+(GIN on chunk_metadata for intent, B-tree on the typed metadata columns).
+
+Seq scans are disabled for the transaction so the result does not depend on
+table size. That alone proves nothing: the planner can still walk the primary
+key or the chunk_size index and filter every row. So each test asserts that a
+metadata index is used with an Index Cond (i.e. it actually narrows the rows).
+"""
+import pytest
+import os
+import re
+import sys
+from sqlalchemy import text, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.database import SessionLocal
+from app.db.models import DocumentChunk
+from app.services.legal_anchors import LegalAnchors
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element, compiler, **kw):
+    return "EXPLAIN " + compiler.process(element.statement, **kw)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        session.execute(text("SELECT 1 FROM document_chunks LIMIT 1"))
+    except OperationalError as e:
+        session.close()
+        pytest.skip(f"Database not available: {e}")
+    yield session
+    session.rollback()
+    session.close()
+
+
+# Indexes that can narrow an anchor query (not the pkey / chunk_size ones used only for ordering)
+ANCHOR_INDEXES = {
+    "idx_metadata_gin",
+    "idx_chunks_company_type_year",
+    "ix_document_chunks_chunk_type",
+    "ix_document_chunks_year",
+    "ix_document_chunks_is_primary",
+    "ix_document_chunks_version_hash",
+}
+
+_INDEX_NODE = re.compile(r"(?:Index Scan|Index Only Scan|Bitmap Index Scan)(?: Backward)? (?:using|on) (\w+)")
+
+
+def explain(db, statement) -> str:
+    db.execute(text("SET LOCAL enable_seqscan = off"))
+    return "\n".join(row[0] for row in db.execute(Explain(statement)))
+
+
+def filtering_indexes(plan: str) -> set:
+    """Indexes that appear in the plan with an Index Cond (full index walks don't count)."""
+    used, current = set(), None
+    for line in plan.splitlines():
+        match = _INDEX_NODE.search(line)
+        if match:
+            current = match.group(1)
+        elif "->" in line:
+            current = None
+        elif current and "Index Cond:" in line:
+            used.add(current)
+    return used
+
+
+@pytest.mark.parametrize("intent,company_slug", [
+    ("SALARY", "iberia"),
+    ("LEAVE", "azul-handling"),
+    ("DISMISSAL", None),
+])
+def test_anchor_query_uses_indexes(db, intent, company_slug):
+    anchors = LegalAnchors()
+    statement = anchors.build_query(intent, company_slug, 2025, "abc123").where(
+        DocumentChunk.is_primary.is_(True)
+    ).order_by(
+        DocumentChunk.chunk_size.desc()
+    ).limit(2)
+
+    plan = explain(db, statement)
+    assert filtering_indexes(plan) & ANCHOR_INDEXES, plan
+    assert "Seq Scan on document_chunks" not in plan, plan
+
+
+def test_single_statement_anchor_query_uses_indexes(db):
+    # version_hash resolved as a scalar subquery + is_primary fallback as NOT EXISTS
+    ids = LegalAnchors().anchor_ids("SALARY", "iberia", 2025, limit=3)
+    statement = select(DocumentChunk).join(ids, DocumentChunk.id == ids.c.id).order_by(ids.c.rnk)
+
+    plan = explain(db, statement)
+    assert filtering_indexes(plan) & ANCHOR_INDEXES, plan
+    assert "Seq Scan on document_chunks" not in plan, plan
+
+
+def test_version_hash_lookup_uses_index(db):
+    statement = select(DocumentChunk.version_hash).where(
+        DocumentChunk.company == "iberia"
+    ).order_by(DocumentChunk.id.desc()).limit(1)
+
+    plan = explain(db, statement)
+    assert "idx_chunks_company_type_year" in filtering_indexes(plan), plan
+    assert "Seq Scan on document_chunks" not in plan, plan
@@ -0,0 +1,77 @@
+"""
+Unit tests for AnswerCache (full chat answer cache)
+"""
+from app.prompts import IntentType
+from app.services.answer_cache import AnswerCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+CHUNKS = [{"id": 1, "version_hash": "abc"}, {"id": 2, "version_hash": "abc"}]
+PROFILE = {"job_group": "Administrativos", "salary_level": "Nivel 3"}
+
+
+def key(query="¿Cuánto cobra el Nivel 3?", company="iberia", profile=PROFILE, chunks=CHUNKS, version="v1"):
+    return AnswerCache.build_key(query, company, profile, IntentType.SALARY, chunks, version)
+
+
+class TestAnswerCache:
+
+    def test_key_is_canonical(self):
+        assert key("¿Cuánto cobra el Nivel 3?") == key("cuanto cobra el nivel 3")
+
+    def test_key_depends_on_profile_company_and_corpus(self):
+        base = key()
+        assert key(company="azul") != base
+        assert key(profile={"job_group": "Administrativos", "salary_level": "Nivel 4"}) != base
+        assert key(chunks=[{"id": 1, "version_hash": "def"}]) != base
+        assert key(version="v2") != base
+
+    def test_key_depends_on_every_rendered_profile_field(self):
+        # The prompt greets the user by name and adapts advice to the contract type
+        ana = {**PROFILE, "preferred_name": "Ana", "contract_type": "indefinido"}
+        assert key(profile=ana) != key(profile={**ana, "preferred_name": "Luis"})
+        assert key(profile=ana) != key(profile={**ana, "contract_type": "temporal"})
+        assert key(profile=ana) == key(profile=dict(ana))
+
+    def test_hit_ratio_and_bytes_saved(self):
+        cache = AnswerCache()
+        k = key()
+        assert cache.get(k) is None
+
+        cache.put(k, {"text": "1.500 €", "audit": None}, prompt_bytes=1000)
+        assert cache.get(k) == {"text": "1.500 €", "audit": None}
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_ratio"] == 0.5
+        assert stats["bytes_saved"] == 1000 + len("1.500 €".encode("utf-8"))
+
+    def test_reseed_invalidates(self):
+        cache = AnswerCache()
+        cache.sync_corpus_version("v1")
+        cache.put(key(), {"text": "old"}, prompt_bytes=10)
+
+        cache.sync_corpus_version("v1")
+        assert cache.stats()["entries"] == 1
+        cache.sync_corpus_version("v2")
+        assert cache.stats()["entries"] == 0
+
+    def test_ttl_and_lru(self):
+        clock = FakeClock()
+        cache = AnswerCache(max_entries=2, ttl_seconds=60, clock=clock)
+        cache.put("a", {"text": "a"}, 1)
+        cache.put("b", {"text": "b"}, 1)
+        cache.get("a")
+        cache.put("c", {"text": "c"}, 1)
+
+        assert cache.get("b") is None
+        clock.now = 61
+        assert cache.get("a") is None
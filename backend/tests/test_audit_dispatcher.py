@@ -0,0 +1,111 @@
+"""
+Unit tests for the background auditor (AuditDispatcher + CircuitBreaker)
+"""
+import asyncio
+
+from app.services.audit_dispatcher import AuditDispatcher, CircuitBreaker
+
+
+class FakeAuditor:
+    def __init__(self, verdict=None, release: asyncio.Event = None):
+        self.verdict = verdict or {"aprobado": True, "razon": "Fiel al contexto", "nivel_riesgo": "LOW"}
+        self.release = release
+        self.calls = 0
+
+    async def audit_response_async(self, query, response_text, context_text):
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        return self.verdict
+
+
+def dispatcher(auditor, **kwargs):
+    logged = []
+    kwargs.setdefault("breaker", CircuitBreaker(failure_threshold=2, reset_seconds=60))
+    return AuditDispatcher(auditor=auditor, audit_log=lambda *args: logged.append(args), **kwargs), logged
+
+
+class TestAuditDispatcher:
+
+    def test_sampling_gates_audits(self):
+        assert not AuditDispatcher(auditor=FakeAuditor(), sample_rate=0.0).should_audit()
+        assert AuditDispatcher(auditor=FakeAuditor(), sample_rate=1.0).should_audit()
+
+    def test_verdict_is_stored_by_answer_id(self):
+        audits, logged = dispatcher(FakeAuditor())
+        verdicts = []
+
+        async def run():
+            answer_id = audits.submit("¿Cuánto cobro?", "SALARY", "1.500€", "tabla", on_verdict=verdicts.append)
+            assert audits.get(answer_id)["status"] == "pending"
+            return await audits.wait(answer_id, timeout=5)
+
+        record = asyncio.run(run())
+        assert record["status"] == "done"
+        assert record["audit"] == {"verified": True, "risk_level": "LOW", "reason": "Fiel al contexto"}
+        assert verdicts == [record["audit"]]
+        assert len(logged) == 1
+
+    def test_answer_is_not_blocked_by_slow_auditor(self):
+        async def run():
+            release = asyncio.Event()
+            audits, _ = dispatcher(FakeAuditor(release=release))
+            answer_id = audits.submit("q", "GENERAL", "a", "ctx")
+            record = await audits.wait(answer_id, timeout=0.05)
+            release.set()
+            await audits.wait(answer_id, timeout=5)
+            return record
+
+        assert asyncio.run(run())["status"] == "pending"
+
+    def test_circuit_opens_after_failures_and_skips_audits(self):
+        auditor = FakeAuditor({"aprobado": True, "razon": "Audit API Error", "nivel_riesgo": "UNKNOWN"})
+        audits, _ = dispatcher(auditor)
+
+        async def run():
+            for _ in range(2):
+                await audits.wait(audits.submit("q", "GENERAL", "a", "ctx"), timeout=5)
+            return audits.get(audits.submit("q", "GENERAL", "a", "ctx"))
+
+        record = asyncio.run(run())
+        assert audits.breaker.state == CircuitBreaker.OPEN
+        assert record["status"] == "skipped"
+        assert auditor.calls == 2
+
+    def test_saturated_pool_skips_new_audits(self):
+        async def run():
+            release = asyncio.Event()
+            audits, _ = dispatcher(FakeAuditor(release=release), max_pending=1)
+            first = audits.submit("q", "GENERAL", "a", "ctx")
+            second = audits.submit("q", "GENERAL", "a", "ctx")
+            release.set()
+            await audits.wait(first, timeout=5)
+            return audits.get(second)
+
+        assert asyncio.run(run())["status"] == "skipped"
+
+    def test_timed_out_audit_is_cancelled(self):
+        async def run():
+            audits, logged = dispatcher(FakeAuditor(release=asyncio.Event()), timeout=0.05)
+            return await audits.wait(audits.submit("q", "GENERAL", "a", "ctx"), timeout=5), logged
+
+        record, logged = asyncio.run(run())
+        assert record["status"] == "done"
+        assert record["audit"]["reason"] == "Audit Timeout"
+        assert len(logged) == 1
+
+
+class TestCircuitBreaker:
+
+    def test_half_open_allows_one_trial_then_closes(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+        breaker.record_failure()
+        assert not breaker.allow()
+
+        now[0] = 11
+        assert breaker.allow()
+        assert not breaker.allow()  # only one trial in flight
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
@@ -0,0 +1,70 @@
+"""
+Unit tests for the batched background audit log writer (app/utils/audit_logger)
+"""
+import gzip
+import hashlib
+import json
+from datetime import datetime
+
+from app.utils.audit_logger import AuditLogWriter
+
+
+def raw_event(i: int, response: str = "Respuesta"):
+    verdict = {"aprobado": True, "razon": "OK", "nivel_riesgo": "LOW"}
+    return (datetime(2025, 1, 1, 12, 0, i % 60), f"consulta {i}", "SALARY", response, f"contexto {i}", verdict)
+
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+class TestAuditLogWriter:
+
+    def test_events_are_hashed_and_written_in_background(self, tmp_path):
+        path = tmp_path / "audit.jsonl"
+        writer = AuditLogWriter(str(path), batch_size=50, flush_interval=60)
+        writer.submit(raw_event(0, response="x" * 600))
+        writer.submit(raw_event(1))
+        assert writer.flush()
+
+        first, second = read_jsonl(path)
+        assert first["context_hash"] == hashlib.sha256("contexto 0".encode()).hexdigest()
+        assert first["response_snippet"] == "x" * 500 + "..."
+        assert first["auditor_verdict"] == {"approved": True, "reason": "OK", "risk": "LOW"}
+        assert second["query"] == "consulta 1"
+        writer.close()
+
+    def test_full_batch_is_flushed_without_waiting_for_interval(self, tmp_path):
+        path = tmp_path / "audit.jsonl"
+        batches = []
+        writer = AuditLogWriter(str(path), batch_size=3, flush_interval=60, sink=batches.append)
+        for i in range(7):
+            writer.submit(raw_event(i))
+        writer.close()
+
+        assert [len(batch) for batch in batches] == [3, 3, 1]
+        assert len(read_jsonl(path)) == 7
+
+    def test_rotation_compresses_and_prunes_backups(self, tmp_path):
+        path = tmp_path / "audit.jsonl"
+        writer = AuditLogWriter(str(path), batch_size=1, flush_interval=60, max_bytes=1, backups=2)
+        for i in range(4):
+            writer.submit(raw_event(i))
+        writer.close()
+
+        backups = sorted(tmp_path.glob("audit-*.jsonl.gz"))
+        assert len(backups) == 2
+        assert not path.exists()  # every batch crossed max_bytes and was rotated
+        with gzip.open(backups[-1], "rt", encoding="utf-8") as f:
+            assert json.loads(f.readline())["query"] == "consulta 3"
+
+    def test_sink_failure_keeps_file_log(self, tmp_path):
+        path = tmp_path / "audit.jsonl"
+
+        def broken_sink(events):
+            raise RuntimeError("db down")
+
+        writer = AuditLogWriter(str(path), batch_size=10, flush_interval=60, sink=broken_sink)
+        writer.submit(raw_event(0))
+        writer.close()
+        assert len(read_jsonl(path)) == 1
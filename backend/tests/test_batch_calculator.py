@@ -0,0 +1,79 @@
+"""
+Batch payroll calculation must match the per-employee calculator
+"""
+import pytest
+
+from app.schemas.salary import CalculationRequest
+from app.services.batch_calculator import BatchCalculatorService
+from app.services.calculator_service import CalculatorService
+from app.services.tariff_model import CompanyTariff, ConceptDefinition, tariff_model
+
+TARIFFS = {
+    "iberia": CompanyTariff(
+        "iberia",
+        [
+            (1, 2025, "Administrativos", "Nivel 1", "SALARIO_BASE_ANUAL", 21000.0),
+            (2, 2025, "Administrativos", "Nivel 1", "HORA_EXTRA", 18.5),
+            (3, 2025, "Técnicos", "Nivel 3", "SALARIO_BASE_ANUAL", 24500.0),
+        ],
+        [
+            ConceptDefinition("HORA_EXTRA", "Horas Extra", "number", 15.0, None),
+            ConceptDefinition("PLUS_TURNICIDAD", "Plus Turnicidad", "checkbox", 120.0,
+                              {"Técnicos": {"Nivel 3": 150.0}}),
+            ConceptDefinition("GARANTIA", "Garantía Personal", "currency", 0.0, None),
+        ],
+    ),
+    "convenio-sector": CompanyTariff(
+        "convenio-sector",
+        [(10, 2025, "Serv. Auxiliares", "Nivel entrada", "SALARIO_BASE", 17000.0)],
+        [ConceptDefinition("HORA_NOCTURNA", "Horas Nocturnas", "number", 2.1, None)],
+    ),
+    "jet2": CompanyTariff("jet2", []),
+    "easyjet": CompanyTariff(
+        "easyjet",
+        [(20, 2025, "Servicios Auxiliares", "Jefe de Área - Nivel 2", "SALARIO_BASE_ANUAL", 30000.0)],
+        template={"structure": {"groups": [{"name": "Servicios Auxiliares", "categories": [
+            {"name": "Jefe de Área", "plus_funcion_fixed": 2400.0,
+             "levels": [{"level": "Nivel 2", "progression_plus": 700.0}]},
+        ]}]}},
+    ),
+}
+
+EMPLOYEES = [
+    CalculationRequest(company_slug="iberia", user_group="Administrativos", user_level="Nivel 1",
+                       dynamic_variables={"HORA_EXTRA": 10, "GARANTIA": 200}, gross_annual_salary=0),
+    CalculationRequest(company_slug="iberia", user_group="Técnicos", user_level="Nivel 3", payments=12,
+                       contract_percentage=75, contract_type="temporal", irpf_percentage=12.5,
+                       dynamic_variables={"PLUS_TURNICIDAD": 1, "DESCONOCIDO": 3}, gross_annual_salary=0),
+    CalculationRequest(company_slug="jet2", user_group="Serv. Auxiliares", user_level="Nivel entrada",
+                       dynamic_variables={"HORA_NOCTURNA": 40}, gross_annual_salary=0),
+    CalculationRequest(company_slug="easyjet", user_group="Nivel 2", user_level="Jefe de Área",
+                       contract_percentage=50, gross_annual_salary=0),
+    CalculationRequest(company_slug="iberia", user_group="Administrativos", user_level="Nivel 1",
+                       gross_annual_salary=26000, dynamic_variables={"GARANTIA": 0}),
+]
+
+
+@pytest.fixture(autouse=True)
+def fake_tariffs(monkeypatch):
+    monkeypatch.setattr(tariff_model, "get_many", lambda db, slugs: {slug: TARIFFS[slug] for slug in slugs})
+
+
+def test_batch_matches_single_calculation():
+    single = [CalculatorService(None).calculate_smart_salary(e) for e in EMPLOYEES]
+    batch = BatchCalculatorService(None).calculate_batch(EMPLOYEES)
+
+    assert len(batch.results) == len(EMPLOYEES)
+    for expected, result in zip(single, batch.results):
+        # Same formulas in the same operation order: identical responses, not just close ones
+        assert result == expected
+
+
+def test_batch_aggregates():
+    batch = BatchCalculatorService(None).calculate_batch(EMPLOYEES)
+    aggregates = batch.aggregates
+
+    assert aggregates.employees == len(EMPLOYEES)
+    assert aggregates.total_gross_monthly == pytest.approx(sum(r.gross_monthly_total for r in batch.results), abs=0.05)
+    assert aggregates.total_net_monthly == pytest.approx(sum(r.net_salary_monthly for r in batch.results), abs=0.05)
+    assert aggregates.average_gross_monthly == pytest.approx(aggregates.total_gross_monthly / len(EMPLOYEES), abs=0.01)
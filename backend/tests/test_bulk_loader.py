@@ -0,0 +1,99 @@
+"""
+Unit tests for the binary COPY encoder (app/db/bulk_loader)
+"""
+import json
+import struct
+
+import pytest
+
+from app.constants import EMBEDDING_DIMENSION
+from app.db.bulk_loader import COPY_SIGNATURE, CopyStream, copy_columns, encode_rows, shadow_index_sql
+from app.db.models import DocumentChunk, SalaryTable
+
+
+def decode(stream: bytes):
+    """Minimal binary COPY reader: list of tuples of raw field bytes (None = NULL)."""
+    assert stream.startswith(COPY_SIGNATURE)
+    offset = len(COPY_SIGNATURE) + 8
+    rows = []
+    while True:
+        (count,) = struct.unpack_from("!h", stream, offset)
+        offset += 2
+        if count == -1:
+            assert offset == len(stream)
+            return rows
+        fields = []
+        for _ in range(count):
+            (length,) = struct.unpack_from("!i", stream, offset)
+            offset += 4
+            if length == -1:
+                fields.append(None)
+            else:
+                fields.append(stream[offset:offset + length])
+                offset += length
+        rows.append(fields)
+
+
+def test_salary_rows_from_dicts():
+    columns = copy_columns(SalaryTable.__table__)
+    assert "id" not in [c.name for c in columns]
+
+    row = {"company_id": "iberia", "year": 2025, "group": "Técnicos", "level": "Nivel 1",
+           "concept": "SALARIO_BASE", "amount": 1523.75}
+    (fields,) = decode(b"".join(encode_rows([row], columns)))
+    values = dict(zip([c.name for c in columns], fields))
+
+    assert values["company_id"] == b"iberia"
+    assert struct.unpack("!i", values["year"]) == (2025,)
+    assert values["group"].decode("utf-8") == "Técnicos"
+    assert struct.unpack("!d", values["amount"]) == (1523.75,)
+    assert values["variable_type"] is None
+
+
+def test_document_chunk_instance_with_vector_and_jsonb():
+    columns = copy_columns(DocumentChunk.__table__)
+    chunk = DocumentChunk(
+        document_id=7,
+        content="Artículo 1",
+        embedding=[0.5, -1.0, 2.0] + [0.0] * (EMBEDDING_DIMENSION - 3),
+        chunk_metadata={"type": "table", "year": "2025", "is_primary": "true"},
+    )
+    (fields,) = decode(b"".join(encode_rows([chunk], columns)))
+    values = dict(zip([c.name for c in columns], fields))
+
+    dim, unused = struct.unpack_from("!hh", values["embedding"])
+    assert (dim, unused) == (EMBEDDING_DIMENSION, 0)
+    assert struct.unpack_from("!3f", values["embedding"], 4) == (0.5, -1.0, 2.0)
+    assert values["chunk_metadata"][0] == 1  # jsonb format version
+    assert json.loads(values["chunk_metadata"][1:])["type"] == "table"
+    # Typed columns filled by @validates travel in the same row
+    assert struct.unpack("!i", values["year"]) == (2025,)
+    assert values["is_primary"] == b"\x01"
+
+
+def test_copy_stream_reads_in_chunks_and_counts_rows():
+    columns = copy_columns(SalaryTable.__table__)
+    rows = [{"company_id": f"c{i}", "year": 2025} for i in range(50)]
+    expected = b"".join(encode_rows(rows, columns))
+
+    stream = CopyStream(encode_rows(rows, columns))
+    data = b""
+    while chunk := stream.read(64):
+        data += chunk
+
+    assert data == expected
+    assert stream.rows == 50
+
+
+def test_vector_dimension_is_checked():
+    columns = [DocumentChunk.__table__.c.embedding]
+    with pytest.raises(ValueError):
+        b"".join(encode_rows([{"embedding": [1.0, 2.0]}], columns))
+
+
+def test_shadow_index_sql():
+    indexdef = "CREATE INDEX ix_document_chunks_embedding_hnsw ON public.document_chunks USING hnsw (embedding vector_cosine_ops)"
+    assert shadow_index_sql(indexdef, "ix_document_chunks_embedding_hnsw", "document_chunks") == (
+        "CREATE INDEX ix_document_chunks_embedding_hnsw_load ON public.document_chunks_load "
+        "USING hnsw (embedding vector_cosine_ops)"
+    )
@@ -0,0 +1,59 @@
+"""
+Unit tests for DocumentChunk typed metadata columns (synced from chunk_metadata)
+"""
+from app.db.models import DocumentChunk, _resync_chunk_metadata_columns
+
+
+class TestChunkMetadataColumns:
+
+    def test_columns_follow_metadata(self):
+        chunk = DocumentChunk(
+            content="x" * 120,
+            chunk_metadata={
+                "type": "table",
+                "company": "iberia",
+                "year": 2025,
+                "version_hash": "abc123",
+                "chunk_size": 120,
+                "is_primary": True,
+                "intent": ["SALARY"],
+            },
+        )
+        assert chunk.chunk_type == "table"
+        assert chunk.company == "iberia"
+        assert chunk.year == 2025
+        assert chunk.version_hash == "abc123"
+        assert chunk.chunk_size == 120
+        assert chunk.is_primary is True
+        assert chunk.chunk_metadata["intent"] == ["SALARY"]
+
+    def test_legacy_string_values_are_normalized(self):
+        # seed_vectors used to store is_primary as "true"/"false"
+        chunk = DocumentChunk(content="abcd", chunk_metadata={"is_primary": "false", "year": "2024"})
+        assert chunk.is_primary is False
+        assert chunk.chunk_metadata["is_primary"] is False
+        assert chunk.year == 2024
+        assert chunk.chunk_size == 4  # falls back to len(content)
+
+    def test_reassignment_updates_columns(self):
+        chunk = DocumentChunk(content="abc", chunk_metadata={"type": "article"})
+        chunk.chunk_metadata = {"type": "table", "year": "n/a"}
+        assert chunk.chunk_type == "table"
+        assert chunk.year is None
+
+    def test_chunk_size_falls_back_whatever_the_kwarg_order(self):
+        chunk = DocumentChunk(chunk_metadata={"type": "article"}, content="abcde")
+        assert chunk.chunk_size == 5
+        chunk.content = "abc"
+        assert chunk.chunk_size == 3
+
+    def test_in_place_mutation_is_resynced_on_flush(self):
+        chunk = DocumentChunk(content="abc", chunk_metadata={"year": 2024, "is_primary": False})
+        chunk.chunk_metadata["year"] = 2025
+        chunk.chunk_metadata["is_primary"] = "true"
+        assert chunk.year == 2024  # not yet: only assignments are validated
+
+        _resync_chunk_metadata_columns(None, None, chunk)  # before_insert / before_update
+        assert chunk.year == 2025
+        assert chunk.is_primary is True
+        assert chunk.chunk_metadata["is_primary"] is True
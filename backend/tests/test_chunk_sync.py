@@ -0,0 +1,29 @@
+"""
+Unit tests for the incremental ingestion diff (chunk_sync)
+"""
+from app.services.chunk_sync import article_keys, diff_chunks
+
+
+def test_repeated_article_refs_get_distinct_keys():
+    assert article_keys(["Art. 1", None, "Art. 1", ""]) == [
+        ("Art. 1", 0), ("", 0), ("Art. 1", 1), ("", 1)
+    ]
+
+
+def test_diff_classifies_chunks():
+    current = {("Art. 1", 0): "Salario base", ("Art. 2", 0): "Vacaciones", ("Art. 3", 0): "Derogado"}
+    incoming = {("Art. 1", 0): "Salario  base\n", ("Art. 2", 0): "Vacaciones: 30 días", ("Art. 4", 0): "Nuevo"}
+
+    diff = diff_chunks(current, incoming)
+
+    # Whitespace-only changes do not count as an update (no re-embedding)
+    assert diff.unchanged == [("Art. 1", 0)]
+    assert diff.updated == [("Art. 2", 0)]
+    assert diff.inserted == [("Art. 4", 0)]
+    assert diff.deleted == [("Art. 3", 0)]
+    assert diff.changed
+
+
+def test_identical_document_is_a_no_op():
+    chunks = {("Art. 1", 0): "Texto"}
+    assert not diff_chunks(chunks, dict(chunks)).changed
@@ -0,0 +1,83 @@
+"""
+Unit tests for the token-budget context packer
+"""
+from app.prompts import IntentType
+from app.services.context_packer import (
+    TRUNCATION_MARKER,
+    ContextPacker,
+    compress_table,
+    estimate_tokens,
+    truncate_lines,
+)
+
+GROUP_TABLE = """### 📊 TABLA SALARIAL COMPLETA: ADMINISTRATIVOS (2025)
+Esta tabla contiene los valores oficiales para TODOS los niveles del grupo Administrativos. Úsala para comparaciones.
+
+| Nivel | SALARIO_BASE | PLUS_NOCTURNIDAD | PLUS_TRANSPORTE |
+| :--- | :--- | :--- | :--- |
+| **Nivel 1** | 1,100.00€ | 2.10€ | - |
+| **Nivel 3** | 1,300.00€ | 2.30€ | - |
+| **Nivel 10** | 2,000.00€ | 3.00€ | - |"""
+
+USER_TABLE = """### 📊 DATOS OFICIALES DE TABLA SALARIAL (Base de Datos)
+| Concepto | Valor (€) |
+| :--- | :--- |
+| SALARIO_BASE | 1,300.00 € |"""
+
+
+def chunk(ref, content, retrieval="vector"):
+    return {"article_ref": ref, "content": content, "retrieval": retrieval}
+
+
+def test_table_keeps_user_level_and_named_columns():
+    lines = GROUP_TABLE.split("\n")[3:]
+    compressed = compress_table(lines, ["nivel 3", "nocturnidad"])
+    assert compressed == [
+        "| Nivel | SALARIO_BASE | PLUS_NOCTURNIDAD |",
+        "| :--- | :--- | :--- |",
+        "| **Nivel 3** | 1,300.00€ | 2.30€ |",
+    ]
+    # No matching row: every row stays (no criterion to pick), only the empty column goes
+    assert compress_table(lines, ["vacaciones"])[2:] == [line.rsplit(" - |", 1)[0] for line in lines[2:]]
+
+
+def test_truncation_cuts_whole_lines_and_drops_bare_headers():
+    text = "Artículo 5\n" + "\n".join(f"| fila {i} | {i * 10} |" for i in range(50))
+    cut = truncate_lines(text, 40)
+    assert cut.endswith(TRUNCATION_MARKER)
+    assert all(line.startswith("| fila") or line in ("Artículo 5", TRUNCATION_MARKER) for line in cut.split("\n"))
+    assert estimate_tokens(cut) <= 40
+    # Only a table header fits -> nothing useful left
+    assert truncate_lines("| Nivel | Base |\n| :--- | :--- |\n| N1 | 1 |", 12) == ""
+
+
+def test_priority_dedup_and_budget():
+    anchor = chunk("Artículo 34", "Jornada: descanso mínimo de doce horas entre jornadas. " * 4, "anchor")
+    duplicate = chunk("Artículo 34 (v2)", anchor["content"] + " ", "vector")
+    filler = [chunk(f"Art. {i}", f"Texto del artículo {i} " * 300) for i in range(5)]
+
+    packed = ContextPacker(budgets={"salary": 1500}).pack(
+        "cuánto cobra el nivel 3 de nocturnidad",
+        [*filler[:2], anchor, duplicate, *filler[2:]],
+        IntentType.SALARY,
+        structured_data=f"{USER_TABLE}\n\n{GROUP_TABLE}",
+        user_context={"salary_level": "Nivel 3"},
+    )
+
+    assert packed.duplicates == 1
+    assert packed.tokens <= 1500
+    assert packed.dropped + packed.truncated >= 1
+    # Anchor beats vector filler; prompt keeps retrieval order among the survivors
+    refs = [c["article_ref"] for c in packed.chunks]
+    assert "Artículo 34" in refs and "Artículo 34 (v2)" not in refs
+    # User table is always whole; group table reduced to the user's level row
+    assert USER_TABLE in packed.structured_data
+    assert "Nivel 10" not in packed.structured_data and "Nivel 3" in packed.structured_data
+
+
+def test_comparisons_keep_the_whole_group_table():
+    packed = ContextPacker().pack(
+        "diferencia entre nivel 1 y nivel 10", [], IntentType.SALARY,
+        structured_data=f"{USER_TABLE}\n\n{GROUP_TABLE}", user_context={"salary_level": "Nivel 3"},
+    )
+    assert GROUP_TABLE in packed.structured_data
@@ -0,0 +1,84 @@
+"""
+Corpus fingerprint against a live database: in-place UPDATEs (not only
+inserts/deletes) must change it, and with it the answer cache key.
+Skipped when Postgres is not available.
+Every change is rolled back.
+"""
+import pytest
+import os
+import sys
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+# Add backend to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.database import SessionLocal
+from app.prompts import IntentType
+from app.services.answer_cache import AnswerCache
+from app.services.corpus_version import CorpusVersion
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        session.execute(text("SELECT 1 FROM salary_concept_definitions, document_chunks LIMIT 1"))
+    except OperationalError as e:
+        session.close()
+        pytest.skip(f"Database not available: {e}")
+    yield session
+    session.rollback()
+    session.close()
+
+
+def fresh_salary_version(db) -> str:
+    return CorpusVersion(ttl_seconds=0).salary(db)
+
+
+def test_price_update_changes_salary_version(db):
+    concept_id = db.execute(text("SELECT min(id) FROM salary_concept_definitions")).scalar()
+    if concept_id is None:
+        pytest.skip("No salary concept definitions seeded")
+    before = fresh_salary_version(db)
+
+    # Same row count and max(id): what update_azul_prices.py does
+    db.execute(text("UPDATE salary_concept_definitions SET default_price = coalesce(default_price, 0) + 1 WHERE id = :id"),
+               {"id": concept_id})
+    assert fresh_salary_version(db) != before
+
+
+def test_salary_table_update_changes_salary_version(db):
+    row_id = db.execute(text("SELECT min(id) FROM salary_tables")).scalar()
+    if row_id is None:
+        pytest.skip("No salary tables seeded")
+    before = fresh_salary_version(db)
+
+    db.execute(text("UPDATE salary_tables SET amount = coalesce(amount, 0) + 1 WHERE id = :id"), {"id": row_id})
+    assert fresh_salary_version(db) != before
+
+
+@pytest.mark.parametrize("update", [
+    # chunk_sync rewrites content and version_hash in place (same count, same max id)
+    "UPDATE document_chunks SET version_hash = md5(coalesce(version_hash, '') || 'x') WHERE id = (SELECT min(id) FROM document_chunks)",
+    "UPDATE salary_concept_definitions SET name = name || ' (rev)' WHERE id = (SELECT min(id) FROM salary_concept_definitions)",
+])
+def test_in_place_update_invalidates_cached_answer(db, update):
+    if db.execute(text("SELECT count(*) FROM document_chunks")).scalar() == 0:
+        pytest.skip("No document chunks seeded")
+    cache = AnswerCache()
+    chunks = [{"id": 1, "version_hash": "abc"}]
+
+    before = CorpusVersion(ttl_seconds=0).combined(db)
+    cache.sync_corpus_version(before)
+    stale_key = AnswerCache.build_key("¿Cuánto cobro?", "iberia", None, IntentType.SALARY, chunks, before)
+    cache.put(stale_key, {"text": "1.500 €"}, prompt_bytes=100)
+
+    db.execute(text(update))
+    after = CorpusVersion(ttl_seconds=0).combined(db)
+    cache.sync_corpus_version(after)
+    key = AnswerCache.build_key("¿Cuánto cobro?", "iberia", None, IntentType.SALARY, chunks, after)
+
+    assert key != stale_key
+    assert cache.get(key) is None
+    assert cache.stats()["entries"] == 0
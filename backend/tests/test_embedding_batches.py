@@ -0,0 +1,82 @@
+"""
+Unit tests for BatchEmbedder (batched embeddings for ingestion scripts)
+"""
+import numpy as np
+from app.constants import EMBEDDING_DIMENSION
+from app.services.embedding_cache import content_hash
+from app.utils.embedding_batches import BatchEmbedder
+
+
+class FakeModel:
+    def __init__(self, fail_on=None):
+        self.calls = []
+        self.fail_on = fail_on
+
+    def encode(self, texts, batch_size=None, show_progress_bar=False):
+        self.calls.append(list(texts))
+        if self.fail_on and self.fail_on in texts:
+            raise RuntimeError("encode failed")
+        return np.array([[float(len(t))] * EMBEDDING_DIMENSION for t in texts])
+
+
+class TestBatchEmbedder:
+
+    def test_batches_and_keeps_order(self):
+        model = FakeModel()
+        embedder = BatchEmbedder(model=model, batch_size=2)
+        vectors = embedder.embed(["a", "bb", "ccc", "dddd", "eeeee"])
+
+        assert [len(call) for call in model.calls] == [2, 2, 1]
+        assert [v[0] for v in vectors] == [1.0, 2.0, 3.0, 4.0, 5.0]
+        assert embedder.total_chunks == 5
+
+    def test_failed_text_gets_zero_vector(self):
+        model = FakeModel(fail_on="bad")
+        embedder = BatchEmbedder(model=model, batch_size=3)
+        vectors = embedder.embed(["ok", "bad", "fine"])
+
+        assert vectors[0][0] == 2.0
+        assert vectors[1] == [0.0] * EMBEDDING_DIMENSION
+        assert vectors[2][0] == 4.0
+        assert embedder.failed_chunks == 1
+
+    def test_empty_input(self):
+        model = FakeModel()
+        assert BatchEmbedder(model=model).embed([]) == []
+        assert model.calls == []
+
+
+class FakeCache:
+    def __init__(self, stored=None):
+        self.stored = dict(stored or {})
+
+    def hash(self, text):
+        return content_hash(text, "fake-model")
+
+    def lookup(self, hashes):
+        return {h: self.stored[h] for h in hashes if h in self.stored}
+
+    def store(self, vectors):
+        self.stored.update(vectors)
+
+
+class TestEmbeddingCache:
+
+    def test_hash_ignores_whitespace_but_not_model(self):
+        assert content_hash("Artículo 1.  Salario\n base") == content_hash("Artículo 1. Salario base")
+        assert content_hash("texto", "model-a") != content_hash("texto", "model-b")
+
+    def test_only_missing_texts_reach_the_model(self):
+        cache = FakeCache({content_hash("cached", "fake-model"): [9.0] * EMBEDDING_DIMENSION})
+        model = FakeModel()
+        vectors = BatchEmbedder(model=model, cache=cache).embed(["cached", "new", "new"])
+
+        assert model.calls == [["new"]]
+        assert [v[0] for v in vectors] == [9.0, 3.0, 3.0]
+        assert content_hash("new", "fake-model") in cache.stored
+
+    def test_zero_vectors_are_not_cached(self):
+        cache = FakeCache()
+        BatchEmbedder(model=FakeModel(fail_on="bad"), batch_size=1, cache=cache).embed(["bad"])
+
+        assert cache.stored == {}
@@ -0,0 +1,56 @@
+"""
+Salary table extraction engine (scripts/extract_salary_tables.py)
+"""
+import glob
+import os
+
+import pytest
+
+from scripts.extract_salary_tables import SALARY_ALIASES, _title_year, extract_all, index_tables, load_document
+
+XML_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "xml")
+
+
+def find_previous_title(table):
+    """Per-table backwards walk that index_tables replaces (reference behaviour)."""
+    caption = table.find("caption")
+    if caption:
+        return caption.get_text(strip=True)
+    prev = table.find_previous(["p", "h1", "h2", "h3"])
+    title_text = ""
+    steps = 0
+    while prev and steps < 5:
+        txt = prev.get_text(strip=True)
+        if len(txt) > 5 and "Euros" not in txt and "Tabla" not in txt:
+            title_text = txt
+            break
+        prev = prev.find_previous(["p", "h1", "h2", "h3"])
+        steps += 1
+    if not title_text and prev:
+        title_text = prev.get_text(strip=True)
+    return title_text
+
+
+@pytest.mark.parametrize("xml_path", sorted(glob.glob(os.path.join(XML_DIR, "*.xml"))))
+def test_linear_index_matches_find_previous(xml_path):
+    soup = load_document(xml_path)
+    indexed = index_tables(soup)
+
+    assert [table for table, _ in indexed] == soup.find_all("table")
+    for table, title in indexed:
+        assert title == find_previous_title(table)
+
+
+def test_title_year_keeps_first_match_and_default():
+    assert _title_year("Tablas salariales año 2023 (revisión 2025)", 2025) == 2023
+    assert _title_year("Plus transporte", 2022) == 2022
+
+
+def test_extract_all_expands_aliases():
+    records = extract_all(XML_DIR, companies=["convenio-sector"], workers=1)
+    sector = [r for r in records if r["company_id"] == "convenio-sector"]
+
+    assert sector
+    for alias in SALARY_ALIASES["convenio-sector"]:
+        assert [dict(r, company_id="convenio-sector") for r in records if r["company_id"] == alias] == sector
+    assert all(isinstance(r["amount"], float) and isinstance(r["year"], int) for r in records)
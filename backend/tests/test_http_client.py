@@ -0,0 +1,152 @@
+"""
+Unit tests for the shared HTTP client (retries, per-host limits) and the Gemini REST model
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services.gemini_rest import GeminiRestError, GeminiRestModel
+from app.services.http_client import HttpClient
+
+
+def gemini_body(*texts):
+    return {"candidates": [{"content": {"parts": [{"text": text} for text in texts]}}]}
+
+
+def mock_client(handler, **kwargs):
+    transport = httpx.MockTransport(handler)
+    return HttpClient(transport=transport, async_transport=transport, backoff=0, **kwargs)
+
+
+class TestHttpClient:
+
+    def test_retries_transient_status_then_succeeds(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(503 if len(calls) < 3 else 200, json={"ok": True})
+
+        client = mock_client(handler, retries=2)
+        response = asyncio.run(client.post_json("https://api.example.com/v1", {"q": 1}))
+        assert response.status_code == 200
+        assert len(calls) == 3
+
+    def test_client_errors_are_not_retried(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(400)
+
+        response = mock_client(handler, retries=2).post_json_sync("https://api.example.com/v1", {})
+        assert response.status_code == 400
+        assert len(calls) == 1
+
+    def test_connection_errors_raise_after_retries(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            raise httpx.ConnectError("refused", request=request)
+
+        with pytest.raises(httpx.ConnectError):
+            mock_client(handler, retries=1).post_json_sync("https://api.example.com/v1", {})
+        assert len(calls) == 2
+
+    def test_post_is_not_retried_once_sent(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            raise httpx.ReadTimeout("slow completion", request=request)
+
+        with pytest.raises(httpx.ReadTimeout):
+            mock_client(handler, retries=2).post_json_sync("https://api.example.com/v1", {})
+        assert len(calls) == 1
+
+    def test_retry_after_is_capped(self):
+        client = HttpClient(max_retry_after=2.0)
+        assert client._retry_delay(0, httpx.Response(429, headers={"Retry-After": "60"})) == 2.0
+        assert client._retry_delay(0, httpx.Response(429, headers={"Retry-After": "1"})) == 1.0
+
+    def test_per_host_limit(self):
+        in_flight, peak = [0], [0]
+
+        async def handler(request):
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            await asyncio.sleep(0.01)
+            in_flight[0] -= 1
+            return httpx.Response(200)
+
+        client = mock_client(handler, max_per_host=2)
+
+        async def run():
+            await asyncio.gather(*(client.post_json("https://api.example.com/v1", {}) for _ in range(6)))
+            await client.aclose()
+
+        asyncio.run(run())
+        assert peak[0] == 2
+
+
+class TestGeminiRestModel:
+
+    def test_generate_content_sends_camel_case_config_and_key_header(self):
+        seen = {}
+
+        def handler(request):
+            seen["url"] = str(request.url)
+            seen["key"] = request.headers["x-goog-api-key"]
+            seen["body"] = json.loads(request.content)
+            return httpx.Response(200, json=gemini_body("Hola", " mundo"))
+
+        model = GeminiRestModel("gemini-2.0-flash", api_key="k", client=mock_client(handler))
+        response = model.generate_content("¿Qué tal?", generation_config={"temperature": 0.0, "response_mime_type": "application/json"})
+
+        assert response.text == "Hola mundo"
+        assert seen["url"].endswith("/models/gemini-2.0-flash:generateContent")
+        assert seen["key"] == "k"
+        assert seen["body"]["generationConfig"] == {"temperature": 0.0, "responseMimeType": "application/json"}
+
+    def test_stream_yields_sse_chunks(self):
+        def handler(request):
+            assert request.url.params["alt"] == "sse"
+            lines = [f"data: {json.dumps(gemini_body(text))}\n\n" for text in ("Uno", "Dos")]
+            lines.append(f"data: {json.dumps({'candidates': [{'finishReason': 'STOP'}]})}\n\n")
+            return httpx.Response(200, content="".join(lines).encode())
+
+        model = GeminiRestModel("gemini-2.0-flash", api_key="k", client=mock_client(handler))
+
+        async def run():
+            texts = []
+            async for chunk in await model.generate_content_async("q", stream=True):
+                try:
+                    texts.append(chunk.text)
+                except ValueError:
+                    texts.append(None)
+            return texts
+
+        assert asyncio.run(run()) == ["Uno", "Dos", None]
+
+    def test_error_status_raises(self):
+        model = GeminiRestModel("gemini-2.0-flash", api_key="k", client=mock_client(lambda r: httpx.Response(403, text="denied"), retries=0))
+        with pytest.raises(GeminiRestError):
+            asyncio.run(model.generate_content_async("q"))
+
+
+class TestAuditorOverSharedClient:
+
+    def test_async_audit_parses_verdict(self, monkeypatch):
+        from app.services import auditor_service as module
+
+        verdict = {"aprobado": True, "razon": "Fiel", "nivel_riesgo": "LOW"}
+        client = mock_client(lambda request: httpx.Response(200, json=gemini_body(f"```json{json.dumps(verdict)}```")))
+        monkeypatch.setattr(module, "http_client", client)
+        auditor = module.AuditorService()
+        auditor.api_key = "k"
+
+        assert asyncio.run(auditor.audit_response_async("q", "a", "ctx")) == verdict
+        assert auditor.audit_response("q", "a", "ctx") == verdict
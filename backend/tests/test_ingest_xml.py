@@ -0,0 +1,45 @@
+"""
+The lxml streaming parser must produce exactly the same sections as the
+BeautifulSoup path (scripts/ingest_xml.py).
+"""
+import glob
+import os
+
+import pytest
+
+from scripts.ingest_xml import build_articles, iter_elements_bs4, iter_elements_lxml, parse_articles
+
+XML_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "xml")
+
+SAMPLE = """<?xml version="1.0" encoding="UTF-8"?>
+<documento>
+  <metadatos><titulo>Convenio</titulo></metadatos>
+  <texto>
+    <p class="parrafo">Texto del preámbulo &amp; más.</p>
+    <h5 class="articulo">Artículo 1. Ámbito</h5>
+    <p>Primer   párrafo <b>con</b> negrita.</p>
+    <p class="anexo_num">ANEXO I</p>
+    <table>
+      <tr><th>Nivel</th><th>Salario</th></tr>
+      <tr><td><p>Nivel 1</p></td><td>1.500,00</td></tr>
+    </table>
+    <p class="centro_redonda">Tabla salarial 2025</p>
+  </texto>
+</documento>
+"""
+
+
+def test_streaming_matches_tree_parser_on_sample(tmp_path):
+    xml_path = tmp_path / "sample.xml"
+    xml_path.write_text(SAMPLE, encoding="utf-8")
+
+    expected = list(build_articles(iter_elements_bs4(SAMPLE)))
+    assert list(build_articles(iter_elements_lxml(str(xml_path)))) == expected
+    # The <p> inside the table cell comes after the table (pre-order), as with find_all
+    assert expected[-2]["content"].endswith("| Nivel 1 | 1.500,00 |\n\nNivel 1\n")
+    assert expected[-1]["article"] == "Tabla salarial 2025"
+
+
+@pytest.mark.parametrize("xml_path", sorted(glob.glob(os.path.join(XML_DIR, "*.xml"))))
+def test_streaming_matches_tree_parser_on_boe_documents(xml_path):
+    assert parse_articles(xml_path, "lxml") == parse_articles(xml_path, "bs4")
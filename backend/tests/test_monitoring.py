@@ -0,0 +1,94 @@
+"""
+Unit tests for StageTimer (per-stage request timings)
+"""
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from app.services.monitoring import StageTimer
+
+
+class TestStageTimer:
+
+    def test_records_each_stage(self):
+        timer = StageTimer("search")
+        with timer.stage("embedding"):
+            time.sleep(0.01)
+        with timer.stage("retrieval"):
+            pass
+
+        summary = timer.summary()
+        assert list(summary) == ["embedding", "retrieval"]
+        assert summary["embedding"] >= 10
+
+    def test_repeated_stage_accumulates_and_counts(self):
+        timer = StageTimer("search")
+        for _ in range(2):
+            with timer.stage("calculation"):
+                pass
+        assert timer.counts["calculation"] == 2
+
+    def test_records_timing_on_exception(self):
+        timer = StageTimer("search")
+        try:
+            with timer.stage("generation"):
+                raise RuntimeError("boom")
+        except RuntimeError:
+            pass
+        assert "generation" in timer.timings
+
+    def test_record_external_measure(self):
+        timer = StageTimer("chat_stream")
+        timer.record("first_token", 250.0)
+        assert timer.summary() == {"first_token": 250.0}
+        assert timer.counts["first_token"] == 1
+
+
+class TestPrometheusMetrics:
+
+    def test_stage_and_cache_metrics_exported(self):
+        from app.services.answer_cache import AnswerCache
+        from app.services.monitoring import metrics_payload, observe_prompt
+
+        timer = StageTimer("metrics_test")
+        timer.record("retrieval", 40.0)
+        timer.log()
+        observe_prompt("salary", 3000, dropped=2)
+        cache = AnswerCache(name="metrics_test_cache")
+        cache.put("a", {"text": "a"}, 1)
+        cache.put("b", {"text": "b"}, 1)
+        for key in ("a", "a", "b", "c"):
+            cache.get(key)
+
+        payload, content_type = metrics_payload()
+        text = payload.decode()
+        assert content_type.startswith("text/plain")
+        assert 'rag_stage_seconds_count{pipeline="metrics_test",stage="retrieval"} 1.0' in text
+        assert 'rag_request_seconds_count{pipeline="metrics_test"} 1.0' in text
+        assert 'rag_prompt_tokens_count{intent="salary"}' in text
+        assert 'rag_context_pieces_total{outcome="dropped"}' in text
+        assert 'rag_cache_lookups_total{cache="metrics_test_cache",result="hits"} 3.0' in text
+        assert 'rag_cache_lookups_total{cache="metrics_test_cache",result="misses"} 1.0' in text
+        assert 'rag_cache_entries{cache="metrics_test_cache"} 2.0' in text
+
+    def test_cache_metrics_survive_multiprocess_mode(self, tmp_path):
+        pytest.importorskip("prometheus_client")
+        # The multiprocess value class is chosen at import time: run in a fresh interpreter
+        script = (
+            "from app.services.semantic_cache import SemanticCache\n"
+            "from app.services.monitoring import metrics_payload\n"
+            "cache = SemanticCache('mp_test', allow_near_hits=False)\n"
+            "cache.put('nivel 3', {'q': 1}); cache.get('nivel 3'); cache.get('nivel 4')\n"
+            "print(metrics_payload()[0].decode())\n"
+        )
+        env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+        backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        text = subprocess.run([sys.executable, "-c", script], cwd=backend, env=env,
+                              capture_output=True, text=True, check=True).stdout
+
+        assert 'rag_cache_lookups_total{cache="mp_test",result="hits"} 1.0' in text
+        assert 'rag_cache_lookups_total{cache="mp_test",result="misses"} 1.0' in text
+        assert 'rag_cache_entries{cache="mp_test"} 1.0' in text
@@ -95,5 +95,37 @@ class TestQueryExpander:
         text = expander.get_expanded_query_text(expansion)
         assert text == "permiso retribuido enfermedad grave"
 
+    def test_parse_understanding(self):
+        """Test single-call rewrite + expansion parsing."""
+        expander = QueryExpander()
+        
+        text = '{"rewritten_query": "Permiso por hospitalización de mi tío", "intent": "leave", "keywords_busqueda": ["Permiso retribuido?", "hospitalización"], "entidades_detectadas": ["tío"], "requiere_tablas": true, "grado_parentesco": 3}'
+        
+        result = expander._parse_understanding(text, "y si es mi tío?")
+        assert result["rewritten_query"] == "Permiso por hospitalización de mi tío"
+        assert result["intent"] == "LEAVE"
+        assert result["keywords_busqueda"] == ["permiso retribuido", "hospitalización"]
+        assert result["grado_parentesco"] == 3
+        assert result["meta"]["source"] == "flash"
+    
+    def test_understanding_schema_fallback(self):
+        """Test fallback when the understanding JSON does not match the schema."""
+        expander = QueryExpander()
+        
+        result = expander._parse_understanding('{"intent": "SALARY"}', "cuánto cobro")
+        assert result["meta"]["source"] == "fallback"
+        assert result["rewritten_query"] == "cuánto cobro"
+        
+        result = expander._parse_understanding('no es json', "cuánto cobro")
+        assert result["meta"]["source"] == "fallback"
+    
+    def test_understanding_unknown_intent(self):
+        """Test that unknown intents are sanitized to GENERAL."""
+        expander = QueryExpander()
+        
+        result = expander._parse_understanding('{"rewritten_query": "hola", "intent": "CHITCHAT"}', "hola")
+        assert result["intent"] == "GENERAL"
+        assert result["keywords_busqueda"] == ["hola"]
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
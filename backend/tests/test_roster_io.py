@@ -0,0 +1,105 @@
+"""
+Roster files are streamed in chunks through the batch calculator
+"""
+import csv
+import io
+
+import pytest
+
+from app.schemas.salary import CalculationRequest
+from app.services.batch_calculator import BatchCalculatorService
+from app.services.roster_io import RosterError, concept_column, roster_format, simulate_roster
+from app.services.tariff_model import CompanyTariff, ConceptDefinition, tariff_model
+
+TARIFFS = {
+    "iberia": CompanyTariff(
+        "iberia",
+        [(1, 2025, "Administrativos", "Nivel 1", "SALARIO_BASE_ANUAL", 21000.0)],
+        [ConceptDefinition("HORA_EXTRA", "Horas Extra", "number", 15.0, None)],
+    ),
+}
+
+ROSTER = """employee_id,company_slug,user_group,user_level,payments,contract_percentage,contract_type,HORA_EXTRA
+E1,iberia,Administrativos,Nivel 1,14,100,indefinido,10
+E2,iberia,Administrativos,Nivel 1,12,50,temporal,
+E3,iberia,Administrativos,Nivel 1,14,100,indefinido,4
+"""
+
+
+@pytest.fixture(autouse=True)
+def fake_tariffs(monkeypatch):
+    monkeypatch.setattr(tariff_model, "get_many", lambda db, slugs: {slug: TARIFFS[slug] for slug in slugs})
+
+
+@pytest.fixture
+def roster_path(tmp_path):
+    path = tmp_path / "plantilla.csv"
+    path.write_text(ROSTER, encoding="utf-8")
+    return str(path)
+
+
+def test_concept_columns_drop_per_employee_details():
+    assert concept_column("SS: Desempleo (1.60%)") == "SS: Desempleo"
+    assert concept_column("Plus Progresión (Nivel 2)") == "Plus Progresión"
+    assert concept_column("Salario Base (Parte Proporcional)") == "Salario Base (Parte Proporcional)"
+    assert roster_format("plantilla.PARQUET") == "parquet"
+
+
+def test_csv_roster_streams_chunked_results(roster_path):
+    total, chunks = simulate_roster(None, roster_path, "csv", "csv", chunk_size=2)
+    blocks = list(chunks)
+
+    assert total == 3
+    assert len(blocks) == 2  # one block per chunk of 2 rows
+    rows = list(csv.DictReader(io.StringIO("".join(blocks))))
+    assert [row["employee_id"] for row in rows] == ["E1", "E2", "E3"]
+
+    expected = BatchCalculatorService(None).calculate_batch([
+        CalculationRequest(company_slug="iberia", user_group="Administrativos", user_level="Nivel 1",
+                           dynamic_variables={"HORA_EXTRA": 10}),
+        CalculationRequest(company_slug="iberia", user_group="Administrativos", user_level="Nivel 1",
+                           payments=12, contract_percentage=50, contract_type="temporal"),
+    ]).results
+    assert float(rows[0]["net_salary_monthly"]) == expected[0].net_salary_monthly
+    assert float(rows[0]["Horas Extra"]) == 150.0
+    assert rows[1]["Horas Extra"] == ""
+    assert float(rows[1]["Prorrata Pagas Extra"]) == pytest.approx(expected[1].breakdown[1].amount, abs=0.005)
+    assert float(rows[1]["SS: Desempleo"]) < 0
+
+
+def test_invalid_row_fails_before_streaming(tmp_path):
+    path = tmp_path / "plantilla.csv"
+    path.write_text(ROSTER + "E4,iberia,Administrativos,Nivel 1,catorce,100,indefinido,\n", encoding="utf-8")
+
+    with pytest.raises(RosterError, match="Fila 5"):
+        simulate_roster(None, str(path), "csv", "csv")
+
+
+def test_parquet_roundtrip(roster_path, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    _, chunks = simulate_roster(None, roster_path, "csv", "parquet", chunk_size=2)
+    output = tmp_path / "nominas.parquet"
+    output.write_bytes(b"".join(chunks))
+
+    assert pq.ParquetFile(output).num_row_groups == 2  # one row group per chunk
+    table = pq.read_table(output)
+    assert table.num_rows == 3
+    assert table.column("employee_id").to_pylist() == ["E1", "E2", "E3"]
+
+
+def test_latin1_csv_is_a_roster_error(tmp_path):
+    path = tmp_path / "plantilla.csv"
+    path.write_bytes(ROSTER.replace("Nivel 1", "Nivel 1 (Señal)").encode("cp1252"))
+
+    with pytest.raises(RosterError, match="UTF-8"):
+        simulate_roster(None, str(path), "csv", "csv")
+
+
+def test_corrupt_parquet_is_a_roster_error(tmp_path):
+    pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "plantilla.parquet"
+    path.write_bytes(b"PAR1 not really a parquet file")
+
+    with pytest.raises(RosterError, match="Parquet inválido"):
+        simulate_roster(None, str(path), "parquet", "csv")
@@ -0,0 +1,80 @@
+"""
+Unit tests for SemanticCache (QueryExpander result cache)
+"""
+import numpy as np
+from app.services.semantic_cache import SemanticCache, normalize_query
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def fake_embedder(text: str):
+    """Bag-of-letters embedding: similar strings -> similar vectors."""
+    vector = np.zeros(32)
+    for char in normalize_query(text):
+        vector[ord(char) % 32] += 1
+    return vector
+
+
+class TestSemanticCache:
+
+    def test_normalize_query(self):
+        assert normalize_query("¿Cuánto cobra el Nivel 3?") == "cuanto cobra el nivel 3"
+        assert normalize_query("  permiso   por HOSPITALIZACIÓN ") == "permiso por hospitalizacion"
+
+    def test_exact_hit_ignores_accents_and_punctuation(self):
+        cache = SemanticCache("test")
+        cache.put("cuánto cobra nivel 3", {"intent": "SALARY"})
+
+        assert cache.get("Cuanto cobra nivel 3?") == {"intent": "SALARY"}
+        assert cache.get("permiso por boda") is None
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_returns_copies(self):
+        cache = SemanticCache("test")
+        cache.put("vacaciones", {"keywords_busqueda": ["vacaciones"]})
+
+        cache.get("vacaciones")["keywords_busqueda"].append("mutated")
+        assert cache.get("vacaciones") == {"keywords_busqueda": ["vacaciones"]}
+
+    def test_ttl_expiry(self):
+        clock = FakeClock()
+        cache = SemanticCache("test", ttl_seconds=60, clock=clock)
+        cache.put("vacaciones", {"intent": "LEAVE"})
+
+        clock.now = 59
+        assert cache.get("vacaciones") is not None
+        clock.now = 61
+        assert cache.get("vacaciones") is None
+
+    def test_lru_eviction(self):
+        cache = SemanticCache("test", max_entries=2)
+        cache.put("uno", {"v": 1})
+        cache.put("dos", {"v": 2})
+        cache.get("uno")  # "dos" becomes least recently used
+        cache.put("tres", {"v": 3})
+
+        assert cache.get("dos") is None
+        assert cache.get("uno") == {"v": 1}
+        assert cache.stats()["evictions"] == 1
+
+    def test_near_hit_requires_same_numbers(self):
+        cache = SemanticCache("test", similarity_threshold=0.9, embedder=fake_embedder)
+        cache.put("cuanto cobra un agente nivel 3", {"intent": "SALARY"})
+
+        assert cache.get("cuanto cobra el agente nivel 3") == {"intent": "SALARY"}
+        assert cache.stats()["near_hits"] == 1
+        # Same wording, different level: must not reuse the cached expansion
+        assert cache.get("cuanto cobra un agente nivel 4") is None
+
+    def test_near_hits_disabled(self):
+        cache = SemanticCache("test", similarity_threshold=0.9, allow_near_hits=False, embedder=fake_embedder)
+        cache.put("cuanto cobra un agente nivel 3", {"intent": "SALARY"})
+
+        assert cache.get("cuanto cobra el agente nivel 3") is None
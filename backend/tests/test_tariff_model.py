@@ -0,0 +1,78 @@
+"""
+Unit tests for the compiled tariff model (same precedence as the old queries)
+"""
+from app.services import tariff_model as module
+from app.services.tariff_model import CompanyTariff, ConceptDefinition, TariffModel
+
+ROWS = [
+    # (id, year, group, level, concept, amount)
+    (1, 2025, "Administrativos", "Nivel 1", "SALARIO_BASE", 1100.0),
+    (2, 2024, "Administrativos", "Nivel 1", "SALARIO_BASE", 1000.0),
+    (3, 2025, "Administrativos", "Nivel 1", "PLUS_TRANSPORTE", None),
+    (4, 2025, "Administrativos", "Agente - Nivel 3", "SALARIO_BASE", 1300.0),
+    (5, 2025, "Técnicos", "Nivel 1", "SALARIO_BASE", 1500.0),
+]
+
+TEMPLATE = {
+    "structure": {
+        "groups": [
+            {"name": "Servicios Auxiliares", "categories": [
+                {"name": "Agente de Rampa", "levels": [{"level": "Nivel 1", "salary": 1}, {"level": "Nivel 1", "salary": 2}]},
+            ]},
+            {"name": "Otro", "categories": [{"name": "Agente de Rampa", "levels": []}]},
+        ]
+    }
+}
+
+
+def test_exact_prices_keep_query_precedence():
+    tariff = CompanyTariff("demo", ROWS)
+    # ORDER BY year DESC + dict overwrite: the oldest year wins; NULL amounts become 0.0
+    assert tariff.prices("Administrativos", "Nivel 1") == {"SALARIO_BASE": 1000.0, "PLUS_TRANSPORTE": 0.0}
+    assert tariff.prices("Administrativos", "Nivel 9") == {}
+
+
+def test_prices_matching_is_a_contains_fallback():
+    tariff = CompanyTariff("demo", ROWS)
+    prices, level = tariff.prices_matching("Administrativos", "Nivel 3")
+    assert level == "Agente - Nivel 3"
+    assert prices == {"SALARIO_BASE": 1300.0}
+    assert tariff.prices_matching("Técnicos", "Nivel 3") == ({}, None)
+
+
+def test_group_levels_use_latest_year():
+    tariff = CompanyTariff("demo", ROWS)
+    assert tariff.group_levels("Administrativos") == {
+        "Nivel 1": {"SALARIO_BASE": 1100.0, "PLUS_TRANSPORTE": None},
+        "Agente - Nivel 3": {"SALARIO_BASE": 1300.0},
+    }
+
+
+def test_template_categories_and_definitions():
+    definition = ConceptDefinition("PLUS_NOCT", "Nocturnidad", "hours", 1.5, None)
+    tariff = CompanyTariff("easyjet", [], [definition], TEMPLATE)
+
+    category = tariff.categories["Agente de Rampa"]
+    # First category/level with the name wins (same as the old template walk)
+    assert category.group == "Servicios Auxiliares"
+    assert category.levels["Nivel 1"]["salary"] == 1
+    assert tariff.definitions == {"PLUS_NOCT": definition}
+
+
+def test_registry_reloads_on_version_change_and_ttl(monkeypatch):
+    now, version, loads = [0.0], ["v1"], []
+    monkeypatch.setattr(module.corpus_version, "salary", lambda db: version[0])
+    model = TariffModel(ttl_seconds=600, clock=lambda: now[0])
+    monkeypatch.setattr(model, "_load", lambda db, slugs: loads.append(slugs) or {s: CompanyTariff(s, ROWS) for s in slugs})
+
+    model.get(None, "iberia")
+    model.get(None, "iberia")
+    assert len(loads) == 1
+
+    version[0] = "v2"  # e.g. an in-place UPDATE of default_price changes the checksum
+    model.get(None, "iberia")
+    assert len(loads) == 2
+
+    now[0] = 601  # backstop even if the fingerprint did not move
+    model.get(None, "iberia")
+    assert len(loads) == 3
@@ -2,8 +2,13 @@
 Basic test suite for utility functions.
 Tests company detection and other utilities.
 """
+import io
+import json
+import logging
 import pytest
 from app.utils.company_detector import detect_company_from_filename, detect_category_from_filename
+from app.utils.sse import sse_event
+from app.utils import logging_config
 
 class TestCompanyDetector:
     """Tests for company detection utility."""
@@ -41,3 +46,56 @@ class TestCategoryDetector:
     def test_detect_convenio(self):
         assert detect_category_from_filename("iberia_convenio.json") == "Convenio"
         assert detect_category_from_filename("azul.json") == "Convenio"
+
+
+class TestSseEvent:
+    """Tests for Server-Sent Events framing."""
+
+    def test_frame_format(self):
+        assert sse_event("token", {"text": "Hola"}) == 'event: token\ndata: {"text": "Hola"}\n\n'
+
+    def test_newlines_stay_inside_json(self):
+        frame = sse_event("token", {"text": "línea 1\nlínea 2"})
+        # One data line only: newlines are escaped by JSON, accents kept as-is
+        assert frame.count("\n") == 3
+        assert "línea 1\\nlínea 2" in frame
+
+
+class TestStructuredLogging:
+    """Tests for the queue-based JSON logging pipeline."""
+
+    @pytest.fixture
+    def emit(self):
+        root = logging.getLogger()
+        saved_handlers, saved_level = list(root.handlers), root.level
+
+        def run(sample_rate, log):
+            stream = io.StringIO()
+            logging_config.setup_structured_logging("DEBUG", json_format=True, sample_rate=sample_rate, stream=stream)
+            log(logging.getLogger("tests.structured"))
+            logging_config.stop_structured_logging()  # flushes the queue
+            return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+        yield run
+        root.handlers[:] = saved_handlers
+        root.setLevel(saved_level)
+
+    def test_json_records_carry_request_id_and_extra(self, emit):
+        def log(logger):
+            logging_config.bind_request("req-123")
+            logger.info("🧠 Detected Intent: %s", "SALARY", extra={"company_slug": "iberia"})
+
+        [record] = emit(0.0, log)
+        assert record["msg"] == "🧠 Detected Intent: SALARY"
+        assert record["request_id"] == "req-123"
+        assert record["company_slug"] == "iberia"
+        assert record["level"] == "INFO"
+
+    def test_debug_lines_sampled_per_request(self, emit):
+        def log(logger):
+            logging_config.bind_request("muted")
+            logger.debug("dropped")
+            logger.warning("kept")
+
+        assert [r["msg"] for r in emit(0.0, log)] == ["kept"]
+        assert [r["msg"] for r in emit(1.0, log)] == ["dropped", "kept"]
@@ -0,0 +1,27 @@
+"""
+Unit tests for per-request ANN tuning (apply_search_tuning)
+"""
+from app.constants import HNSW_EF_SEARCH, IVFFLAT_PROBES
+from app.db.vector_index import apply_search_tuning
+
+
+class FakeSession:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+
+
+def test_defaults_emit_no_sql():
+    db = FakeSession()
+    apply_search_tuning(db, ef_search=HNSW_EF_SEARCH, probes=IVFFLAT_PROBES)
+    assert db.statements == []
+
+
+def test_ef_search_and_probes_in_one_statement():
+    db = FakeSession()
+    apply_search_tuning(db, ef_search=HNSW_EF_SEARCH + 60, probes=IVFFLAT_PROBES + 5)
+    assert db.statements == [
+        f"SET LOCAL hnsw.ef_search = {HNSW_EF_SEARCH + 60}; SET LOCAL ivfflat.probes = {IVFFLAT_PROBES + 5}"
+    ]